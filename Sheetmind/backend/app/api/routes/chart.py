@@ -5,15 +5,16 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, field_validator
 
 from app.core.auth import get_current_user
+from app.core.serialization import FastJSONRoute
 
 logger = logging.getLogger(__name__)
-from app.services.chart_generator import generate_chart
+from app.services.chart_generator import agenerate_chart
 from app.services.confidence import calculate_confidence
 from app.services.usage import check_and_increment
 from app.services.rate_limiter import check_rate_limit
 from app.services.cache import get_cached, set_cached
 
-router = APIRouter(prefix="/chat", tags=["Chart"])
+router = APIRouter(prefix="/chat", tags=["Chart"], route_class=FastJSONRoute)
 
 
 class ChartRequest(BaseModel):
@@ -91,7 +92,7 @@ async def generate_chart_endpoint(
     if cached:
         return ChartResponse(**cached)
 
-    chart_config = generate_chart(
+    chart_config = await agenerate_chart(
         data=request.data,
         chart_type=request.chart_type,
         title=request.title,
@@ -5,24 +5,31 @@ import uuid
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
 
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 
 from app.core.config import settings
+from app.core.serialization import FastJSONResponse, FastJSONRoute, dumps_bytes
 from app.core.database import get_supabase
 from app.core.auth import get_current_user
 from app.schemas.message import (
     ChatRequest, ChatResponse, SourceReference, StepAction, QuickAction,
-    AgentReasoningStep, ClearMemoryRequest, RAGIndexResponse, RAGSearchResponse,
+    AgentReasoningStep, ClearMemoryRequest, RAGIndexProgress, RAGIndexResponse, RAGSearchResponse,
     ChatMode,
 )
-from app.services.ai_provider import chat_completion, agent_completion
-from app.services.chart_generator import generate_chart
+from app.services.ai_provider import aagent_completion, achat_completion, astream_chat_completion
+from app.services.chart_generator import agenerate_chart
 from app.services.source_linker import extract_sources
 from app.services.usage import check_limit, increment_usage, check_and_increment
 from app.services.rate_limiter import check_rate_limit
 from app.services.cache import get_cached, set_cached
 from app.services.profiler import StepTimer
+from app.services.sheet_frame import get_frame
+from app.services.fingerprint import get_fingerprint
+from app.services.sheet_snapshots import SnapshotMismatch, apply_patch, save_snapshot
+from app.services.query_engine import answer_locally
 from app.services.critique_agent import (
     critique_and_fix_actions, generate_proactive_insights,
     critique_and_clean_response,
@@ -31,19 +38,25 @@ from app.services.response_enhancer import enhance_response
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/chat", tags=["Chat"])
+router = APIRouter(prefix="/chat", tags=["Chat"], route_class=FastJSONRoute)
 
 _bg_executor = ThreadPoolExecutor(max_workers=settings.THREAD_POOL_SIZE)
 
+# Streaming /chat/query: receives (event, data) as each part of the answer is ready
+ChatEventSink = Callable[[str, Any], Awaitable[None]]
+
+# SmartExecutor models in fallback order: Arcee Trinity (free), then OpenRouter Gemini
+_SMART_EXECUTOR_MODELS = ["arcee-ai/trinity-large-preview:free", "google/gemini-2.0-flash-001"]
+
 # LangChain imports (lazy loaded based on feature flag)
 _langchain_available = False
 _smart_executor = None
 try:
     if settings.LANGCHAIN_ENABLED:
         from app.services.langchain_agent import get_agent, clear_agent, remove_agent
-        from app.services.rag_system import get_rag
+        from app.services.rag_system import get_rag, rag_namespace
         from app.services.smart_executor import SmartExecutor, RequestType
-        from app.services.sheet_analyzer import analyze_sheet
+        from app.services.metadata_cache import get_sheet_metadata
         _langchain_available = True
         logger.info("LangChain agent enabled with SmartExecutor")
 except ImportError as e:
@@ -223,25 +236,15 @@ def _generate_quick_actions(sheet_data: dict | None, sheet_name: str | None) ->
     if not sheet_data or "cells" not in sheet_data or not sheet_data["cells"]:
         return []
 
-    cells = sheet_data["cells"]
-    cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-    # Parse header row and sample data
-    headers = {}  # col_letter -> header_name
-    col_values = {}  # col_letter -> list of sample values
+    frame = get_frame(sheet_data["cells"])
 
-    for ref, val in cells.items():
-        m = cell_pattern.match(ref)
-        if not m:
-            continue
-        col = m.group(1)
-        row = int(m.group(2))
-        if row == 1:
-            headers[col] = str(val)
-        else:
-            if col not in col_values:
-                col_values[col] = []
-            col_values[col].append(str(val))
+    # Header row and data values per column
+    headers = frame.headers  # col_letter -> header_name
+    col_values = {}  # col_letter -> list of data values
+    for col in frame.columns:
+        items = frame.column_items(col)
+        if items:
+            col_values[col] = [v for _, v in items]
 
     if not headers:
         return []
@@ -587,6 +590,17 @@ def _fetch_db_history(conversation_id: str, limit: int = 20) -> list[dict] | Non
     return None
 
 
+async def _answer_chat(emit: ChatEventSink | None, **kwargs) -> str:
+    """achat_completion, streamed to ``emit`` as ``token`` events when streaming."""
+    if emit is None:
+        return await achat_completion(**kwargs)
+    parts = []
+    async for text in astream_chat_completion(**kwargs):
+        parts.append(text)
+        await emit("token", {"text": text})
+    return "".join(parts)
+
+
 @router.post("/query")
 async def chat_query(
     request: ChatRequest,
@@ -594,6 +608,92 @@ async def chat_query(
     profile: bool = Query(False, description="Return step-level timing breakdown"),
 ):
     """Process a chat query from the sidebar."""
+    # Encoded directly (skips FastAPI's jsonable_encoder pass)
+    return FastJSONResponse(await _run_chat_query(request, user, profile))
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps_bytes(data) + b"\n\n"
+
+
+@router.post("/query/stream")
+async def chat_query_stream(
+    request: ChatRequest,
+    user: dict = Depends(get_current_user),
+    profile: bool = Query(False, description="Return step-level timing breakdown"),
+):
+    """
+    Streaming /chat/query (Server-Sent Events).
+
+    Events: ``start`` once the request is accepted, ``token`` ({"text"}) as
+    LLM tokens arrive, then ``sources``, ``steps``, ``chart_config`` and
+    ``followup_suggestions`` as each is ready, and finally ``done`` with the
+    same payload /chat/query returns. Tokens are the raw model output —
+    ``done.content`` is the final, cleaned answer. Errors before ``start``
+    (rate limit, quota, stale delta upload) are plain HTTP errors; later ones
+    end the stream with an ``error`` event ({"status_code", "detail"}).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    started = False
+
+    async def emit(event: str, data) -> None:
+        nonlocal started
+        started = started or event == "start"
+        await queue.put((event, data))
+
+    async def run() -> None:
+        try:
+            await emit("done", await _run_chat_query(request, user, profile, emit))
+        except HTTPException as e:
+            if not started:
+                raise
+            await emit("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            if not started:
+                raise
+            logger.error(f"Streaming chat failed: {e}", exc_info=True)
+            await emit("error", {"status_code": 500, "detail": "Internal server error"})
+
+    task = asyncio.ensure_future(run())
+    first = asyncio.ensure_future(queue.get())
+    await asyncio.wait({task, first}, return_when=asyncio.FIRST_COMPLETED)
+    if not first.done():
+        first.cancel()
+        task.result()  # re-raises the pre-stream HTTPException
+
+    async def events():
+        event, data = first.result()
+        try:
+            while True:
+                yield _sse(event, data)
+                if event in ("done", "error"):
+                    return
+                event, data = await queue.get()
+        finally:
+            # Client disconnected mid-stream: stop the pipeline (and its LLM call)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _run_chat_query(
+    request: ChatRequest,
+    user: dict,
+    profile: bool,
+    emit: ChatEventSink | None = None,
+) -> dict:
+    """
+    The /chat/query pipeline. Returns the ChatResponse payload.
+
+    Args:
+        emit: Streaming only — receives ``(event, data)`` as parts of the
+            answer become available (see chat_query_stream)
+    """
     timer = StepTimer()
 
     # ===== LOGGING: Request received (basic info, intent logged after history built) =====
@@ -622,6 +722,28 @@ async def chat_query(
         )
     timer.stop("rate_limit")
 
+    # Delta upload: rebuild sheet_data from the stored snapshot + changed cells
+    sheet_data = request.sheet_data
+    snapshot_sheet = request.sheet_name or "Sheet1"
+    if request.base_fingerprint:
+        timer.start("sheet_patch")
+        try:
+            patched_cells = apply_patch(
+                user_id, snapshot_sheet, request.base_fingerprint, request.sheet_patch,
+                request.spreadsheet_id,
+            )
+        except SnapshotMismatch as e:
+            raise HTTPException(status_code=409, detail=f"{e}. Resend the full sheet_data.")
+        # The patch alone passed the schema limit; the rebuilt sheet must too
+        if len(patched_cells) > ChatRequest.MAX_SHEET_CELLS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Sheet data too large ({len(patched_cells)} cells). Maximum is {ChatRequest.MAX_SHEET_CELLS}.",
+            )
+        sheet_data = {**(request.sheet_data or {}), "cells": patched_cells}
+        logger.info(f"   Applied sheet patch: {len(request.sheet_patch or {})} cells, total {len(patched_cells)}")
+        timer.stop("sheet_patch")
+
     timer.start("usage_check")
     # Atomically check limit AND increment usage counter before the AI call.
     # This prevents concurrent requests from bypassing the quota.
@@ -636,9 +758,11 @@ async def chat_query(
             user_id=user_id,
             endpoint="chat",
             prompt=request.message,
-            data=request.sheet_data,
+            data=sheet_data,
         )
     timer.stop("cache_lookup")
+    if emit:
+        await emit("start", {"cached": bool(cached)})
 
     loop = asyncio.get_running_loop()
 
@@ -659,12 +783,8 @@ async def chat_query(
     timer.stop("conv_create")
 
     chart_future = None
-    if detect_chart_intent(request.message) and request.sheet_data:
-        chart_future = loop.run_in_executor(
-            _bg_executor,
-            generate_chart,
-            request.sheet_data,
-        )
+    if detect_chart_intent(request.message) and sheet_data:
+        chart_future = asyncio.ensure_future(agenerate_chart(sheet_data))
 
     # Phase 3: Build history — prefer DB history when conversation exists
     history = None
@@ -678,9 +798,27 @@ async def chat_query(
 
     # Skip sheet data for simple greetings (faster response)
     is_greeting = is_simple_greeting(request.message)
-    effective_sheet_data = None if is_greeting else request.sheet_data
+    effective_sheet_data = None if is_greeting else sheet_data
     effective_sheet_name = None if is_greeting else request.sheet_name
 
+    # Parse the cells dict once — analyzer, PII scan, prompt builder, RAG,
+    # SmartExecutor and the agent tools all reuse this frame via get_frame()
+    if effective_sheet_data and effective_sheet_data.get("cells"):
+        timer.start("sheet_parse")
+        get_frame(effective_sheet_data["cells"])
+        timer.stop("sheet_parse")
+
+    # Keep this version as the base for the client's next delta upload, but
+    # only for clients that use delta uploads (they send spreadsheet_id or
+    # base_fingerprint) — everyone else would just fill Redis with full sheets
+    sheet_fingerprint = None
+    wants_snapshot = bool(request.spreadsheet_id or request.base_fingerprint)
+    if wants_snapshot and sheet_data and sheet_data.get("cells"):
+        sheet_fingerprint = get_fingerprint(sheet_data["cells"]).root
+        loop.run_in_executor(
+            _bg_executor, save_snapshot, user_id, snapshot_sheet, sheet_data["cells"], request.spreadsheet_id,
+        )
+
     # PII detection — warn user if sensitive data will be sent to LLM
     pii_warning = None
     if settings.PII_DETECTION_ENABLED and effective_sheet_data and "cells" in effective_sheet_data:
@@ -733,46 +871,30 @@ async def chat_query(
             # Analyze sheet first for metadata
             cells = effective_sheet_data.get("cells", {}) if effective_sheet_data else {}
             if cells:
-                metadata = analyze_sheet(cells, effective_sheet_name or "Sheet1")
+                metadata = get_sheet_metadata(cells, effective_sheet_name or "Sheet1")
                 metadata_dict = metadata.to_dict()
 
-                # Create SmartExecutor with primary LLM (Arcee Trinity)
-                from langchain_openai import ChatOpenAI
-                llm = ChatOpenAI(
-                    model="arcee-ai/trinity-large-preview:free",
-                    api_key=settings.OPENROUTER_API_KEY,
-                    base_url="https://openrouter.ai/api/v1",
-                    temperature=0.1,
-                    max_tokens=2048,
-                )
-                executor = SmartExecutor(llm)
-
-                # Try smart execution — primary first, Gemini fallback
-                try:
-                    smart_result = await loop.run_in_executor(
-                        _bg_executor,
-                        lambda: executor.execute(
-                            request.message, metadata_dict,
-                            cells=cells, history=history,
+                # SmartExecutor on Arcee Trinity, Gemini fallback — models whose
+                # circuit breaker is open are skipped without paying a timeout
+                from app.services.llm_clients import get_chat_model
+                from app.services.model_health import is_available
+
+                models = [m for m in _SMART_EXECUTOR_MODELS if is_available(m)] or _SMART_EXECUTOR_MODELS[-1:]
+                for i, model in enumerate(models):
+                    executor = SmartExecutor(get_chat_model(model, temperature=0.1, max_tokens=2048))
+                    try:
+                        smart_result = await loop.run_in_executor(
+                            _bg_executor,
+                            lambda: executor.execute(
+                                request.message, metadata_dict,
+                                cells=cells, history=history,
+                            )
                         )
-                    )
-                except Exception as primary_err:
-                    logger.warning(f"SmartExecutor primary (Arcee) failed: {primary_err}, trying Gemini")
-                    fallback_llm = ChatOpenAI(
-                        model="google/gemini-2.0-flash-001",
-                        api_key=settings.OPENROUTER_API_KEY,
-                        base_url="https://openrouter.ai/api/v1",
-                        temperature=0.1,
-                        max_tokens=2048,
-                    )
-                    executor = SmartExecutor(fallback_llm)
-                    smart_result = await loop.run_in_executor(
-                        _bg_executor,
-                        lambda: executor.execute(
-                            request.message, metadata_dict,
-                            cells=cells, history=history,
-                        )
-                    )
+                        break
+                    except Exception as model_err:
+                        if i == len(models) - 1:
+                            raise
+                        logger.warning(f"SmartExecutor {model} failed: {model_err}, trying {models[i + 1]}")
 
                 # Check if it succeeded or needs full agent
                 if smart_result.get("request_type") == "complex" and not smart_result.get("actions"):
@@ -841,6 +963,7 @@ async def chat_query(
                         sheet_name=effective_sheet_name,
                         history=history,
                         precomputed_metadata=_precomputed,
+                        rag_namespace=rag_namespace(user_id, request.spreadsheet_id),
                     ),
                 )
 
@@ -890,7 +1013,8 @@ async def chat_query(
             except Exception as e:
                 logger.error(f"LangChain agent failed: {e}", exc_info=True)
                 try:
-                    ai_response = chat_completion(
+                    ai_response = await _answer_chat(
+                        emit,
                         message=request.message,
                         sheet_data=effective_sheet_data,
                         sheet_name=effective_sheet_name,
@@ -909,14 +1033,11 @@ async def chat_query(
         # Legacy agent-style execution (when LangChain disabled)
         timer.start("ai_call")
         try:
-            agent_result = await loop.run_in_executor(
-                _bg_executor,
-                lambda: agent_completion(
-                    message=request.message,
-                    sheet_data=effective_sheet_data,
-                    sheet_name=effective_sheet_name,
-                    history=history,
-                ),
+            agent_result = await aagent_completion(
+                message=request.message,
+                sheet_data=effective_sheet_data,
+                sheet_name=effective_sheet_name,
+                history=history,
             )
         except RuntimeError as e:
             logger.error(f"AI provider error: {e}")
@@ -942,7 +1063,8 @@ async def chat_query(
         else:
             # Agent parsing failed, fall back to regular chat
             try:
-                ai_response = chat_completion(
+                ai_response = await _answer_chat(
+                    emit,
                     message=request.message,
                     sheet_data=effective_sheet_data,
                     sheet_name=effective_sheet_name,
@@ -956,25 +1078,37 @@ async def chat_query(
             sources = extract_sources(ai_response, default_sheet)
             sources_json = [s.model_dump() for s in sources]
     else:
-        # Regular chat
-        timer.start("ai_call")
-        try:
-            ai_response = chat_completion(
-                message=request.message,
-                sheet_data=effective_sheet_data,
-                sheet_name=effective_sheet_name,
-                history=history,
-            )
-        except RuntimeError as e:
-            logger.error(f"AI provider error: {e}")
-            raise HTTPException(status_code=503, detail="AI service temporarily unavailable. Please try again.")
-        timer.stop("ai_call")
-
-        timer.start("source_extraction")
+        # Regular chat — simple aggregates ("total Sales by Region") are
+        # computed locally with exact sources; everything else goes to the LLM
         default_sheet = effective_sheet_name or "Sheet1"
-        sources = extract_sources(ai_response, default_sheet)
-        sources_json = [s.model_dump() for s in sources]
-        timer.stop("source_extraction")
+        local_answer = None
+        if effective_sheet_data and effective_sheet_data.get("cells"):
+            timer.start("local_query")
+            local_answer = answer_locally(request.message, effective_sheet_data["cells"], default_sheet)
+            timer.stop("local_query")
+
+        if local_answer is not None:
+            ai_response = local_answer.text
+            sources_json = [s.model_dump() for s in local_answer.sources]
+        else:
+            timer.start("ai_call")
+            try:
+                ai_response = await _answer_chat(
+                    emit,
+                    message=request.message,
+                    sheet_data=effective_sheet_data,
+                    sheet_name=effective_sheet_name,
+                    history=history,
+                )
+            except RuntimeError as e:
+                logger.error(f"AI provider error: {e}")
+                raise HTTPException(status_code=503, detail="AI service temporarily unavailable. Please try again.")
+            timer.stop("ai_call")
+
+            timer.start("source_extraction")
+            sources = extract_sources(ai_response, default_sheet)
+            sources_json = [s.model_dump() for s in sources]
+            timer.stop("source_extraction")
 
         timer.start("cache_set")
         set_cached(
@@ -989,6 +1123,9 @@ async def chat_query(
         )
         timer.stop("cache_set")
 
+    if emit and sources_json:
+        await emit("sources", {"sources": sources_json})
+
     # Resolve conversation_id if created in background
     if conv_future:
         timer.start("conv_await")
@@ -1033,6 +1170,8 @@ async def chat_query(
     # Merge SmartExecutor inline chart if no chart was generated from chart_future
     if not chart_config and smart_chart_config:
         chart_config = smart_chart_config
+    if emit and chart_config:
+        await emit("chart_config", {"chart_config": chart_config})
 
     # Extract sheet action (filter/sort/highlight) if present and not agent mode
     if not steps:
@@ -1104,6 +1243,9 @@ async def chat_query(
         )
         timer.stop("critique")
 
+    if emit and steps:
+        await emit("steps", {"steps": [s.model_dump() for s in steps]})
+
     # ===== RESPONSE ENHANCER: Add smart suggestions & polish =====
     timer.start("enhance")
     enhancements = enhance_response(
@@ -1138,6 +1280,9 @@ async def chat_query(
             for s in enhanced_suggestions
         ]
 
+    if emit and followup_suggestions:
+        await emit("followup_suggestions", {"followup_suggestions": [s.model_dump() for s in followup_suggestions]})
+
     # Detect clarification questions in AI response
     clarification = None
     if not steps:  # Don't offer clarification when we already have an execution plan
@@ -1178,6 +1323,8 @@ async def chat_query(
         # Response enhancements
         "action_summary": enhancements.get("action_summary"),
         "speed_badge": enhancements.get("speed_badge"),
+        # Delta uploads
+        "sheet_fingerprint": sheet_fingerprint,
     }
 
     if profile:
@@ -1391,6 +1538,7 @@ async def index_sheet_for_rag(
                 request.sheet_data["cells"],
                 sheet_name,
                 force_reindex=request.force_refresh or False,
+                namespace=rag_namespace(user["id"], request.spreadsheet_id),
             )
         )
 
@@ -1411,6 +1559,26 @@ async def index_sheet_for_rag(
         )
 
 
+@router.get("/rag/index/progress", response_model=RAGIndexProgress)
+async def rag_index_progress(
+    sheet_name: str = Query(default="Sheet1", description="Sheet being indexed"),
+    spreadsheet_id: str | None = Query(default=None, description="Spreadsheet the sheet belongs to"),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Rows indexed so far for a sheet's latest /rag/index run.
+
+    Poll this while a large sheet is being indexed to show progress.
+    """
+    if not settings.RAG_ENABLED or not _langchain_available:
+        raise HTTPException(status_code=400, detail="RAG is not enabled")
+
+    progress = get_rag().get_index_progress(sheet_name, rag_namespace(user["id"], spreadsheet_id))
+    if progress is None:
+        return RAGIndexProgress(status="not_indexed")
+    return RAGIndexProgress(**progress)
+
+
 @router.post("/rag/search", response_model=RAGSearchResponse)
 async def rag_search(
     request: ChatRequest,
@@ -1457,6 +1625,7 @@ async def rag_search(
                 sheet_name,
                 request.sheet_data["cells"],
                 k=k,
+                namespace=rag_namespace(user["id"], request.spreadsheet_id),
             )
         )
 
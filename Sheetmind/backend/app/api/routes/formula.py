@@ -4,7 +4,8 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel, field_validator
 
 from app.core.auth import get_current_user
-from app.services.ai_provider import formula_completion, explain_formula, explain_formula_enhanced, fix_formula
+from app.core.serialization import FastJSONRoute
+from app.services.ai_provider import aexplain_formula, aexplain_formula_enhanced, afix_formula, aformula_completion
 from app.services.confidence import calculate_confidence
 from app.services.source_linker import extract_sources
 from app.services.usage import check_and_increment
@@ -15,7 +16,7 @@ from app.services.formula_validator import validate_formula
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/formula", tags=["Formula"])
+router = APIRouter(prefix="/formula", tags=["Formula"], route_class=FastJSONRoute)
 
 MAX_PROMPT_LENGTH = 2000
 MAX_FORMULA_LENGTH = 2000
@@ -144,7 +145,7 @@ async def execute_formula(
     else:
         timer.start("ai_call")
         try:
-            result = formula_completion(
+            result = await aformula_completion(
                 prompt=request.prompt,
                 range_data=request.range_data,
             )
@@ -233,13 +234,13 @@ async def explain_formula_endpoint(
     timer.start("ai_call")
     if request.mode == "step_by_step":
         try:
-            result = explain_formula_enhanced(request.formula)
+            result = await aexplain_formula_enhanced(request.formula)
         except RuntimeError as e:
             logger.error(f"AI provider error: {e}")
             raise HTTPException(status_code=503, detail="AI service temporarily unavailable. Please try again.")
     else:
         try:
-            result = explain_formula(request.formula)
+            result = await aexplain_formula(request.formula)
         except RuntimeError as e:
             logger.error(f"AI provider error: {e}")
             raise HTTPException(status_code=503, detail="AI service temporarily unavailable. Please try again.")
@@ -326,7 +327,7 @@ async def fix_formula_endpoint(
 
     timer.start("ai_call")
     try:
-        result = fix_formula(
+        result = await afix_formula(
             formula=request.formula,
             error_message=request.error_message,
             sheet_context=request.sheet_context,
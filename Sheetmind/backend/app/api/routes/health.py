@@ -106,8 +106,16 @@ async def health_check_db(x_health_key: Optional[str] = Header(default=None)):
     # Only return internal details to authorized callers
     content: dict = {"status": status}
     if authorized:
+        from app.services.embedding_cache import embedding_cache_stats
+        from app.services.llm_clients import llm_client_stats
+        from app.services.llm_hedging import hedge_stats
+        from app.services.model_health import model_health_stats
         content["checks"] = checks
         content["elapsed_ms"] = elapsed_ms
+        content["embedding_cache"] = embedding_cache_stats()
+        content["llm_clients"] = llm_client_stats()
+        content["llm_hedging"] = hedge_stats()
+        content["model_health"] = model_health_stats()
 
     return JSONResponse(status_code=status_code, content=content)
 
@@ -23,6 +23,7 @@ class Settings(BaseSettings):
     PORT: int = 8000
     WORKERS: int = 4                  # uvicorn worker processes
     THREAD_POOL_SIZE: int = 20        # threads per worker for blocking I/O (AI calls, DB)
+    MAX_REQUEST_BODY_BYTES: int = 6_000_000  # 413 before parsing (5 MB sheet + message/history)
 
     # Free Trial
     FREE_TRIAL_LIMIT: int = 5  # Number of free messages for new users
@@ -42,6 +43,29 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = ""
     GEMINI_ENABLED: bool = False  # Set True when Gemini key has quota
 
+    # LLM HTTP connection pool (shared by all LLM clients in a worker)
+    LLM_POOL_MAX_CONNECTIONS: int = 100  # Per provider
+    LLM_POOL_MAX_KEEPALIVE: int = 20  # Idle connections kept open per provider
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 120.0  # Seconds an idle connection is kept
+    LLM_HTTP2: bool = False  # Multiplex LLM requests over HTTP/2 (requires the h2 package)
+
+    # LLM fallback hedging (async routes): start the next model when one is slow
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_DEFAULT_DELAY: float = 8.0  # Seconds before hedging, until p95 latencies are known
+    LLM_HEDGE_MIN_DELAY: float = 1.0  # Floor for the p95-based delay
+    LLM_HEDGE_DEFAULT_BUDGET: float = 60.0  # Seconds an endpoint waits for any model
+    LLM_HEDGE_DELAYS: str = "formula=4,explain=4,fix=4"  # Per-endpoint delay caps, e.g. "chat=8,formula=4"
+    LLM_HEDGE_BUDGETS: str = "formula=30,explain=30,fix=30"  # Per-endpoint budgets in seconds
+
+    # Per-model circuit breakers (skip models that are failing, refusing or slow)
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_WINDOW: int = 20  # Recent calls considered per model
+    LLM_BREAKER_MIN_CALLS: int = 5  # Calls in the window before the breaker can open
+    LLM_BREAKER_FAILURE_RATE: float = 0.5  # Errors + timeouts share that opens the breaker
+    LLM_BREAKER_REFUSAL_RATE: float = 0.8  # Refusal share that opens the breaker
+    LLM_BREAKER_SLOW_SECONDS: float = 20.0  # EWMA latency that opens the breaker
+    LLM_BREAKER_COOLDOWN: float = 30.0  # Seconds before an open breaker is probed (doubles per failed probe)
+
     # LangChain Agent Settings
     LANGCHAIN_ENABLED: bool = True  # Enable LangChain ReAct agent
     RAG_ENABLED: bool = True  # Enable RAG for large sheets
@@ -50,6 +74,15 @@ class Settings(BaseSettings):
     CHROMA_PERSIST_DIR: str = "./chroma_db"  # Vector DB storage path
     RAG_THRESHOLD_ROWS: int = 500  # Activate RAG above this row count
     RAG_RESULTS_COUNT: int = 30  # Number of rows to retrieve via RAG
+    RAG_EMBED_BATCH_SIZE: int = 128  # Rows per embeddings API call when indexing
+    RAG_EMBED_CONCURRENCY: int = 4  # Concurrent embeddings API calls per process
+    RAG_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # Vector bytes of indexes kept loaded per process
+    RAG_LEXICAL_CONFIDENCE: float = 0.8  # Skip vector search when BM25's top hit covers this share of the query
+    RAG_EMBEDDING_PROVIDER: str = "auto"  # auto (google > openrouter > local), google, openrouter or local
+    RAG_LOCAL_EMBEDDING_DIMS: int = 384  # Vector width of the offline hashing embeddings
+    RAG_CHUNK_ROWS: int = 1  # Rows packed into each vector document (1 = one document per row)
+    RAG_CHUNK_BY: str = ""  # Column letter or header: chunk rows sharing a value instead of consecutive rows
+    RAG_INDEX_LOCK_TIMEOUT: float = 300.0  # Seconds to wait for another worker indexing the same sheet
 
     # Memory Configuration
     MEMORY_WINDOW_SIZE: int = 10  # Number of conversation turns to remember
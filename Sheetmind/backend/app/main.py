@@ -3,8 +3,9 @@ import logging
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from api_analytics.fastapi import Analytics
 
@@ -53,8 +54,13 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # Shutdown: clean up thread pools
+    # Shutdown: clean up thread pools and pooled LLM connections
     default_executor.shutdown(wait=False)
+    try:
+        from app.services.llm_clients import close_clients
+        await close_clients()
+    except Exception:
+        pass
     try:
         from app.api.routes.chat import _bg_executor
         _bg_executor.shutdown(wait=False)
@@ -76,6 +82,46 @@ app = FastAPI(
     openapi_url=None if _is_prod else "/openapi.json",
 )
 
+# Request body size limit — pure ASGI so oversized uploads are rejected from the
+# Content-Length header, or as soon as the streamed body crosses the limit,
+# before the JSON is buffered and parsed into Python objects. Added first so it
+# sits inside CORS (413s get CORS headers) and reads the body directly rather
+# than through BaseHTTPMiddleware's task group, which would wrap the exception.
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body too large. Maximum is {self.max_bytes // 1_000_000} MB."
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    response = JSONResponse({"detail": detail}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body reading as-is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.MAX_REQUEST_BODY_BYTES)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
@@ -101,6 +147,7 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(SecurityHeadersMiddleware)
 
+
 # API Analytics — free latency dashboard at https://www.apianalytics.dev
 if settings.API_ANALYTICS_KEY:
     app.add_middleware(Analytics, api_key=settings.API_ANALYTICS_KEY)
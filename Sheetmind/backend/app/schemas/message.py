@@ -1,4 +1,3 @@
-import json
 import uuid
 from datetime import datetime
 from enum import Enum
@@ -6,6 +5,8 @@ from typing import ClassVar, Optional
 
 from pydantic import BaseModel, field_validator
 
+from app.services.sheet_frame import CELL_REF_PATTERN, decode_sheet_data
+
 
 class MessageRole(str, Enum):
     user = "user"
@@ -126,6 +127,13 @@ class RAGIndexResponse(BaseModel):
     error: str | None = None
 
 
+class RAGIndexProgress(BaseModel):
+    """Progress of a sheet's RAG indexing run."""
+    status: str  # not_indexed, indexing, indexed, error
+    indexed: int = 0
+    total: int = 0
+
+
 class RAGSearchResponse(BaseModel):
     """Response from RAG search endpoint."""
     query: str
@@ -138,6 +146,10 @@ class ChatMode(str, Enum):
     chat = "chat"      # Just answers questions
 
 
+# Cell values a sheet_patch may set (None clears the cell)
+_PATCH_VALUE_TYPES = (str, int, float, bool, type(None))
+
+
 class ChatRequest(BaseModel):
     conversation_id: uuid.UUID | None = None
     message: str
@@ -147,11 +159,17 @@ class ChatRequest(BaseModel):
     history: list[HistoryMessage] | None = None
     mode: ChatMode | None = None  # "action" = create sheets/formulas, "chat" = just answer
     sheets: list[str] | None = None  # List of sheet names from the frontend
+    spreadsheet_id: str | None = None  # Scopes server-side RAG indexes to this spreadsheet
+    # Delta uploads: send the sheet_fingerprint from the previous response plus
+    # only the changed cells ({"B7": "42", "C9": null}) instead of full sheet_data.
+    # The server only keeps snapshots (and returns sheet_fingerprint) for
+    # clients that send spreadsheet_id or base_fingerprint.
+    base_fingerprint: str | None = None
+    sheet_patch: dict | None = None
 
     # --- Input size limits (ClassVar so Pydantic treats them as constants, not fields) ---
     MAX_MESSAGE_LENGTH: ClassVar[int] = 5000
     MAX_SHEET_CELLS: ClassVar[int] = 50_000
-    MAX_SHEET_DATA_BYTES: ClassVar[int] = 5_000_000  # 5 MB
     MAX_HISTORY_LENGTH: ClassVar[int] = 50  # 25 exchanges
 
     @field_validator("message")
@@ -171,27 +189,45 @@ class ChatRequest(BaseModel):
             v = v[-cls.MAX_HISTORY_LENGTH:]
         return v
 
-    @field_validator("sheet_data")
+    @field_validator("sheet_data", mode="before")
     @classmethod
-    def validate_sheet_data_size(cls, v: dict | None) -> dict | None:
-        if v is None:
+    def validate_sheet_data_size(cls, v):
+        # Runs on the raw decoded JSON, before Pydantic walks/copies the dict.
+        # Byte size is enforced on the request body (BodySizeLimitMiddleware);
+        # compact payloads are counted while decoding (decode_compact_sheet_data).
+        if not isinstance(v, dict):
             return v
-        # Check cell count
         cells = v.get("cells")
         if isinstance(cells, dict) and len(cells) > cls.MAX_SHEET_CELLS:
             raise ValueError(
                 f"Sheet data too large ({len(cells)} cells). Maximum is {cls.MAX_SHEET_CELLS}."
             )
-        # Check total payload byte size to prevent memory abuse
-        try:
-            byte_size = len(json.dumps(v))
-        except (TypeError, ValueError):
-            byte_size = 0
-        if byte_size > cls.MAX_SHEET_DATA_BYTES:
-            mb = byte_size / 1_000_000
+        return v
+
+    @field_validator("sheet_data")
+    @classmethod
+    def decode_compact_sheet_data(cls, v: dict | None) -> dict | None:
+        # Compact {"format": "rows" | "columns", ...} payloads go straight into
+        # a SheetFrame; downstream code gets the derived legacy cells dict
+        if v is None:
+            return v
+        return decode_sheet_data(v, max_cells=cls.MAX_SHEET_CELLS)
+
+    @field_validator("sheet_patch", mode="before")
+    @classmethod
+    def validate_sheet_patch(cls, v):
+        if not isinstance(v, dict):
+            return v
+        if len(v) > cls.MAX_SHEET_CELLS:
             raise ValueError(
-                f"Sheet data payload too large ({mb:.1f} MB). Maximum is {cls.MAX_SHEET_DATA_BYTES // 1_000_000} MB."
+                f"Sheet patch too large ({len(v)} cells). Maximum is {cls.MAX_SHEET_CELLS}."
             )
+        bad_refs = [ref for ref in v if not CELL_REF_PATTERN.match(ref)]
+        if bad_refs:
+            raise ValueError(f"Sheet patch keys must be A1 cell references, got {bad_refs[:3]}")
+        bad_values = [ref for ref, value in v.items() if not isinstance(value, _PATCH_VALUE_TYPES)]
+        if bad_values:
+            raise ValueError(f"Sheet patch values must be strings, numbers, booleans or null, got {bad_values[:3]}")
         return v
 
 
@@ -218,6 +254,8 @@ class ChatResponse(BaseModel):
     clarification: Clarification | None = None
     # Follow-up suggestions (clickable buttons)
     followup_suggestions: list[QuickAction] | None = None
+    # Base for the next delta upload (send back as base_fingerprint)
+    sheet_fingerprint: str | None = None
 
 
 class MessageResponse(BaseModel):
@@ -1,11 +1,19 @@
+import asyncio
 import json
 import logging
 import re
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 from app.core.config import settings
 from app.services.formula_category_docs import get_mini_cheat_sheet
+from app.services.llm_clients import get_async_openai_client, get_openai_client
+from app.services.llm_hedging import hedge_budget, hedge_delay, hedge_enabled, record_hedge, record_latency
+from app.services.model_health import classify_error, is_available, record
+from app.services.sheet_frame import get_frame
 
 logger = logging.getLogger(__name__)
 
@@ -282,47 +290,25 @@ _REFUSAL_PATTERNS = re.compile(
 
 
 def _get_gemini_client() -> OpenAI:
-    """Get an OpenAI-compatible client pointing to Google Gemini API."""
-    return OpenAI(
-        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        api_key=settings.GEMINI_API_KEY,
-    )
+    """Get the shared OpenAI-compatible client pointing to Google Gemini API."""
+    return get_openai_client("gemini")
 
 
 def _get_openrouter_client() -> OpenAI:
-    """Get an OpenAI-compatible client pointing to OpenRouter (fallback)."""
-    return OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.OPENROUTER_API_KEY,
-    )
+    """Get the shared OpenAI-compatible client pointing to OpenRouter (fallback)."""
+    return get_openai_client("openrouter")
 
 
 def _cells_to_table(cells: dict) -> str:
     """Convert a cells map like {"A1": "Name", "B1": "Age", "A2": "Alice", "B2": "30"}
     into a readable spreadsheet table format."""
 
-    # Parse cell references into (row, col_letter, col_index) -> value
-    cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-    parsed = {}
-    all_cols = set()
-    all_rows = set()
-
-    for ref, val in cells.items():
-        m = cell_pattern.match(ref)
-        if not m:
-            continue
-        col_letter = m.group(1)
-        row_num = int(m.group(2))
-        parsed[(row_num, col_letter)] = val
-        all_cols.add(col_letter)
-        all_rows.add(row_num)
-
-    if not parsed:
+    frame = get_frame(cells)
+    if frame.is_empty:
         return ""
 
-    # Sort columns alphabetically (A, B, C, ... AA, AB)
-    sorted_cols = sorted(all_cols, key=lambda c: (len(c), c))
-    sorted_rows = sorted(all_rows)
+    sorted_cols = frame.columns
+    sorted_rows = frame.row_numbers
 
     # Build table with | delimiters
     lines = []
@@ -339,9 +325,9 @@ def _cells_to_table(cells: dict) -> str:
     for row_num in sorted_rows:
         label = f"{row_num} (header)" if row_num == sorted_rows[0] else str(row_num)
         line = f"| {label} |"
+        row_cells = frame.row(row_num)
         for col in sorted_cols:
-            val = parsed.get((row_num, col), "")
-            val_str = str(val)[:30]
+            val_str = row_cells.get(col, "")[:30]
             line += f" {val_str} |"
         lines.append(line)
 
@@ -349,7 +335,7 @@ def _cells_to_table(cells: dict) -> str:
     first_row = sorted_rows[0]
     col_map = []
     for col in sorted_cols:
-        header_val = parsed.get((first_row, col), "")
+        header_val = frame.get(col, first_row)
         if header_val:
             col_map.append(f"Column {col} = \"{header_val}\"")
     if col_map:
@@ -428,23 +414,18 @@ def _enrich_short_message(user_message: str, history: list[dict] | None) -> str:
     return "\n".join(parts)
 
 
-def _call_model(
-    model: str,
+def _build_messages(
     system_prompt: str,
     user_message: str,
     context: str,
-    client: OpenAI | None = None,
     history: list[dict] | None = None,
-) -> str:
-    """Call a model and return the response text.
+) -> list[dict]:
+    """Chat messages for one model call.
 
     Phase 1A fix: merge context + question into ONE user message so Gemini
     does not get confused by two consecutive user messages.
     Phase 3: insert conversation history between system and current message.
     """
-    if client is None:
-        client = _get_gemini_client()
-
     # Enrich short follow-ups with explicit context from last exchange
     user_message = _enrich_short_message(user_message, history)
 
@@ -465,15 +446,13 @@ def _call_model(
         combined = user_message
 
     messages.append({"role": "user", "content": combined})
+    return messages
+
+
+_COMPLETION_PARAMS = {"temperature": 0.3, "max_tokens": 2000, "timeout": 30}
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.3,
-        max_tokens=2000,
-        timeout=30,
-    )
 
+def _response_text(response) -> str:
     text = response.choices[0].message.content or ""
     if len(text) > _MAX_RESPONSE_CHARS:
         logger.warning(f"LLM response truncated from {len(text)} to {_MAX_RESPONSE_CHARS} chars")
@@ -481,6 +460,71 @@ def _call_model(
     return text
 
 
+def _call_model(
+    model: str,
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    client: OpenAI | None = None,
+    history: list[dict] | None = None,
+) -> str:
+    """Call a model and return the response text."""
+    if client is None:
+        client = _get_gemini_client()
+    response = client.chat.completions.create(
+        model=model,
+        messages=_build_messages(system_prompt, user_message, context, history),
+        **_COMPLETION_PARAMS,
+    )
+    return _response_text(response)
+
+
+async def _acall_model(
+    model: str,
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    client: AsyncOpenAI,
+    history: list[dict] | None = None,
+) -> str:
+    """Async ``_call_model``: awaits the HTTP call instead of blocking the event loop."""
+    response = await client.chat.completions.create(
+        model=model,
+        messages=_build_messages(system_prompt, user_message, context, history),
+        **_COMPLETION_PARAMS,
+    )
+    return _response_text(response)
+
+
+async def _astream_model(
+    model: str,
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    client: AsyncOpenAI,
+    history: list[dict] | None = None,
+) -> AsyncIterator[str]:
+    """Streaming ``_acall_model``: yields text deltas as the model produces them."""
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=_build_messages(system_prompt, user_message, context, history),
+        stream=True,
+        **_COMPLETION_PARAMS,
+    )
+    sent = 0
+    async with aclosing(stream):
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if not text:
+                continue
+            if sent + len(text) > _MAX_RESPONSE_CHARS:
+                logger.warning(f"LLM stream truncated at {_MAX_RESPONSE_CHARS} chars")
+                yield text[:_MAX_RESPONSE_CHARS - sent] + "\n\n[Response truncated]"
+                return
+            sent += len(text)
+            yield text
+
+
 def _is_refusal(text: str) -> bool:
     """Check if the AI response is a refusal to answer."""
     # Only flag as refusal if the refusal phrase appears in the first 200 chars
@@ -488,6 +532,35 @@ def _is_refusal(text: str) -> bool:
     return bool(_REFUSAL_PATTERNS.search(text[:200]))
 
 
+def _fallback_chain() -> list[tuple[str, str, str]]:
+    """(name, model, provider) in the order every completion tries them:
+    Arcee Trinity (free), Gemini direct (if enabled), OpenRouter Gemini,
+    then GPT-4o-mini as final fallback.
+
+    Models whose circuit breaker is open are skipped (see model_health); if
+    every breaker is open, the final fallback is still tried.
+    """
+    chain = [("Arcee Trinity", PRIMARY_OR_MODEL, "openrouter")]
+    if settings.GEMINI_API_KEY and settings.GEMINI_ENABLED:
+        chain.append(("Gemini direct", PRIMARY_MODEL, "gemini"))
+    chain.append(("OpenRouter Gemini", FALLBACK_MODEL, "openrouter"))
+    chain.append(("GPT-4o-mini", GPT_FALLBACK_MODEL, "openrouter"))
+    healthy = [entry for entry in chain if is_available(entry[1])]
+    for name, _, _ in chain:
+        if all(name != entry[0] for entry in healthy):
+            logger.info(f"Skipping {name}: circuit breaker open")
+    return healthy or chain[-1:]
+
+
+# Phase 1C: Gemini direct gets one retry with this appended when it refuses
+_REFUSAL_RETRY_INSTRUCTION = (
+    "\n\n"
+    "IMPORTANT: You have the spreadsheet data above. "
+    "Analyze it directly and provide the answer. "
+    "Do NOT say you cannot access or view the data."
+)
+
+
 def _call_with_fallback(
     system_prompt: str,
     user_message: str,
@@ -495,71 +568,256 @@ def _call_with_fallback(
     label: str = "",
     history: list[dict] | None = None,
 ) -> str:
-    """Try Arcee Trinity first, then Gemini direct, then OpenRouter Gemini,
-    then GPT-4o-mini as final fallback."""
+    """Try each model in _fallback_chain() until one answers without refusing.
 
-    # --- Attempt 1: Arcee Trinity via OpenRouter (free) ---
-    try:
-        result = _call_model(
-            PRIMARY_OR_MODEL, system_prompt, user_message, context,
-            _get_openrouter_client(), history,
-        )
-        if not _is_refusal(result):
-            return result
-        logger.warning(f"Arcee Trinity refused{' for ' + label if label else ''}, trying Gemini")
-    except Exception as e:
-        logger.warning(f"Arcee Trinity failed{' for ' + label if label else ''}: {e}")
+    The last model's answer is returned even if it refuses.
 
-    # --- Attempt 2: Gemini direct ---
-    if settings.GEMINI_API_KEY and settings.GEMINI_ENABLED:
+    Raises:
+        RuntimeError: The last model failed too
+    """
+    suffix = f" for {label}" if label else ""
+    chain = _fallback_chain()
+    for i, (name, model, provider) in enumerate(chain):
+        last = i == len(chain) - 1
         try:
-            result = _call_model(
-                PRIMARY_MODEL, system_prompt, user_message, context,
-                _get_gemini_client(), history,
-            )
-            # Phase 1C: refusal detection + retry
-            if _is_refusal(result):
-                logger.warning(f"Gemini refused{' for ' + label if label else ''}, retrying with explicit instruction")
-                retry_msg = (
-                    f"{user_message}\n\n"
-                    "IMPORTANT: You have the spreadsheet data above. "
-                    "Analyze it directly and provide the answer. "
-                    "Do NOT say you cannot access or view the data."
-                )
-                result = _call_model(
-                    PRIMARY_MODEL, system_prompt, retry_msg, context,
-                    _get_gemini_client(), history,
-                )
-                if not _is_refusal(result):
-                    return result
-                logger.warning("Gemini refused again, falling back")
-            else:
+            result = _try_model(name, model, provider, system_prompt, user_message, context, history, suffix)
+            if last or not _is_refusal(result):
                 return result
+            logger.warning(f"{name} refused{suffix}, falling back")
         except Exception as e:
-            logger.warning(f"Gemini direct failed{' for ' + label if label else ''}: {e}")
+            if last:
+                logger.error(f"{name} fallback failed{suffix}: {e}")
+                raise RuntimeError("AI service unavailable. Please try again later.") from e
+            logger.warning(f"{name} failed{suffix}: {e}")
+    raise RuntimeError("AI service unavailable. Please try again later.")
+
 
-    # --- Attempt 3: OpenRouter Gemini ---
+def _record_outcome(model: str, provider: str, result: str | None, error: Exception | None, start: float) -> None:
+    """Report one model call to its circuit breaker."""
+    outcome = classify_error(error) if error else ("refusal" if _is_refusal(result) else "ok")
+    record(model, outcome, time.perf_counter() - start, provider)
+
+
+def _try_model(
+    name: str,
+    model: str,
+    provider: str,
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    history: list[dict] | None,
+    suffix: str,
+) -> str:
+    """One step of the chain: a model call, with the Gemini refusal retry."""
+    client = get_openai_client(provider)
+    start = time.perf_counter()
     try:
+        result = _call_model(model, system_prompt, user_message, context, client, history)
+    except Exception as e:
+        _record_outcome(model, provider, None, e, start)
+        raise
+    _record_outcome(model, provider, result, None, start)
+    if provider == "gemini" and _is_refusal(result):
+        logger.warning(f"{name} refused{suffix}, retrying with explicit instruction")
         result = _call_model(
-            FALLBACK_MODEL, system_prompt, user_message, context,
-            _get_openrouter_client(), history,
+            model, system_prompt, user_message + _REFUSAL_RETRY_INSTRUCTION, context, client, history,
         )
-        if not _is_refusal(result):
-            return result
-        logger.warning(f"OpenRouter Gemini refused{' for ' + label if label else ''}, trying GPT fallback")
-    except Exception as e:
-        logger.warning(f"OpenRouter Gemini failed{' for ' + label if label else ''}: {e}")
+    return result
+
 
-    # --- Attempt 4: GPT-4o-mini via OpenRouter ---
+async def _atry_model(
+    name: str,
+    model: str,
+    provider: str,
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    history: list[dict] | None,
+    endpoint: str,
+    suffix: str,
+) -> str:
+    """Async ``_try_model``; also feeds the endpoint's hedge latencies."""
+    client = get_async_openai_client(provider)
+    start = time.perf_counter()
     try:
-        result = _call_model(
-            GPT_FALLBACK_MODEL, system_prompt, user_message, context,
-            _get_openrouter_client(), history,
+        result = await _acall_model(model, system_prompt, user_message, context, client, history)
+    except Exception as e:
+        _record_outcome(model, provider, None, e, start)
+        record_latency(endpoint, model, time.perf_counter() - start)
+        raise
+    _record_outcome(model, provider, result, None, start)
+    record_latency(endpoint, model, time.perf_counter() - start)
+    if provider == "gemini" and _is_refusal(result):
+        logger.warning(f"{name} refused{suffix}, retrying with explicit instruction")
+        result = await _acall_model(
+            model, system_prompt, user_message + _REFUSAL_RETRY_INSTRUCTION, context, client, history,
         )
-        return result
-    except Exception as e2:
-        logger.error(f"GPT-4o-mini fallback failed{' for ' + label if label else ''}: {e2}")
-        raise RuntimeError("AI service unavailable. Please try again later.") from e2
+    return result
+
+
+async def _acall_with_fallback(
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    label: str = "",
+    history: list[dict] | None = None,
+) -> str:
+    """Async ``_call_with_fallback`` over the same chain.
+
+    A failure or refusal starts the next model. With LLM_HEDGE_ENABLED, a
+    model that hasn't answered within its hedge delay also starts the next
+    one alongside it; the first non-refusal answer wins and the rest are
+    cancelled. The endpoint's budget caps the whole chain (see llm_hedging).
+    A cancelled model only counts as a timeout for its breaker if it had
+    already run past its own request timeout; losing the race is neutral.
+    If every model refuses, the latest refusal is returned.
+
+    Raises:
+        RuntimeError: No model answered within the chain or budget
+    """
+    suffix = f" for {label}" if label else ""
+    endpoint = label or "default"
+    chain = _fallback_chain()
+    hedging = hedge_enabled()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + hedge_budget(endpoint) if hedging else None
+
+    running: dict[asyncio.Task, int] = {}
+    started: dict[int, float] = {}
+    hedged: set[int] = set()
+    refusal: tuple[int, str] | None = None
+    last_error: Exception | None = None
+
+    def start_next() -> None:
+        index = len(started)
+        name, model, provider = chain[index]
+        started[index] = loop.time()
+        running[asyncio.ensure_future(_atry_model(
+            name, model, provider, system_prompt, user_message, context, history, endpoint, suffix,
+        ))] = index
+
+    start_next()
+    try:
+        while running:
+            timeout = None
+            if hedging:
+                timeout = deadline - loop.time()
+                if len(started) < len(chain):
+                    newest = max(running.values())
+                    hedge_at = started[newest] + hedge_delay(endpoint, chain[newest][1])
+                    timeout = min(timeout, hedge_at - loop.time())
+                timeout = max(timeout, 0.0)
+
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if loop.time() >= deadline:
+                    logger.error(f"LLM budget of {hedge_budget(endpoint):.0f}s exhausted{suffix}")
+                    break
+                record_hedge(endpoint, "fired")
+                hedged.add(len(started))
+                logger.info(f"{chain[max(running.values())][0]} slow{suffix}, hedging with {chain[len(started)][0]}")
+                start_next()
+                continue
+
+            for task in done:
+                index = running.pop(task)
+                name = chain[index][0]
+                try:
+                    result = task.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"{name} failed{suffix}: {e}")
+                    continue
+                if not _is_refusal(result):
+                    if hedged:
+                        record_hedge(endpoint, "won" if index in hedged else "lost")
+                    return result
+                logger.warning(f"{name} refused{suffix}, falling back")
+                if refusal is None or index > refusal[0]:
+                    refusal = (index, result)
+
+            if not running and len(started) < len(chain):
+                start_next()
+    finally:
+        for task, index in running.items():
+            task.cancel()
+            record_hedge(endpoint, "cancelled")
+            # Being slower than a sibling isn't a failure, but a call that
+            # outlived its own deadline would have timed out on its own
+            _, model, provider = chain[index]
+            elapsed = loop.time() - started[index]
+            if elapsed >= _COMPLETION_PARAMS["timeout"]:
+                record(model, "timeout", elapsed, provider)
+            # Its latency is at least ``elapsed``: leaving slow calls out of
+            # the sample would pull the p95 (and the hedge delay) down. Calls
+            # started late and cancelled early say nothing, so skip those.
+            if elapsed >= hedge_delay(endpoint, model):
+                record_latency(endpoint, model, elapsed)
+
+    if refusal is not None:
+        return refusal[1]
+    logger.error(f"All models failed{suffix}: {last_error}")
+    raise RuntimeError("AI service unavailable. Please try again later.") from last_error
+
+
+# _is_refusal only looks at the first 200 chars, so streams hold back that much
+_REFUSAL_WINDOW_CHARS = 200
+
+
+async def _astream_with_fallback(
+    system_prompt: str,
+    user_message: str,
+    context: str,
+    label: str = "",
+    history: list[dict] | None = None,
+) -> AsyncIterator[str]:
+    """Streaming ``_acall_with_fallback``: yields the answer's text as it arrives.
+
+    Each model's first _REFUSAL_WINDOW_CHARS are held back so a refusal or an
+    early failure can still move on to the next model. Once text has been
+    sent the model is committed: a later failure raises. Not hedged, and a
+    Gemini direct refusal falls back instead of being retried.
+
+    Raises:
+        RuntimeError: No model answered, or the answering model failed mid-stream
+    """
+    suffix = f" for {label}" if label else ""
+    chain = _fallback_chain()
+    for i, (name, model, provider) in enumerate(chain):
+        last = i == len(chain) - 1
+        start = time.perf_counter()
+        head = ""
+        flushed = refused = False
+        try:
+            client = get_async_openai_client(provider)
+            async with aclosing(_astream_model(model, system_prompt, user_message, context, client, history)) as stream:
+                async for text in stream:
+                    if flushed:
+                        yield text
+                        continue
+                    head += text
+                    if len(head) >= _REFUSAL_WINDOW_CHARS:
+                        if not last and _is_refusal(head):
+                            refused = True
+                            break
+                        flushed = True
+                        yield head
+            if not flushed and not last and _is_refusal(head):
+                refused = True
+            _record_outcome(model, provider, head, None, start)
+            if refused:
+                logger.warning(f"{name} refused{suffix}, falling back")
+                continue
+            if not flushed and head:
+                yield head
+            return
+        except Exception as e:
+            _record_outcome(model, provider, None, e, start)
+            if flushed or last:
+                logger.error(f"{name} stream failed{suffix}: {e}")
+                raise RuntimeError("AI service unavailable. Please try again later.") from e
+            logger.warning(f"{name} failed{suffix}: {e}")
+    raise RuntimeError("AI service unavailable. Please try again later.")
 
 
 # ---------------------------------------------------------------------------
@@ -586,52 +844,107 @@ def _truncate(text: str, limit: int, label: str = "input") -> str:
 # Public API
 # ---------------------------------------------------------------------------
 
+# Each public function has an async twin (a-prefixed) for the routes: same
+# request builder and response parser, but awaited on AsyncOpenAI so a slow
+# model never blocks the event loop.
+
+def _strip_code_fences(raw: str) -> str:
+    cleaned = raw.strip()
+    # Remove markdown code fences if present
+    if cleaned.startswith("```"):
+        cleaned = cleaned.split("\n", 1)[1]
+        cleaned = cleaned.rsplit("```", 1)[0].strip()
+    return cleaned
+
+
+def _chat_request(
+    message: str,
+    sheet_data: dict | None,
+    sheet_name: str | None,
+    history: list[dict] | None,
+) -> tuple:
+    message = _truncate(message, _MAX_MESSAGE_CHARS, "chat message")
+    context = _build_context_message(sheet_data, sheet_name)
+    context = _truncate(context, _MAX_CONTEXT_CHARS, "chat context")
+    return SYSTEM_PROMPT, message, context, "chat", history
+
+
 def chat_completion(
     message: str,
     sheet_data: dict | None = None,
     sheet_name: str | None = None,
     history: list[dict] | None = None,
 ) -> str:
-    """Send a chat query to AI. Tries Gemini direct first, falls back to OpenRouter."""
-    message = _truncate(message, _MAX_MESSAGE_CHARS, "chat message")
-    context = _build_context_message(sheet_data, sheet_name)
-    context = _truncate(context, _MAX_CONTEXT_CHARS, "chat context")
-    return _call_with_fallback(SYSTEM_PROMPT, message, context, "chat", history)
+    """Send a chat query to AI, trying each model in _fallback_chain()."""
+    return _call_with_fallback(*_chat_request(message, sheet_data, sheet_name, history))
 
 
-def agent_completion(
+async def achat_completion(
     message: str,
     sheet_data: dict | None = None,
     sheet_name: str | None = None,
     history: list[dict] | None = None,
-) -> dict | None:
-    """Send an agent-style query that returns a structured execution plan.
+) -> str:
+    """Async ``chat_completion``."""
+    return await _acall_with_fallback(*_chat_request(message, sheet_data, sheet_name, history))
 
-    Returns parsed JSON dict with steps, or None if parsing fails.
-    """
+
+async def astream_chat_completion(
+    message: str,
+    sheet_data: dict | None = None,
+    sheet_name: str | None = None,
+    history: list[dict] | None = None,
+) -> AsyncIterator[str]:
+    """Streaming ``chat_completion``: yields answer text as the model produces it."""
+    async for text in _astream_with_fallback(*_chat_request(message, sheet_data, sheet_name, history)):
+        yield text
+
+
+def _agent_request(
+    message: str,
+    sheet_data: dict | None,
+    sheet_name: str | None,
+    history: list[dict] | None,
+) -> tuple:
     message = _truncate(message, _MAX_MESSAGE_CHARS, "agent message")
     context = _build_context_message(sheet_data, sheet_name)
     context = _truncate(context, _MAX_CONTEXT_CHARS, "agent context")
-    raw = _call_with_fallback(AGENT_SYSTEM_PROMPT, message, context, "agent", history)
+    return AGENT_SYSTEM_PROMPT, message, context, "agent", history
+
 
-    # Try to parse the JSON response
+def _parse_agent_plan(raw: str) -> dict | None:
     try:
-        cleaned = raw.strip()
-        # Remove markdown code fences if present
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("\n", 1)[1]
-            cleaned = cleaned.rsplit("```", 1)[0].strip()
-        return json.loads(cleaned)
+        return json.loads(_strip_code_fences(raw))
     except (json.JSONDecodeError, IndexError):
         logger.warning(f"Agent response was not valid JSON, falling back to chat mode")
         return None
 
 
-def formula_completion(
-    prompt: str,
-    range_data: list[list] | None = None,
-) -> str:
-    """Process a =SHEETMIND() formula request. Returns the result value."""
+def agent_completion(
+    message: str,
+    sheet_data: dict | None = None,
+    sheet_name: str | None = None,
+    history: list[dict] | None = None,
+) -> dict | None:
+    """Send an agent-style query that returns a structured execution plan.
+
+    Returns parsed JSON dict with steps, or None if parsing fails.
+    """
+    return _parse_agent_plan(_call_with_fallback(*_agent_request(message, sheet_data, sheet_name, history)))
+
+
+async def aagent_completion(
+    message: str,
+    sheet_data: dict | None = None,
+    sheet_name: str | None = None,
+    history: list[dict] | None = None,
+) -> dict | None:
+    """Async ``agent_completion``."""
+    raw = await _acall_with_fallback(*_agent_request(message, sheet_data, sheet_name, history))
+    return _parse_agent_plan(raw)
+
+
+def _formula_request(prompt: str, range_data: list[list] | None) -> tuple:
     prompt = _truncate(prompt, _MAX_MESSAGE_CHARS, "formula prompt")
     context = ""
     if range_data:
@@ -639,24 +952,36 @@ def formula_completion(
         for i, row in enumerate(range_data):
             context += f"  Row {i + 1}: {json.dumps(row)}\n"
     context = _truncate(context, _MAX_CONTEXT_CHARS, "formula context")
-    return _call_with_fallback(FORMULA_SYSTEM_PROMPT, prompt, context, "formula")
+    return FORMULA_SYSTEM_PROMPT, prompt, context, "formula"
 
 
-def fix_formula(formula: str, error_message: str, sheet_context: str | None = None) -> dict:
-    """Fix a broken spreadsheet formula. Returns dict with fixed_formula, what_was_wrong, explanation."""
+def formula_completion(
+    prompt: str,
+    range_data: list[list] | None = None,
+) -> str:
+    """Process a =SHEETMIND() formula request. Returns the result value."""
+    return _call_with_fallback(*_formula_request(prompt, range_data))
+
+
+async def aformula_completion(
+    prompt: str,
+    range_data: list[list] | None = None,
+) -> str:
+    """Async ``formula_completion``."""
+    return await _acall_with_fallback(*_formula_request(prompt, range_data))
+
+
+def _fix_request(formula: str, error_message: str, sheet_context: str | None) -> tuple:
     formula = _truncate(formula, _MAX_MESSAGE_CHARS, "fix formula")
     user_message = f"Broken formula:\n{formula}\n\nError message:\n{error_message}"
     if sheet_context:
         user_message += f"\n\nSheet context:\n{_truncate(sheet_context, _MAX_CONTEXT_CHARS, 'fix context')}"
+    return FIX_SYSTEM_PROMPT, user_message, "", "fix"
 
-    raw = _call_with_fallback(FIX_SYSTEM_PROMPT, user_message, "", "fix")
 
+def _parse_fix(raw: str) -> dict:
     try:
-        cleaned = raw.strip()
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("\n", 1)[1]
-            cleaned = cleaned.rsplit("```", 1)[0]
-        return json.loads(cleaned)
+        return json.loads(_strip_code_fences(raw))
     except (json.JSONDecodeError, IndexError):
         return {
             "fixed_formula": "",
@@ -665,11 +990,30 @@ def fix_formula(formula: str, error_message: str, sheet_context: str | None = No
         }
 
 
-def explain_formula(formula: str) -> str:
-    """Explain a spreadsheet formula in plain English."""
+def fix_formula(formula: str, error_message: str, sheet_context: str | None = None) -> dict:
+    """Fix a broken spreadsheet formula. Returns dict with fixed_formula, what_was_wrong, explanation."""
+    return _parse_fix(_call_with_fallback(*_fix_request(formula, error_message, sheet_context)))
+
+
+async def afix_formula(formula: str, error_message: str, sheet_context: str | None = None) -> dict:
+    """Async ``fix_formula``."""
+    return _parse_fix(await _acall_with_fallback(*_fix_request(formula, error_message, sheet_context)))
+
+
+def _explain_request(formula: str) -> tuple:
     formula = _truncate(formula, _MAX_MESSAGE_CHARS, "explain formula")
     user_message = f"Explain this spreadsheet formula:\n\n{formula}"
-    return _call_with_fallback(EXPLAIN_SYSTEM_PROMPT, user_message, "", "explain")
+    return EXPLAIN_SYSTEM_PROMPT, user_message, "", "explain"
+
+
+def explain_formula(formula: str) -> str:
+    """Explain a spreadsheet formula in plain English."""
+    return _call_with_fallback(*_explain_request(formula))
+
+
+async def aexplain_formula(formula: str) -> str:
+    """Async ``explain_formula``."""
+    return await _acall_with_fallback(*_explain_request(formula))
 
 
 # ---------------------------------------------------------------------------
@@ -722,12 +1066,7 @@ Rules:
 """
 
 
-def generate_chart_config(
-    data: dict,
-    chart_type: str | None = None,
-    title: str | None = None,
-) -> str:
-    """Call AI to generate a Chart.js config from spreadsheet data. Returns raw AI text."""
+def _chart_request(data: dict, chart_type: str | None, title: str | None) -> tuple:
     parts = []
     if chart_type:
         parts.append(f"Chart type requested: {chart_type}")
@@ -736,21 +1075,36 @@ def generate_chart_config(
     data_str = _truncate(json.dumps(data), _MAX_CONTEXT_CHARS, "chart data")
     parts.append(f"Data:\n{data_str}")
     user_message = "\n".join(parts)
-    return _call_with_fallback(CHART_SYSTEM_PROMPT, user_message, "", "chart")
+    return CHART_SYSTEM_PROMPT, user_message, "", "chart"
 
 
-def explain_formula_enhanced(formula: str) -> dict:
-    """Explain a formula with step-by-step breakdown. Returns parsed dict."""
+def generate_chart_config(
+    data: dict,
+    chart_type: str | None = None,
+    title: str | None = None,
+) -> str:
+    """Call AI to generate a Chart.js config from spreadsheet data. Returns raw AI text."""
+    return _call_with_fallback(*_chart_request(data, chart_type, title))
+
+
+async def agenerate_chart_config(
+    data: dict,
+    chart_type: str | None = None,
+    title: str | None = None,
+) -> str:
+    """Async ``generate_chart_config``."""
+    return await _acall_with_fallback(*_chart_request(data, chart_type, title))
+
+
+def _enhanced_explain_request(formula: str) -> tuple:
     formula = _truncate(formula, _MAX_MESSAGE_CHARS, "enhanced explain formula")
     user_message = f"Explain this spreadsheet formula step by step:\n\n{formula}"
-    raw = _call_with_fallback(ENHANCED_EXPLAIN_SYSTEM_PROMPT, user_message, "", "enhanced_explain")
+    return ENHANCED_EXPLAIN_SYSTEM_PROMPT, user_message, "", "enhanced_explain"
+
 
+def _parse_enhanced_explain(raw: str) -> dict:
     try:
-        cleaned = raw.strip()
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("\n", 1)[1]
-            cleaned = cleaned.rsplit("```", 1)[0]
-        return json.loads(cleaned)
+        return json.loads(_strip_code_fences(raw))
     except (json.JSONDecodeError, IndexError):
         return {
             "summary": raw,
@@ -758,3 +1112,13 @@ def explain_formula_enhanced(formula: str) -> dict:
             "simpler_alternative": None,
             "full_explanation": raw,
         }
+
+
+def explain_formula_enhanced(formula: str) -> dict:
+    """Explain a formula with step-by-step breakdown. Returns parsed dict."""
+    return _parse_enhanced_explain(_call_with_fallback(*_enhanced_explain_request(formula)))
+
+
+async def aexplain_formula_enhanced(formula: str) -> dict:
+    """Async ``explain_formula_enhanced``."""
+    return _parse_enhanced_explain(await _acall_with_fallback(*_enhanced_explain_request(formula)))
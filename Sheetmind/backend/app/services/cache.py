@@ -1,20 +1,22 @@
 """
 Response cache — stores AI responses in Redis to avoid redundant API calls.
 
-Cache key: hash of (user_id, prompt, sheet_data_hash, endpoint_type)
+Cache key: hash of (user_id, prompt, sheet_data_hash, endpoint_type), where
+sheet_data_hash is the sheet fingerprint (see app.services.fingerprint)
 Default TTL: 1 hour (configurable)
 
 Falls open: if Redis is unavailable, requests go straight to AI.
 """
 
 import hashlib
-import json
 import logging
 import time
 
 import redis
 
 from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.services.fingerprint import data_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -69,12 +71,12 @@ def _get_redis() -> redis.Redis | None:
 
 def _make_key(user_id: str, endpoint: str, prompt: str, data: dict | list | None = None) -> str:
     """Build a deterministic cache key from request params."""
-    raw = json.dumps({
+    raw = dumps({
         "user_id": user_id,
         "endpoint": endpoint,
         "prompt": prompt,
-        "data": data,
-    }, sort_keys=True, default=str)
+        "data": data_fingerprint(data) if data is not None else None,
+    }, sort_keys=True)
     digest = hashlib.sha256(raw.encode()).hexdigest()[:24]
     return f"cache:{endpoint}:{digest}"
 
@@ -94,7 +96,7 @@ def get_cached(user_id: str, endpoint: str, prompt: str, data: dict | list | Non
         raw = r.get(key)
         if raw:
             logger.info(f"Cache HIT: {key}")
-            return json.loads(raw)
+            return loads(raw)
         return None
     except redis.exceptions.ConnectionError as e:
         global _redis_client, _redis_last_fail
@@ -122,7 +124,7 @@ def set_cached(
 
     key = _make_key(user_id, endpoint, prompt, data)
     try:
-        r.setex(key, ttl, json.dumps(response, default=str))
+        r.setex(key, ttl, dumps(response, default=str))
         logger.info(f"Cache SET: {key} (TTL={ttl}s)")
     except redis.exceptions.ConnectionError as e:
         global _redis_client, _redis_last_fail
@@ -2,7 +2,7 @@ import json
 import logging
 import re
 
-from app.services.ai_provider import generate_chart_config
+from app.services.ai_provider import agenerate_chart_config, generate_chart_config
 
 logger = logging.getLogger(__name__)
 
@@ -100,29 +100,15 @@ def _build_fallback_config(
     }
 
 
-def generate_chart(
-    data: dict,
-    chart_type: str | None = None,
-    title: str | None = None,
-) -> dict:
-    """Generate a Chart.js config from spreadsheet data via AI, with fallback.
-
-    Returns a dict containing the Chart.js configuration.
-    """
+def _prepare_chart_data(data: dict, chart_type: str | None) -> tuple[dict, str]:
     # Truncate to MAX_ROWS
     truncated = dict(data)
     if "rows" in truncated and len(truncated["rows"]) > MAX_ROWS:
         truncated["rows"] = truncated["rows"][:MAX_ROWS]
+    return truncated, chart_type or detect_chart_type(truncated)
 
-    resolved_type = chart_type or detect_chart_type(truncated)
 
-    try:
-        raw = generate_chart_config(truncated, chart_type=resolved_type, title=title)
-    except RuntimeError:
-        logger.warning("AI chart generation failed, using fallback config")
-        return _build_fallback_config(truncated, resolved_type, title)
-
-    # Parse AI response
+def _parse_chart_config(raw: str, truncated: dict, resolved_type: str, title: str | None) -> dict:
     try:
         cleaned = raw.strip()
         if cleaned.startswith("```"):
@@ -136,3 +122,40 @@ def generate_chart(
     except (json.JSONDecodeError, IndexError):
         logger.warning("Could not parse AI chart response, using fallback config")
         return _build_fallback_config(truncated, resolved_type, title)
+
+
+def generate_chart(
+    data: dict,
+    chart_type: str | None = None,
+    title: str | None = None,
+) -> dict:
+    """Generate a Chart.js config from spreadsheet data via AI, with fallback.
+
+    Returns a dict containing the Chart.js configuration.
+    """
+    truncated, resolved_type = _prepare_chart_data(data, chart_type)
+
+    try:
+        raw = generate_chart_config(truncated, chart_type=resolved_type, title=title)
+    except RuntimeError:
+        logger.warning("AI chart generation failed, using fallback config")
+        return _build_fallback_config(truncated, resolved_type, title)
+
+    return _parse_chart_config(raw, truncated, resolved_type, title)
+
+
+async def agenerate_chart(
+    data: dict,
+    chart_type: str | None = None,
+    title: str | None = None,
+) -> dict:
+    """Async ``generate_chart``."""
+    truncated, resolved_type = _prepare_chart_data(data, chart_type)
+
+    try:
+        raw = await agenerate_chart_config(truncated, chart_type=resolved_type, title=title)
+    except RuntimeError:
+        logger.warning("AI chart generation failed, using fallback config")
+        return _build_fallback_config(truncated, resolved_type, title)
+
+    return _parse_chart_config(raw, truncated, resolved_type, title)
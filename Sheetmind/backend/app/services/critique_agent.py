@@ -652,15 +652,9 @@ class CritiqueAgent:
             if not settings.OPENROUTER_API_KEY:
                 return {"critique_text": "LGTM", "action": "lgtm"}
 
-            from langchain_openai import ChatOpenAI
-
-            llm = ChatOpenAI(
-                model="google/gemini-2.0-flash-001",
-                api_key=settings.OPENROUTER_API_KEY,
-                base_url="https://openrouter.ai/api/v1",
-                temperature=0.0,
-                max_tokens=512,
-            )
+            from app.services.llm_clients import get_chat_model
+
+            llm = get_chat_model("google/gemini-2.0-flash-001", temperature=0.0, max_tokens=512)
 
             actions_summary = json.dumps(
                 [{"action": a.get("action"), "cell": a.get("cell", ""), "formula": a.get("formula", "")[:80]}
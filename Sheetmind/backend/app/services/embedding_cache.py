@@ -0,0 +1,162 @@
+"""
+Embedding cache — content-addressed row embeddings shared across re-indexes.
+
+The same row text is embedded again whenever a sheet is re-indexed after a
+restart, copied to another sheet, or shared between users. ``CachedEmbeddings``
+wraps the Google/OpenRouter embeddings model and looks each text up by
+(model, hash of the whitespace-normalized text) before calling the API:
+
+1. In-process LRU
+2. Redis (shared across workers, one MGET per batch, 7 day TTL)
+3. The embeddings API, for misses only — results are written back to both tiers
+
+Vectors are kept as float32 arrays (base64 in Redis), and the in-process
+LRU is bounded by bytes. Falls open: if Redis is unavailable, only the
+in-process LRU is used.
+"""
+
+import base64
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_TTL = 7 * 24 * 3600  # 7 days in seconds (embeddings are deterministic)
+_LOCAL_LRU_BYTES = 32 * 1024 * 1024  # per worker; ~5,400 1536-dim float32 vectors
+
+_local = LRUCache(_LOCAL_LRU_BYTES, sizeof=lambda vector: vector.nbytes)
+_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _redis():
+    try:
+        from app.services.cache import _get_redis
+        return _get_redis()
+    except Exception:
+        return None
+
+
+def _text_key(model: str, text: str) -> str:
+    normalized = " ".join(text.split())
+    digest = hashlib.blake2b(f"{model}\0{normalized}".encode(), digest_size=16).hexdigest()
+    return f"emb:{digest}"
+
+
+def _encode(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.tobytes()).decode()
+
+
+def _decode(raw: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(raw), dtype=np.float32)
+
+
+def _count(**deltas: int) -> None:
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the wrapped model."""
+
+    def __init__(self, embeddings: Embeddings, model: str):
+        """
+        Args:
+            embeddings: The underlying embeddings model
+            model: Cache namespace — vectors from different models never mix
+        """
+        self.embeddings = embeddings
+        self.model = model
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        missing = []
+        for key in keys:
+            vector = _local.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                missing.append(key)
+        local_hits = len(found)
+
+        r = _redis() if missing else None
+        if r is not None:
+            try:
+                for key, raw in zip(missing, r.mget(missing)):
+                    if raw:
+                        vector = _decode(raw)
+                        _local.set(key, vector)
+                        found[key] = vector
+            except Exception as e:
+                logger.warning(f"Embedding cache mget failed: {e}")
+
+        _count(local_hits=local_hits, redis_hits=len(found) - local_hits)
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]) -> None:
+        for key, vector in vectors.items():
+            _local.set(key, vector)
+
+        r = _redis()
+        if r is None:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.setex(key, EMBEDDING_CACHE_TTL, _encode(vector))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache set failed: {e}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_text_key(self.model, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once
+        to_embed: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in to_embed:
+                to_embed[key] = text
+        if to_embed:
+            _count(misses=len(to_embed))
+            vectors = self.embeddings.embed_documents(list(to_embed.values()))
+            new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(to_embed, vectors)}
+            self._store(new)
+            found.update(new)
+
+        logger.info(f"Embedding cache: {len(texts) - len(to_embed)}/{len(texts)} texts cached ({self.model})")
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = _text_key(f"{self.model}:query", text)
+        vector: Optional[np.ndarray] = self._lookup([key]).get(key)
+        if vector is None:
+            _count(misses=1)
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self._store({key: vector})
+        return vector.tolist()
+
+
+def embedding_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters since process start (for health and benchmarks)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+    stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+    return stats
+
+
+def clear_local_cache() -> None:
+    """Drop the in-process tier and reset counters (Redis entries expire on their own)."""
+    _local.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
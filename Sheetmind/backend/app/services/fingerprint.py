@@ -0,0 +1,141 @@
+"""
+Sheet fingerprinting — content hashes for cache keys, RAG collections and diffs.
+
+Replaces ``json.dumps(cells, sort_keys=True)`` + MD5/SHA over the whole sheet.
+One pass over the parsed SheetFrame yields:
+
+- a hash per populated row (cells in column order)
+- a hash per column (values aligned to the sheet's populated rows; the
+  column letter is excluded so moved columns keep their hash)
+- a Merkle root over blocks of (row number, row hash) leaves plus the
+  column layout
+
+The result is memoized on the request's SheetFrame, so the response cache,
+RAG, the classifier cache and the metadata cache share one computation, and
+``changed_rows()`` tells a caller exactly which rows differ from a previous
+version of the sheet.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Any, Dict, List, Optional
+
+from app.core.serialization import dumps, dumps_bytes
+from app.services.sheet_frame import SheetFrame, get_frame
+
+_DIGEST_SIZE = 16
+_CELL_SEP = "\x1f"
+_BLOCK_ROWS = 256
+_EMPTY_ROOT = hashlib.blake2b(b"", digest_size=_DIGEST_SIZE).hexdigest()
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=_DIGEST_SIZE).digest()
+
+
+def _merkle_root(layout: bytes, row_numbers: List[int], row_digests: List[bytes]) -> bytes:
+    """
+    Two-level Merkle root: rows are grouped into fixed-size blocks, each block
+    is hashed over its (row number, row hash) leaves, and the root hashes the
+    column layout followed by the block hashes.
+    """
+    leaves = [b"%d:" % r + d for r, d in zip(row_numbers, row_digests)]
+    blocks = [
+        _digest(b"".join(leaves[i:i + _BLOCK_ROWS]))
+        for i in range(0, len(leaves), _BLOCK_ROWS)
+    ]
+    return _digest(layout + b"".join(blocks))
+
+
+@dataclass(frozen=True)
+class SheetFingerprint:
+    """Content hashes for one version of a sheet."""
+    root: str                       # Hex Merkle root over rows + column layout
+    row_hashes: Dict[int, str]      # Populated row number -> hex row hash
+    column_hashes: Dict[str, str]   # Column letter -> hex column hash
+
+    def short(self, length: int = 12) -> str:
+        """Truncated root for names and keys (collection names, cache keys)."""
+        return self.root[:length]
+
+    def changed_rows(self, previous: Optional["SheetFingerprint"]) -> List[int]:
+        """Rows added or modified since ``previous`` (all rows if None)."""
+        if previous is None:
+            return sorted(self.row_hashes)
+        old = previous.row_hashes
+        return sorted(r for r, h in self.row_hashes.items() if old.get(r) != h)
+
+    def removed_rows(self, previous: Optional["SheetFingerprint"]) -> List[int]:
+        """Rows present in ``previous`` that are no longer populated."""
+        if previous is None:
+            return []
+        return sorted(r for r in previous.row_hashes if r not in self.row_hashes)
+
+    def changed_columns(self, previous: Optional["SheetFingerprint"]) -> List[str]:
+        """Columns added or modified since ``previous`` (all columns if None)."""
+        old = previous.column_hashes if previous is not None else {}
+        return [c for c, h in self.column_hashes.items() if old.get(c) != h]
+
+
+def _compute(frame: SheetFrame) -> SheetFingerprint:
+    if frame.is_empty:
+        return SheetFingerprint(root=_EMPTY_ROOT, row_hashes={}, column_hashes={})
+
+    row_numbers = frame.row_numbers
+    # Column-aligned values: one list per column, "" where a row has no cell
+    aligned = [
+        list(map(frame.column(col).get, row_numbers, repeat("")))
+        for col in frame.columns
+    ]
+
+    column_hashes = {
+        col: _digest(_CELL_SEP.join(values).encode()).hex()
+        for col, values in zip(frame.columns, aligned)
+    }
+
+    blake2b = hashlib.blake2b
+    sep = _CELL_SEP
+    row_digests = [
+        blake2b(sep.join(cells).encode(), digest_size=_DIGEST_SIZE).digest()
+        for cells in zip(*aligned)
+    ]
+    row_hashes = dict(zip(row_numbers, (d.hex() for d in row_digests)))
+
+    layout = _digest(",".join(frame.columns).encode())
+    root = _merkle_root(layout, row_numbers, row_digests).hex()
+
+    return SheetFingerprint(root=root, row_hashes=row_hashes, column_hashes=column_hashes)
+
+
+def get_fingerprint(cells: Optional[Dict[str, Any]]) -> SheetFingerprint:
+    """
+    Fingerprint a cells dict, computing it at most once per parsed frame.
+
+    Args:
+        cells: A1-keyed cells dict (``None`` is treated as empty)
+
+    Returns:
+        SheetFingerprint shared by every caller within the request
+    """
+    frame = get_frame(cells)
+    fingerprint = frame.derived.get("fingerprint")
+    if fingerprint is None:
+        fingerprint = _compute(frame)
+        frame.derived["fingerprint"] = fingerprint
+    return fingerprint
+
+
+def data_fingerprint(data: Any) -> str:
+    """
+    Stable hash of a request payload for cache keys.
+
+    Sheet payloads (dicts with a ``cells`` dict) use the sheet fingerprint
+    root for the cells and hash only the remaining small fields; anything
+    else falls back to hashing its sorted JSON form.
+    """
+    if isinstance(data, dict) and isinstance(data.get("cells"), dict):
+        rest = {k: v for k, v in data.items() if k != "cells"}
+        extra = dumps(rest, sort_keys=True, default=str) if rest else ""
+        return _digest(f"{get_fingerprint(data['cells']).root}|{extra}".encode()).hex()
+    return _digest(dumps_bytes(data, sort_keys=True, default=str)).hex()
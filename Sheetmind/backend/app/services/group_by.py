@@ -0,0 +1,166 @@
+"""
+Group-by aggregation kernel.
+
+Shared by the local query engine, the SmartExecutor templates (grouped
+summaries, duplicates) and the inline chart builders. Rows are hashed into
+group codes in a single pass over the key column(s); every aggregation is
+then a vectorized pass over those codes (``np.bincount`` / ``ufunc.at``), so
+cost is O(rows) regardless of how many groups there are.
+
+Typical use::
+
+    groups = group_rows(frame.aligned_column("C", rows))
+    totals = groups.aggregate("sum", numeric_array(frame.aligned_column("E", rows)))
+    dict(zip(groups.keys, totals))
+"""
+
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+AGGREGATIONS = ("sum", "avg", "count", "min", "max", "distinct")
+
+
+class Groups:
+    """
+    Rows assigned to groups by key.
+
+    Attributes:
+        keys: Group keys in first-seen order (a str for single-key groups,
+            a tuple of str for multi-key groups)
+        codes: Group index per input row; -1 for rows with a blank key
+    """
+
+    __slots__ = ("keys", "codes", "_sizes")
+
+    def __init__(self, keys: List[Hashable], codes: np.ndarray):
+        self.keys = keys
+        self.codes = codes
+        self._sizes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """Number of rows in each group."""
+        if self._sizes is None:
+            self._sizes = np.bincount(self.codes[self.codes >= 0], minlength=len(self.keys))
+        return self._sizes
+
+    def aggregate(self, aggregation: str, values: Optional[Sequence] = None) -> np.ndarray:
+        """
+        Aggregate ``values`` per group.
+
+        Args:
+            aggregation: One of sum, avg, count, min, max, distinct
+            values: Aligned to the input rows. A float array (NaN = no value)
+                for sum/avg/min/max; any hashables for distinct ("" ignored).
+                Not needed for count, which counts rows.
+
+        Returns:
+            float64 array aligned to ``keys``; NaN for groups with no values
+            (count and distinct return 0 instead)
+
+        Raises:
+            ValueError: Unknown aggregation, or missing values
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregation}")
+        n_groups = len(self.keys)
+        if aggregation == "count":
+            return self.sizes.astype(float)
+        if values is None:
+            raise ValueError(f"{aggregation} needs values")
+        if aggregation == "distinct":
+            return self._distinct(values)
+
+        values = np.asarray(values, dtype=float)
+        keep = (self.codes >= 0) & ~np.isnan(values)
+        codes, values = self.codes[keep], values[keep]
+        present = np.bincount(codes, minlength=n_groups)
+
+        if aggregation in ("sum", "avg"):
+            result = np.bincount(codes, weights=values, minlength=n_groups)
+            if aggregation == "avg":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result = result / present
+        else:
+            result = np.full(n_groups, np.inf if aggregation == "min" else -np.inf)
+            (np.minimum if aggregation == "min" else np.maximum).at(result, codes, values)
+        result[present == 0] = np.nan
+        return result
+
+    def _distinct(self, values: Sequence) -> np.ndarray:
+        pairs = {
+            (code, value)
+            for code, value in zip(self.codes.tolist(), values)
+            if code >= 0 and value != ""
+        }
+        codes = np.fromiter((code for code, _ in pairs), dtype=np.int64, count=len(pairs))
+        return np.bincount(codes, minlength=len(self.keys)).astype(float)
+
+    def members(self) -> List[np.ndarray]:
+        """Input row positions belonging to each group, in input order."""
+        order = np.argsort(self.codes, kind="stable")
+        order = order[self.codes[order] >= 0]
+        return np.split(order, np.cumsum(self.sizes)[:-1])
+
+    def to_dict(self, aggregation: str, values: Optional[Sequence] = None) -> Dict[Hashable, float]:
+        """{key: aggregate}, skipping groups with no values."""
+        result = self.aggregate(aggregation, values)
+        return {k: v for k, v in zip(self.keys, result.tolist()) if v == v}
+
+
+def group_rows(*key_columns: Sequence[str]) -> Groups:
+    """
+    Hash rows into groups by one or more aligned key columns.
+
+    Keys are stripped; a row with any blank key part is left ungrouped.
+
+    Args:
+        key_columns: One or more equal-length sequences of cell values
+
+    Returns:
+        Groups (single-key groups are keyed by str, multi-key by tuple)
+    """
+    if not key_columns:
+        raise ValueError("group_rows needs at least one key column")
+
+    if len(key_columns) == 1:
+        keys, codes = _encode(key_columns[0])
+        return Groups(keys, codes)
+
+    # Multi-key: combine per-column codes, re-densifying after each column
+    # so the combined code can't overflow, then restore first-seen order
+    encoded = [_encode(column) for column in key_columns]
+    valid = np.logical_and.reduce([codes >= 0 for _, codes in encoded])
+    combined = np.zeros(int(valid.sum()), dtype=np.int64)
+    for _, codes in encoded:
+        combined = combined * (codes.max(initial=0) + 1) + codes[valid]
+        _, combined = np.unique(combined, return_inverse=True)
+
+    _, first = np.unique(combined, return_index=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    codes = np.full(len(valid), -1, dtype=np.int64)
+    codes[valid] = rank[combined]
+    positions = np.flatnonzero(valid)[first[order]].tolist()
+    keys = [tuple(col_keys[col_codes[p]] for col_keys, col_codes in encoded) for p in positions]
+    return Groups(keys, codes)
+
+
+def _encode(column: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Stripped distinct values in first-seen order, and a code per row (-1 = blank)."""
+    index: Dict[str, int] = {}
+    codes = [index.setdefault(k, len(index)) if k else -1 for k in (v.strip() for v in column)]
+    return list(index), np.array(codes, dtype=np.int64)
+
+
+def group_aggregate(
+    keys: Sequence[str], aggregation: str, values: Optional[Sequence] = None
+) -> Dict[str, float]:
+    """One-shot ``group_rows(keys).to_dict(aggregation, values)``."""
+    return group_rows(keys).to_dict(aggregation, values)
@@ -0,0 +1,123 @@
+"""
+Index registry — RAG collection state shared by all worker processes.
+
+Every uvicorn worker has its own SheetRAG, but the Chroma collections live
+in one CHROMA_PERSIST_DIR. This registry (``CHROMA_PERSIST_DIR/_registry``)
+records, per collection, which sheet content hash is indexed, which
+embedding model (and vector width) produced the vectors, and a version
+number bumped on every write. Indexing takes an exclusive file lock on the
+collection, so only one process embeds and writes a sheet at a time:
+
+- A worker that finds the registry already at the sheet's hash reopens the
+  finished collection instead of indexing it again
+- A worker that finds the lock held waits for it, then re-checks
+- A worker whose loaded collection is older than the registry version
+  reopens it (Chroma keeps a process-local copy of the vector index)
+
+Falls open: where ``fcntl`` isn't available (Windows dev machines) the lock
+only serializes threads within the process.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_POLL_INTERVAL = 0.05  # seconds between lock attempts while another worker indexes
+
+
+class IndexRegistry:
+    """On-disk {collection: {sheet_hash, embedding, documents, version}} with per-collection file locks."""
+
+    def __init__(self, root: Path):
+        self.path = Path(root) / "_registry"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._thread_lock = threading.Lock()
+
+    def _entry_path(self, collection_name: str) -> Path:
+        return self.path / f"{collection_name}.json"
+
+    def read(self, collection_name: str) -> Optional[Dict]:
+        """The collection's registry entry, or None if it was never indexed."""
+        try:
+            return json.loads(self._entry_path(collection_name).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable index registry entry for {collection_name}: {e}")
+            return None
+
+    def write(self, collection_name: str, sheet_hash: str, documents: int, embedding: str) -> int:
+        """
+        Record a finished index (call while holding ``lock()``).
+
+        Args:
+            embedding: Id of the vector space the collection holds (see
+                SheetRAG._embedding_id)
+
+        Returns:
+            The entry's new version
+        """
+        previous = self.read(collection_name)
+        version = (previous or {}).get("version", 0) + 1
+        entry = {
+            "sheet_hash": sheet_hash,
+            "embedding": embedding,
+            "documents": documents,
+            "version": version,
+            "updated_at": time.time(),
+            "pid": os.getpid(),
+        }
+        # Write-then-rename so readers never see a partial file
+        tmp = self._entry_path(collection_name).with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, self._entry_path(collection_name))
+        return version
+
+    def remove(self, collection_name: str) -> None:
+        for path in (self._entry_path(collection_name), self.path / f"{collection_name}.lock"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove {path.name}: {e}")
+
+    @contextmanager
+    def lock(self, collection_name: str, timeout: float) -> Iterator[None]:
+        """
+        Exclusive cross-process lock on one collection.
+
+        Raises:
+            TimeoutError: Another process held the lock for ``timeout`` seconds
+        """
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+
+        with open(self.path / f"{collection_name}.lock", "a+") as handle:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out waiting for another worker to index {collection_name}")
+                    time.sleep(_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
@@ -20,6 +20,8 @@ from langchain.memory import ConversationBufferWindowMemory
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.core.config import settings
+from app.services.llm_clients import get_chat_model
+from app.services.model_health import is_available
 from app.services.langchain_tools import (
     ALL_TOOLS,
     get_pending_actions,
@@ -27,8 +29,10 @@ from app.services.langchain_tools import (
     clear_pending_actions,
     verify_actions,
 )
-from app.services.rag_system import get_rag
-from app.services.sheet_analyzer import analyze_sheet, format_metadata_for_prompt, SheetMetadata
+from app.services.rag_system import DEFAULT_NAMESPACE, get_rag
+from app.services.sheet_frame import get_frame
+from app.services.metadata_cache import get_sheet_metadata
+from app.services.sheet_analyzer import format_metadata_for_prompt, SheetMetadata
 from app.services.formula_patterns import get_all_patterns_summary
 from app.services.formula_category_docs import (
     classify_formula_intent, get_category_docs, get_mini_cheat_sheet
@@ -36,6 +40,10 @@ from app.services.formula_category_docs import (
 
 logger = logging.getLogger(__name__)
 
+# OpenRouter models: Arcee Trinity (free) primary, Gemini fallback
+_PRIMARY_MODEL = "arcee-ai/trinity-large-preview:free"
+_FALLBACK_MODEL = "google/gemini-2.0-flash-001"
+
 # ---------------------------------------------------------------------------
 # ReAct Prompt Template
 # ---------------------------------------------------------------------------
@@ -225,23 +233,10 @@ class SheetMindAgent:
             self._llm_source = "gemini_direct"
         else:
             # Use OpenRouter — Arcee Trinity (free) as primary
-            from langchain_openai import ChatOpenAI
-            self.llm = ChatOpenAI(
-                model="arcee-ai/trinity-large-preview:free",
-                api_key=settings.OPENROUTER_API_KEY,
-                base_url="https://openrouter.ai/api/v1",
-                temperature=0.2,
-                max_tokens=2048,
-            )
+            self.llm = get_chat_model(_PRIMARY_MODEL, temperature=0.2, max_tokens=2048)
             self._llm_source = "openrouter_arcee"
-            # Gemini fallback LLM (used if primary fails)
-            self._fallback_llm = ChatOpenAI(
-                model="google/gemini-2.0-flash-001",
-                api_key=settings.OPENROUTER_API_KEY,
-                base_url="https://openrouter.ai/api/v1",
-                temperature=0.2,
-                max_tokens=2048,
-            )
+            # Gemini fallback LLM (used if primary fails or its circuit breaker is open)
+            self._fallback_llm = get_chat_model(_FALLBACK_MODEL, temperature=0.2, max_tokens=2048)
 
         # Conversation memory (remembers last N exchanges)
         self.memory = ConversationBufferWindowMemory(
@@ -252,24 +247,10 @@ class SheetMindAgent:
             output_key="output",
         )
 
-        # Create ReAct agent
-        self.agent = create_react_agent(
-            llm=self.llm,
-            tools=ALL_TOOLS,
-            prompt=REACT_PROMPT,
-        )
-
-        # Executor with error handling
-        self.executor = AgentExecutor(
-            agent=self.agent,
-            tools=ALL_TOOLS,
-            memory=self.memory,
-            verbose=settings.DEBUG,
-            max_iterations=10,  # Reduced from 15 — most tasks complete in 6-8 steps
-            max_execution_time=45,  # Reduced from 60s
-            handle_parsing_errors=True,
-            return_intermediate_steps=True,
-        )
+        if hasattr(self, "_fallback_llm") and not is_available(_PRIMARY_MODEL):
+            self.llm = self._fallback_llm
+            self._llm_source = "openrouter_gemini_fallback"
+        self._build_executor(self.llm)
 
         logger.info(f"Created SheetMindAgent for session {session_id} using {self._llm_source}")
 
@@ -280,6 +261,7 @@ class SheetMindAgent:
         sheet_name: Optional[str] = None,
         history: Optional[List[Dict[str, str]]] = None,
         precomputed_metadata: Optional[Dict] = None,
+        rag_namespace: str = DEFAULT_NAMESPACE,
     ) -> Dict[str, Any]:
         """
         Run the agent with a user message.
@@ -288,6 +270,7 @@ class SheetMindAgent:
             message: User's question or command
             sheet_data: Sheet context with cells dict
             sheet_name: Name of the active sheet
+            rag_namespace: Owner of the sheet's RAG index (user + spreadsheet)
 
         Returns:
             Dict with:
@@ -328,7 +311,7 @@ class SheetMindAgent:
                 timing["analysis_skipped"] = True
                 logger.info("Using precomputed metadata — skipped analyze_sheet()")
             else:
-                metadata = analyze_sheet(cells, effective_sheet_name)
+                metadata = get_sheet_metadata(cells, effective_sheet_name)
                 timing["analysis_ms"] = int((time.time() - analysis_start) * 1000)
 
             # Extract key values for prompt
@@ -372,6 +355,7 @@ class SheetMindAgent:
                 "sheetName": effective_sheet_name,
                 "dataRange": sheet_data.get("dataRange", ""),
                 "metadata": metadata.to_dict(),  # Include metadata in tool context
+                "ragNamespace": rag_namespace,
             })
 
             # Use RAG for large sheets
@@ -379,7 +363,7 @@ class SheetMindAgent:
                 rag_start = time.time()
                 rag = get_rag()
                 context_str, rows_used, used_rag = rag.get_context_for_query(
-                    message, cells, effective_sheet_name
+                    message, cells, effective_sheet_name, namespace=rag_namespace
                 )
                 timing["rag_ms"] = int((time.time() - rag_start) * 1000)
             else:
@@ -420,31 +404,26 @@ class SheetMindAgent:
         try:
             # Run the agent — try primary LLM, fall back to Gemini if available
             agent_start = time.time()
+            # Cached agents switch back once Arcee's breaker closes, and skip it while open
+            if hasattr(self, '_fallback_llm'):
+                if self.llm is self._fallback_llm and is_available(_PRIMARY_MODEL):
+                    self.llm = get_chat_model(_PRIMARY_MODEL, temperature=0.2, max_tokens=2048)
+                    self._llm_source = "openrouter_arcee"
+                    self._build_executor(self.llm)
+                elif self.llm is not self._fallback_llm and not is_available(_PRIMARY_MODEL):
+                    logger.info("Arcee circuit breaker open, using Gemini fallback")
+                    self._switch_to_fallback()
+                    timing["used_fallback"] = True
             try:
                 result = self.executor.invoke(invoke_input)
             except Exception as primary_err:
-                if hasattr(self, '_fallback_llm'):
+                if hasattr(self, '_fallback_llm') and self.llm is not self._fallback_llm:
                     logger.warning(
                         f"Primary LLM ({self._llm_source}) failed: {primary_err}, "
                         f"retrying with Gemini fallback"
                     )
                     clear_pending_actions()
-                    self.agent = create_react_agent(
-                        llm=self._fallback_llm,
-                        tools=ALL_TOOLS,
-                        prompt=REACT_PROMPT,
-                    )
-                    self.executor = AgentExecutor(
-                        agent=self.agent,
-                        tools=ALL_TOOLS,
-                        memory=self.memory,
-                        verbose=settings.DEBUG,
-                        max_iterations=10,
-                        max_execution_time=45,
-                        handle_parsing_errors=True,
-                        return_intermediate_steps=True,
-                    )
-                    self._llm_source = "openrouter_gemini_fallback"
+                    self._switch_to_fallback()
                     result = self.executor.invoke(invoke_input)
                     timing["used_fallback"] = True
                 else:
@@ -531,6 +510,31 @@ class SheetMindAgent:
                 "error": error_str,
             }
 
+    def _build_executor(self, llm) -> None:
+        """(Re)create the ReAct agent and its executor on ``llm``."""
+        self.agent = create_react_agent(
+            llm=llm,
+            tools=ALL_TOOLS,
+            prompt=REACT_PROMPT,
+        )
+
+        # Executor with error handling
+        self.executor = AgentExecutor(
+            agent=self.agent,
+            tools=ALL_TOOLS,
+            memory=self.memory,
+            verbose=settings.DEBUG,
+            max_iterations=10,  # Reduced from 15 — most tasks complete in 6-8 steps
+            max_execution_time=45,  # Reduced from 60s
+            handle_parsing_errors=True,
+            return_intermediate_steps=True,
+        )
+
+    def _switch_to_fallback(self) -> None:
+        self.llm = self._fallback_llm
+        self._llm_source = "openrouter_gemini_fallback"
+        self._build_executor(self.llm)
+
     def _format_basic_context(self, sheet_data: Dict, sheet_name: str) -> str:
         """Format sheet data as basic context (without RAG)."""
         parts = [f"Sheet: {sheet_name}"]
@@ -540,17 +544,8 @@ class SheetMindAgent:
 
         cells = sheet_data.get("cells", {})
         if cells:
-            # Count rows and columns
-            rows = set()
-            cols = set()
-            for ref in cells.keys():
-                import re
-                match = re.match(r"([A-Z]+)(\d+)", ref)
-                if match:
-                    cols.add(match.group(1))
-                    rows.add(int(match.group(2)))
-
-            parts.append(f"Rows: {len(rows)}, Columns: {len(cols)}")
+            frame = get_frame(cells)
+            parts.append(f"Rows: {frame.row_count}, Columns: {len(frame.columns)}")
             parts.append("Use get_headers and get_column_values tools to explore the data.")
 
         return "\n".join(parts)
@@ -15,6 +15,8 @@ from typing import List, Dict, Optional
 
 from langchain.tools import tool
 
+from app.services.sheet_frame import SheetFrame, column_sort_key, get_frame
+
 logger = logging.getLogger(__name__)
 
 
@@ -87,13 +89,20 @@ _pending_actions: ContextVar[Optional[List[Dict]]] = ContextVar("pending_actions
 def set_sheet_context(context: Dict) -> None:
     """Set the current sheet context for tools to use.
 
+    Builds the row/column indexes once (via the shared SheetFrame) so each
+    reader tool call during the agent run is a dictionary lookup.
+
     Args:
         context: Dict with keys:
             - cells: Dict[str, Any] mapping cell refs to values
             - sheetName: str name of the active sheet
             - dataRange: str like "A1:G31"
     """
-    _current_sheet_context.set(context or {})
+    ctx = dict(context or {})
+    if ctx.get("cells"):
+        ctx["frame"] = get_frame(ctx["cells"])
+        ctx["columnStats"] = {}  # col_letter -> stats, filled on first use
+    _current_sheet_context.set(ctx)
     # Each new context gets a fresh actions list
     _pending_actions.set([])
 
@@ -117,6 +126,47 @@ def clear_pending_actions() -> None:
     _pending_actions.set([])
 
 
+def _get_context_frame(ctx: Dict) -> SheetFrame:
+    """Return the frame built by set_sheet_context (or parse cells on demand)."""
+    frame = ctx.get("frame")
+    if frame is None:
+        frame = get_frame(ctx.get("cells"))
+    return frame
+
+
+def _get_column_stats(ctx: Dict, col: str) -> Dict:
+    """Per-column stats for the reader tools, computed once per sheet context."""
+    stats_cache = ctx.setdefault("columnStats", {})
+    stats = stats_cache.get(col)
+    if stats is not None:
+        return stats
+
+    frame = _get_context_frame(ctx)
+    values = frame.column_values(col)
+    unique_values = list(set(values))
+    unique_count = len(unique_values)
+
+    # Detect type
+    col_type = "text"
+    if unique_count <= 20 and unique_count < len(values) * 0.5:
+        col_type = "categorical"
+    else:
+        # Check if numeric
+        numeric_count = sum(1 for v in values if v.replace('.', '').replace('-', '').isdigit())
+        if numeric_count > len(values) * 0.8:
+            col_type = "numeric"
+
+    stats = {
+        "header": frame.get(col, 1, f"Column {col}"),
+        "uniqueCount": unique_count,
+        "uniqueValues": unique_values,
+        "totalRows": len(values),
+        "type": col_type,
+    }
+    stats_cache[col] = stats
+    return stats
+
+
 def _queue_action(action: Dict) -> str:
     """Queue an action for frontend execution and return confirmation.
 
@@ -138,14 +188,6 @@ def _queue_action(action: Dict) -> str:
     return json.dumps(action)
 
 
-def _parse_cell_ref(cell_ref: str) -> tuple:
-    """Parse cell reference into (column, row) tuple."""
-    match = re.match(r"^([A-Z]+)(\d+)$", cell_ref.upper())
-    if match:
-        return match.group(1), int(match.group(2))
-    return None, None
-
-
 # ---------------------------------------------------------------------------
 # SHEET READING TOOLS
 # ---------------------------------------------------------------------------
@@ -164,17 +206,9 @@ def get_headers() -> str:
     if not ctx or "cells" not in ctx:
         return '{"error": "No sheet data available"}'
 
-    cells = ctx["cells"]
-    headers = {}
-
-    for cell_ref, value in cells.items():
-        col, row = _parse_cell_ref(cell_ref)
-        if col and row == 1:
-            headers[col] = str(value)
-
-    # Sort by column letter
-    sorted_headers = dict(sorted(headers.items(), key=lambda x: (len(x[0]), x[0])))
-    return json.dumps(sorted_headers, indent=2)
+    # Headers are already in column order (A, B, ..., AA)
+    headers = _get_context_frame(ctx).headers
+    return json.dumps(headers, indent=2)
 
 
 @tool
@@ -193,17 +227,9 @@ def get_column_values(column: str, limit: int = 20) -> str:
     if not ctx or "cells" not in ctx:
         return '{"error": "No sheet data available"}'
 
-    cells = ctx["cells"]
-    values = []
-
-    col_upper = column.upper()
-    for cell_ref, value in cells.items():
-        col, row = _parse_cell_ref(cell_ref)
-        if col == col_upper and row > 1:  # Skip header row
-            values.append({"row": row, "value": str(value)})
-
-    values.sort(key=lambda x: x["row"])
-    return json.dumps(values[:limit], indent=2)
+    items = _get_context_frame(ctx).column_items(column.upper(), limit=limit)  # Skip header row
+    values = [{"row": row, "value": value} for row, value in items]
+    return json.dumps(values, indent=2)
 
 
 @tool
@@ -221,18 +247,12 @@ def get_row(row_number: int) -> str:
     if not ctx or "cells" not in ctx:
         return '{"error": "No sheet data available"}'
 
-    cells = ctx["cells"]
-    row_data = {}
-
-    for cell_ref, value in cells.items():
-        col, row = _parse_cell_ref(cell_ref)
-        if col and row == row_number:
-            row_data[col] = str(value)
+    row_data = _get_context_frame(ctx).row(row_number)
 
     if not row_data:
         return f'{{"error": "Row {row_number} not found"}}'
 
-    sorted_data = dict(sorted(row_data.items(), key=lambda x: (len(x[0]), x[0])))
+    sorted_data = dict(sorted(row_data.items(), key=lambda x: column_sort_key(x[0])))
     return json.dumps(sorted_data, indent=2)
 
 
@@ -279,18 +299,11 @@ def get_data_range() -> str:
 
     cells = ctx.get("cells", {})
     if cells:
-        rows = set()
-        cols = set()
-        for cell_ref in cells.keys():
-            col, row = _parse_cell_ref(cell_ref)
-            if col and row:
-                rows.add(row)
-                cols.add(col)
-
-        info["rowCount"] = len(rows)
-        info["columnCount"] = len(cols)
-        info["lastRow"] = max(rows) if rows else 0
-        info["columns"] = sorted(cols, key=lambda x: (len(x), x))
+        frame = _get_context_frame(ctx)
+        info["rowCount"] = frame.row_count
+        info["columnCount"] = len(frame.columns)
+        info["lastRow"] = frame.max_row
+        info["columns"] = list(frame.columns)
 
     return json.dumps(info, indent=2)
 
@@ -307,15 +320,8 @@ def count_rows() -> str:
     if not ctx or "cells" not in ctx:
         return '{"error": "No sheet data available"}'
 
-    cells = ctx["cells"]
-    rows = set()
-
-    for cell_ref in cells.keys():
-        col, row = _parse_cell_ref(cell_ref)
-        if row and row > 1:  # Exclude header
-            rows.add(row)
-
-    return str(len(rows))
+    # Exclude header
+    return str(_get_context_frame(ctx).data_row_count())
 
 
 @tool
@@ -344,40 +350,15 @@ def get_column_stats(column: str) -> str:
     if not ctx or "cells" not in ctx:
         return '{"error": "No sheet data available"}'
 
-    cells = ctx["cells"]
-    col_upper = column.upper()
-
-    # Get header
-    header_ref = f"{col_upper}1"
-    header = cells.get(header_ref, f"Column {col_upper}")
-
-    # Get all values in column
-    values = []
-    for cell_ref, value in cells.items():
-        col, row = _parse_cell_ref(cell_ref)
-        if col == col_upper and row > 1:
-            values.append(str(value))
-
-    # Calculate stats
-    unique_values = list(set(values))
-    unique_count = len(unique_values)
-
-    # Detect type
-    col_type = "text"
-    if unique_count <= 20 and unique_count < len(values) * 0.5:
-        col_type = "categorical"
-    else:
-        # Check if numeric
-        numeric_count = sum(1 for v in values if v.replace('.', '').replace('-', '').isdigit())
-        if numeric_count > len(values) * 0.8:
-            col_type = "numeric"
+    stats = _get_column_stats(ctx, column.upper())
+    unique_count = stats["uniqueCount"]
 
     result = {
-        "header": header,
+        "header": stats["header"],
         "uniqueCount": unique_count,
-        "uniqueValues": unique_values[:10],  # First 10 for preview
-        "totalRows": len(values),
-        "type": col_type,
+        "uniqueValues": stats["uniqueValues"][:10],  # First 10 for preview
+        "totalRows": stats["totalRows"],
+        "type": stats["type"],
         "chartEndRowFormula": f"startRow + {unique_count} - 1 = 2 + {unique_count} - 1 = {2 + unique_count - 1}"
     }
 
@@ -402,7 +383,6 @@ def get_chart_range(column: str) -> str:
         return '{"error": "No sheet data available"}'
 
     metadata = ctx.get("metadata", {})
-    cells = ctx.get("cells", {})
     col_upper = column.upper()
 
     # Try to get unique count from metadata
@@ -417,12 +397,8 @@ def get_chart_range(column: str) -> str:
 
     if unique_count is None:
         # Fallback: calculate from cell data
-        values = []
-        for cell_ref, value in cells.items():
-            parsed_col, row = _parse_cell_ref(cell_ref)
-            if parsed_col == col_upper and row and row > 1:
-                values.append(str(value))
-        unique_count = len(set(values)) if values else 10
+        stats = _get_column_stats(ctx, col_upper)
+        unique_count = stats["uniqueCount"] if stats["totalRows"] else 10
 
     start_row = 2  # Data starts at row 2 (row 1 is headers)
     end_row = start_row + unique_count - 1
@@ -0,0 +1,122 @@
+"""
+Lexical (BM25) index over RAG row documents.
+
+Keyword-like queries ("orders from Acme", "SKU 1042") are answered exactly by
+an inverted index, without an embeddings API round trip. SheetRAG builds a
+LexicalIndex from the same row documents it embeds and only falls back to
+vector search when ``confidence()`` says the lexical hits don't cover the
+query; the two rankings are then merged with ``reciprocal_rank_fusion()``.
+"""
+
+import math
+import re
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_THOUSANDS_PATTERN = re.compile(r"(?<=\d),(?=\d{3}\b)")
+
+STOP_WORDS = frozenset("""
+    a an and are as at be by can do find for from get give has have how i in is it
+    list me of on or rows row show that the their them these this those to was were
+    what when where which who with all any some
+""".split())
+
+# Standard BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; "1,042" stays one token and plural "s" is dropped."""
+    tokens = _TOKEN_PATTERN.findall(_THOUSANDS_PATTERN.sub("", text.lower()))
+    return [
+        t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+        for t in tokens
+    ]
+
+
+def _query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(t for t in tokenize(query) if t not in STOP_WORDS))
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over a list of texts."""
+
+    def __init__(self, texts: Sequence[str]):
+        self.size = len(texts)
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = np.zeros(self.size, dtype=np.float64)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                doc_tfs = postings.setdefault(token, {})
+                doc_tfs[doc_id] = doc_tfs.get(doc_id, 0) + 1
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            token: (
+                np.fromiter(doc_tfs.keys(), dtype=np.int64, count=len(doc_tfs)),
+                np.fromiter(doc_tfs.values(), dtype=np.float64, count=len(doc_tfs)),
+            )
+            for token, doc_tfs in postings.items()
+        }
+        avg_length = lengths.mean() if self.size else 1.0
+        self._norm = _K1 * (1 - _B + _B * lengths / max(avg_length, 1e-9))
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings[term][0]) if term in self._postings else 0
+        return math.log((self.size - df + 0.5) / (df + 0.5) + 1)
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top ``k`` (doc_id, score) pairs with a positive BM25 score, among ``mask`` docs if given."""
+        scores = np.zeros(self.size)
+        for term in _query_terms(query):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            scores[doc_ids] += self.idf(term) * tfs * (_K1 + 1) / (tfs + self._norm[doc_ids])
+        if mask is not None:
+            scores[~mask] = 0
+
+        hits = np.flatnonzero(scores > 0)
+        if not hits.size:
+            return []
+        top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+        return list(zip(top.tolist(), scores[top].tolist()))
+
+    def confidence(self, query: str, doc_id: int) -> float:
+        """
+        IDF-weighted share of the query's terms found in a document (0-1).
+
+        Terms missing from the whole sheet count at full weight, so
+        paraphrases ("unhappy customers") score low and go to vector search,
+        while a rare exact token ("1042", "acme") dominates the weight.
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return 0.0
+        total = matched = 0.0
+        for term in terms:
+            weight = self.idf(term)
+            total += weight
+            posting = self._postings.get(term)
+            if posting is not None and doc_id in posting[0]:
+                matched += weight
+        return matched / total if total else 0.0
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Merge ranked lists of keys: score(key) = sum of 1 / (k + rank).
+
+    Returns:
+        (key, fused score) pairs, best first
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,236 @@
+"""
+LLM client registry — process-wide, pooled clients for every LLM call site.
+
+Building an ``OpenAI`` or ``ChatOpenAI`` client per call creates a new httpx
+connection pool, so every request paid a TCP + TLS handshake to OpenRouter
+or Gemini. This registry keeps:
+
+- One ``httpx.Client`` per provider, with keep-alive pool limits from
+  settings (LLM_POOL_*) and optional HTTP/2 (LLM_HTTP2, needs ``h2``)
+- One ``OpenAI`` client per provider (ai_provider), and one ``AsyncOpenAI``
+  per provider and event loop on a pooled ``httpx.AsyncClient`` (the async
+  ai_provider API used by the routes)
+- One ``ChatOpenAI`` per (provider, model, params) (SmartExecutor, the
+  LangChain agent, CritiqueAgent), reporting its calls to model_health
+
+The sync clients share the provider's connection pool. ``llm_client_stats()``
+reports requests vs. new connections per provider, so connection reuse is
+visible on the authorized /health/db endpoint.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS: Dict[str, str] = {
+    "openrouter": "https://openrouter.ai/api/v1",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/openai/",
+}
+
+_lock = threading.Lock()
+_http_clients: Dict[str, httpx.Client] = {}
+_openai_clients: Dict[str, OpenAI] = {}
+_async_clients: Dict[Tuple[str, int], Tuple[asyncio.AbstractEventLoop, AsyncOpenAI]] = {}
+_chat_models: Dict[Tuple, Any] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _api_key(provider: str) -> str:
+    return settings.GEMINI_API_KEY if provider == "gemini" else settings.OPENROUTER_API_KEY
+
+
+def _count(provider: str, name: str) -> None:
+    with _lock:
+        _stats[provider][name] += 1
+
+
+def _tracer(provider: str):
+    """httpcore trace callback counting new connections and TLS handshakes."""
+    def trace(event_name: str, info: Dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            _count(provider, "connections")
+        elif event_name == "connection.start_tls.complete":
+            _count(provider, "tls_handshakes")
+    return trace
+
+
+def _async_tracer(provider: str):
+    trace = _tracer(provider)
+
+    async def atrace(event_name: str, info: Dict) -> None:
+        trace(event_name, info)
+    return atrace
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _new_stats(provider: str) -> None:
+    with _lock:
+        _stats.setdefault(provider, {"requests": 0, "connections": 0, "tls_handshakes": 0})
+
+
+def _http2_available() -> bool:
+    if not settings.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("LLM_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+
+
+def get_http_client(provider: str) -> httpx.Client:
+    """The provider's long-lived, pooled httpx client."""
+    client = _http_clients.get(provider)
+    if client is not None:
+        return client
+    _new_stats(provider)
+    http2 = _http2_available()
+    with _lock:
+        if provider not in _http_clients:
+            trace = _tracer(provider)
+
+            def on_request(request: httpx.Request) -> None:
+                request.extensions["trace"] = trace
+                _count(provider, "requests")
+
+            _http_clients[provider] = httpx.Client(
+                http2=http2,
+                limits=_pool_limits(),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                follow_redirects=True,
+                event_hooks={"request": [on_request]},
+            )
+            logger.info(f"Created pooled HTTP client for {provider}")
+        return _http_clients[provider]
+
+
+def get_openai_client(provider: str) -> OpenAI:
+    """Shared OpenAI-compatible client for ``provider`` ("openrouter" or "gemini")."""
+    client = _openai_clients.get(provider)
+    if client is None:
+        http_client = get_http_client(provider)
+        with _lock:
+            client = _openai_clients.get(provider)
+            if client is None:
+                client = _openai_clients[provider] = OpenAI(
+                    base_url=PROVIDERS[provider],
+                    api_key=_api_key(provider),
+                    http_client=http_client,
+                )
+    return client
+
+
+def get_async_openai_client(provider: str) -> AsyncOpenAI:
+    """
+    Shared ``AsyncOpenAI`` client for ``provider`` on the running event loop.
+
+    httpx async pools are bound to the loop that opened their connections,
+    so each loop (one per worker in production) gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    key = (provider, id(loop))
+    cached = _async_clients.get(key)
+    if cached is not None and cached[0] is loop:
+        return cached[1]
+
+    _new_stats(provider)
+    trace = _async_tracer(provider)
+
+    async def on_request(request: httpx.Request) -> None:
+        request.extensions["trace"] = trace
+        _count(provider, "requests")
+
+    client = AsyncOpenAI(
+        base_url=PROVIDERS[provider],
+        api_key=_api_key(provider),
+        http_client=httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=_pool_limits(),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            follow_redirects=True,
+            event_hooks={"request": [on_request]},
+        ),
+    )
+    with _lock:
+        # Drop clients of loops that have since closed
+        for stale in [k for k, (l, _) in _async_clients.items() if l.is_closed()]:
+            del _async_clients[stale]
+        _async_clients[key] = (loop, client)
+    return client
+
+
+def get_chat_model(model: str, provider: str = "openrouter", **params: Any):
+    """
+    Shared LangChain ``ChatOpenAI`` for (provider, model, params).
+
+    Args:
+        model: Model id, e.g. "google/gemini-2.0-flash-001"
+        provider: "openrouter" or "gemini"
+        params: ChatOpenAI options (temperature, max_tokens, ...)
+    """
+    key = (provider, model, tuple(sorted(params.items())))
+    llm = _chat_models.get(key)
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+
+        from app.services.model_health import HealthCallback
+
+        http_client = get_http_client(provider)
+        with _lock:
+            llm = _chat_models.get(key)
+            if llm is None:
+                llm = _chat_models[key] = ChatOpenAI(
+                    model=model,
+                    api_key=_api_key(provider),
+                    base_url=PROVIDERS[provider],
+                    http_client=http_client,
+                    callbacks=[HealthCallback(model, provider)],
+                    **params,
+                )
+    return llm
+
+
+def llm_client_stats() -> Dict[str, Dict[str, float]]:
+    """Per-provider request and connection counters since process start."""
+    with _lock:
+        stats = {provider: dict(counts) for provider, counts in _stats.items()}
+    for counts in stats.values():
+        requests = counts["requests"]
+        counts["reuse_rate"] = round(1 - counts["connections"] / requests, 3) if requests else 0.0
+    stats["chat_models"] = {"cached": len(_chat_models)}
+    stats["async_clients"] = {"cached": len(_async_clients)}
+    return stats
+
+
+async def close_clients() -> None:
+    """Close every pooled connection (app shutdown, on the serving loop)."""
+    with _lock:
+        clients = list(_http_clients.values())
+        async_clients = [client for _, client in _async_clients.values()]
+        _http_clients.clear()
+        _openai_clients.clear()
+        _async_clients.clear()
+        _chat_models.clear()
+    for client in clients:
+        client.close()
+    for async_client in async_clients:
+        try:
+            await async_client.close()
+        except Exception as e:  # its loop may already be gone
+            logger.debug(f"Closing async LLM client failed: {e}")
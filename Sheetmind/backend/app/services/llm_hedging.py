@@ -0,0 +1,107 @@
+"""
+LLM hedging — latency-aware delays and budgets for the async fallback chain.
+
+Trying the four fallback models strictly in sequence, each with a 30 s
+timeout, can take two minutes when the first ones hang. With hedging, the
+async fallback chain (``ai_provider._acall_with_fallback``) starts the next
+model in parallel once the current one has been running for its hedge delay,
+takes the first usable answer and cancels the rest:
+
+- Hedge delay: the p95 of the model's recent latencies on this endpoint
+  (including failed calls and the elapsed time of cancelled slow ones),
+  clamped to [LLM_HEDGE_MIN_DELAY, the endpoint's delay]. Until enough
+  samples exist, the endpoint's delay is used as is.
+- Budget: total seconds an endpoint waits for any model before giving up.
+
+Endpoint delays and budgets come from LLM_HEDGE_DELAYS / LLM_HEDGE_BUDGETS
+("chat=8,formula=4"), falling back to LLM_HEDGE_DEFAULT_DELAY/_BUDGET.
+``hedge_stats()`` reports, per endpoint, how many hedges were fired and
+whether the hedge (win) or the model it raced (loss) answered first.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WINDOW = 200  # latencies kept per (endpoint, model)
+_MIN_SAMPLES = 20  # before the p95 replaces the configured delay
+
+_lock = threading.Lock()
+_latencies: Dict[Tuple[str, str], Deque[float]] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _parse_endpoint_values(raw: str) -> Dict[str, float]:
+    """``"chat=8, formula=4"`` -> {"chat": 8.0, "formula": 4.0}; bad entries are skipped."""
+    values = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            if item.strip():
+                logger.warning(f"Ignoring malformed LLM hedge setting: {item.strip()!r}")
+    return values
+
+
+def hedge_enabled() -> bool:
+    return settings.LLM_HEDGE_ENABLED
+
+
+def hedge_budget(endpoint: str) -> float:
+    """Seconds ``endpoint`` waits for any model before giving up."""
+    return _parse_endpoint_values(settings.LLM_HEDGE_BUDGETS).get(endpoint, settings.LLM_HEDGE_DEFAULT_BUDGET)
+
+
+def hedge_delay(endpoint: str, model: str) -> float:
+    """Seconds to let ``model`` run on ``endpoint`` before starting the next model."""
+    ceiling = _parse_endpoint_values(settings.LLM_HEDGE_DELAYS).get(endpoint, settings.LLM_HEDGE_DEFAULT_DELAY)
+    with _lock:
+        samples = list(_latencies.get((endpoint, model), ()))
+    if len(samples) < _MIN_SAMPLES:
+        return ceiling
+    p95 = float(np.percentile(samples, 95))
+    return min(max(p95, settings.LLM_HEDGE_MIN_DELAY), ceiling)
+
+
+def record_latency(endpoint: str, model: str, seconds: float) -> None:
+    """
+    Record a model call's latency: answered, failed, or cancelled while
+    slow (then ``seconds`` is how long it had run, a lower bound).
+    """
+    with _lock:
+        _latencies.setdefault((endpoint, model), deque(maxlen=_WINDOW)).append(seconds)
+
+
+def record_hedge(endpoint: str, outcome: str) -> None:
+    """Count a hedge event: "fired", "won", "lost" or "cancelled"."""
+    with _lock:
+        counts = _stats.setdefault(endpoint, {"fired": 0, "won": 0, "lost": 0, "cancelled": 0})
+        counts[outcome] += 1
+
+
+def hedge_stats() -> Dict[str, Dict[str, float]]:
+    """Per-endpoint hedge counters and current model p95 latencies since process start."""
+    with _lock:
+        stats = {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+        latencies = {key: list(values) for key, values in _latencies.items()}
+    for counts in stats.values():
+        decided = counts["won"] + counts["lost"]
+        counts["win_rate"] = round(counts["won"] / decided, 3) if decided else 0.0
+    for (endpoint, model), values in latencies.items():
+        endpoint_stats = stats.setdefault(endpoint, {"fired": 0, "won": 0, "lost": 0, "cancelled": 0, "win_rate": 0.0})
+        endpoint_stats.setdefault("p95_seconds", {})[model] = round(float(np.percentile(values, 95)), 3)
+    return stats
+
+
+def reset_hedge_stats() -> None:
+    with _lock:
+        _latencies.clear()
+        _stats.clear()
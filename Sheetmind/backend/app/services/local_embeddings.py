@@ -0,0 +1,78 @@
+"""
+Local hashing embeddings — an offline embeddings provider for RAG.
+
+Rows are embedded without a network call by feature hashing: word tokens
+(the same tokenizer as the BM25 index) and boundary-marked character
+trigrams of each word are hashed into a fixed number of signed buckets,
+weighted by sublinear term frequency and L2-normalized. Cosine similarity
+then approximates weighted token/trigram overlap, so "customer" still
+matches "customers" and "custmer", though synonyms don't match the way
+they do with a neural model.
+
+Vectors depend only on the text (no fitted vocabulary or IDF), so they are
+stable across processes and re-indexes and can live in Chroma alongside
+incremental updates. Selected with RAG_EMBEDDING_PROVIDER="local", and used
+automatically by "auto" when no API embeddings model is available.
+"""
+
+import math
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.lexical_index import tokenize
+
+_TRIGRAM_WEIGHT = 0.35  # per trigram, relative to a whole-word match
+
+
+@lru_cache(maxsize=65536)
+def _token_features(token: str, dims: int) -> Tuple[Tuple[int, float], ...]:
+    """(signed bucket, weight) pairs for one token: the word plus its trigrams."""
+    features = [f"w:{token}"]
+    if len(token) > 3:
+        marked = f"#{token}#"
+        features.extend(f"c:{marked[i:i + 3]}" for i in range(len(marked) - 2))
+    result = []
+    for i, feature in enumerate(features):
+        h = zlib.crc32(feature.encode())
+        sign = 1.0 if (h // dims) & 1 else -1.0
+        result.append((h % dims, sign * (1.0 if i == 0 else _TRIGRAM_WEIGHT)))
+    return tuple(result)
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic, dependency-free text embeddings (signed feature hashing)."""
+
+    def __init__(self, dims: int = 384):
+        """
+        Args:
+            dims: Vector width (more buckets = fewer collisions)
+        """
+        self.dims = dims
+        self.model = f"hashing-{dims}"
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        rows, cols, weights = [], [], []
+        for row, text in enumerate(texts):
+            for token, tf in Counter(tokenize(text)).items():
+                scale = 1.0 + math.log(tf)
+                for bucket, weight in _token_features(token, self.dims):
+                    rows.append(row)
+                    cols.append(bucket)
+                    weights.append(weight * scale)
+
+        matrix = np.zeros((len(texts), self.dims), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), weights)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
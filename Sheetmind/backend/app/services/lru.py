@@ -0,0 +1,52 @@
+"""
+In-process LRU caches shared by the metadata and embedding caches.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU mapping (request handlers run on pool threads).
+
+    Bounded by entry count, or, when ``sizeof`` is given, by the total
+    ``sizeof(value)`` of the entries (e.g. bytes).
+    """
+
+    def __init__(self, maxsize: int, sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.size = 0
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weight(self, value: Any) -> int:
+        return self.sizeof(value) if self.sizeof else 1
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= self._weight(old)
+            self._data[key] = value
+            self.size += self._weight(value)
+            while self.size > self.maxsize and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self._weight(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
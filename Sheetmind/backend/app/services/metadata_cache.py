@@ -0,0 +1,206 @@
+"""
+SheetMetadata cache — reuses analyze_sheet() results across conversation turns.
+
+Entries are content-addressed using the sheet fingerprint
+(app.services.fingerprint): the sheet key is the sheet name plus the Merkle
+root, and each column key is the column's content hash plus the sheet's row
+span. An unchanged sheet is served without analysis, and editing one column
+re-analyzes only that column. Column hashes don't include the column letter,
+so inserting or moving a column reuses its entry too.
+
+Two tiers: an in-process LRU, then Redis (shared across workers, 1 hour TTL).
+Falls open: if Redis is unavailable, only the in-process LRU is used.
+"""
+
+import hashlib
+import logging
+from dataclasses import asdict, replace
+from typing import Any, Dict, List, Optional
+
+from app.core.serialization import dumps, loads
+from app.services.fingerprint import get_fingerprint
+from app.services.lru import LRUCache
+from app.services.sheet_analyzer import (
+    ColumnMetadata,
+    SheetMetadata,
+    _analyze_column,
+    _assemble_metadata,
+    _column_inputs,
+    _empty_metadata,
+)
+from app.services.sheet_frame import SheetFrame, get_frame
+
+logger = logging.getLogger(__name__)
+
+METADATA_CACHE_TTL = 3600  # 1 hour in seconds
+_SHEET_LRU_SIZE = 64
+_COLUMN_LRU_SIZE = 2048
+
+_sheet_lru = LRUCache(_SHEET_LRU_SIZE)
+_column_lru = LRUCache(_COLUMN_LRU_SIZE)
+
+
+# ---------------------------------------------------------------------------
+# Keys
+# ---------------------------------------------------------------------------
+
+def _column_key(frame: SheetFrame, letter: str, column_hash: str) -> str:
+    """
+    Key for one column's analysis: its content hash plus the sheet row span.
+
+    The letter only matters when the column has no header cell (the header
+    then defaults to "Column <letter>").
+    """
+    col_rows = frame.column(letter)
+    has_header = frame.min_row in col_rows or 1 in col_rows
+    raw = f"{column_hash}|{frame.min_row}|{frame.max_row}|{'' if has_header else letter}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _sheet_key(sheet_name: str, root: str) -> str:
+    return hashlib.blake2b(f"{sheet_name}\x00{root}".encode(), digest_size=16).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Serialization
+# ---------------------------------------------------------------------------
+
+def _column_from_dict(data: Dict[str, Any]) -> ColumnMetadata:
+    return ColumnMetadata(**data)
+
+
+def _sheet_from_dict(data: Dict[str, Any]) -> SheetMetadata:
+    data = dict(data)
+    data["columns"] = [_column_from_dict(c) for c in data.get("columns", [])]
+    return SheetMetadata(**data)
+
+
+def _redis():
+    try:
+        from app.services.cache import _get_redis
+        return _get_redis()
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+def _lookup_sheet(key: str) -> Optional[SheetMetadata]:
+    metadata = _sheet_lru.get(key)
+    if metadata is not None:
+        return metadata
+
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        raw = r.get(f"sheetmeta:sheet:{key}")
+        if raw:
+            metadata = _sheet_from_dict(loads(raw))
+            _sheet_lru.set(key, metadata)
+            return metadata
+    except Exception as e:
+        logger.warning(f"Metadata cache get failed: {e}")
+    return None
+
+
+def _lookup_columns(column_keys: List[str]) -> Dict[str, ColumnMetadata]:
+    found: Dict[str, ColumnMetadata] = {}
+    missing = []
+    for fp in column_keys:
+        col_meta = _column_lru.get(fp)
+        if col_meta is not None:
+            found[fp] = col_meta
+        else:
+            missing.append(fp)
+
+    if not missing:
+        return found
+
+    r = _redis()
+    if r is None:
+        return found
+    try:
+        raws = r.mget([f"sheetmeta:col:{fp}" for fp in missing])
+        for fp, raw in zip(missing, raws):
+            if raw:
+                col_meta = _column_from_dict(loads(raw))
+                _column_lru.set(fp, col_meta)
+                found[fp] = col_meta
+    except Exception as e:
+        logger.warning(f"Metadata cache mget failed: {e}")
+    return found
+
+
+def _store(key: str, metadata: SheetMetadata, new_columns: Dict[str, ColumnMetadata]) -> None:
+    _sheet_lru.set(key, metadata)
+    for fp, col_meta in new_columns.items():
+        _column_lru.set(fp, col_meta)
+
+    r = _redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.setex(f"sheetmeta:sheet:{key}", METADATA_CACHE_TTL, dumps(asdict(metadata)))
+        for fp, col_meta in new_columns.items():
+            pipe.setex(f"sheetmeta:col:{fp}", METADATA_CACHE_TTL, dumps(asdict(col_meta)))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Metadata cache set failed: {e}")
+
+
+def get_sheet_metadata(cells: Dict[str, Any], sheet_name: str = "Sheet1") -> SheetMetadata:
+    """
+    Cached equivalent of ``analyze_sheet()``.
+
+    Args:
+        cells: Dictionary mapping cell references (e.g., "A1") to values
+        sheet_name: Name of the sheet being analyzed
+
+    Returns:
+        SheetMetadata (treat as read-only: instances are shared between requests)
+    """
+    frame = get_frame(cells) if cells else None
+    if frame is None or frame.is_empty:
+        return _empty_metadata(sheet_name)
+
+    fingerprint = get_fingerprint(cells)
+    key = _sheet_key(sheet_name, fingerprint.root)
+    metadata = _lookup_sheet(key)
+    if metadata is not None:
+        logger.info(f"Metadata cache HIT: sheet '{sheet_name}' ({metadata.total_columns} columns)")
+        return metadata
+
+    data_rows = frame.max_row - frame.min_row
+    inputs = _column_inputs(frame)
+    column_keys = [
+        _column_key(frame, letter, fingerprint.column_hashes[letter]) for letter, _, _ in inputs
+    ]
+    cached_columns = _lookup_columns(column_keys)
+    new_columns: Dict[str, ColumnMetadata] = {}
+    columns: List[ColumnMetadata] = []
+    for (letter, header, values), fp in zip(inputs, column_keys):
+        col_meta = cached_columns.get(fp) or new_columns.get(fp)
+        if col_meta is None:
+            col_meta = _analyze_column(letter, header, values, total_count=data_rows)
+            new_columns[fp] = col_meta
+        elif col_meta.letter != letter:
+            col_meta = replace(col_meta, letter=letter)
+        columns.append(col_meta)
+
+    logger.info(
+        f"Metadata cache: reused {len(columns) - len(new_columns)}/{len(columns)} columns "
+        f"for sheet '{sheet_name}'"
+    )
+    metadata = _assemble_metadata(sheet_name, frame, columns)
+    _store(key, metadata, new_columns)
+    return metadata
+
+
+def clear_local_cache() -> None:
+    """Drop the in-process tiers (Redis entries expire on their own)."""
+    _sheet_lru.clear()
+    _column_lru.clear()
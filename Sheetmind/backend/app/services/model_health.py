@@ -0,0 +1,220 @@
+"""
+Model health — per-model circuit breakers shared by every LLM call site.
+
+When the free Arcee model is down or slow, each request used to pay its full
+timeout before falling back. Every model call (ai_provider's fallback chain,
+and the SmartExecutor / LangChain agent / CritiqueAgent models through
+``HealthCallback``) records its outcome here, and the call sites ask
+``is_available(model)`` before using a model:
+
+- closed: healthy, used normally
+- open: the last LLM_BREAKER_WINDOW calls had at least LLM_BREAKER_MIN_CALLS
+  outcomes and too many errors/timeouts (LLM_BREAKER_FAILURE_RATE), too many
+  refusals (LLM_BREAKER_REFUSAL_RATE), or an EWMA latency above
+  LLM_BREAKER_SLOW_SECONDS — the model is skipped
+- half_open: the cooldown passed; one cheap background probe is in flight.
+  Success closes the breaker, failure re-opens it with a doubled cooldown.
+
+Per-process state. Falls open: callers that find every model open still use
+their last one.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+OUTCOMES = ("ok", "error", "timeout", "refusal")
+
+_EWMA_ALPHA = 0.3
+_MAX_COOLDOWN = 300.0  # seconds
+_PROBE_TIMEOUT = 10.0  # seconds
+
+
+class ModelHealth:
+    """Rolling outcomes, EWMA latency and breaker state of one model."""
+
+    def __init__(self, model: str, provider: str):
+        self.model = model
+        self.provider = provider
+        self.state = CLOSED
+        self.outcomes: Deque[str] = deque(maxlen=settings.LLM_BREAKER_WINDOW)
+        self.totals = {outcome: 0 for outcome in OUTCOMES}
+        self.ewma_latency: Optional[float] = None
+        self.opened_at = 0.0
+        self.cooldown = settings.LLM_BREAKER_COOLDOWN
+        self.reason = ""
+
+    def rate(self, *outcomes: str) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o in outcomes) / len(self.outcomes)
+
+    def trip_reason(self) -> str:
+        """Why the breaker should open now, or "" if the model looks healthy."""
+        if len(self.outcomes) < settings.LLM_BREAKER_MIN_CALLS:
+            return ""
+        failure_rate = self.rate("error", "timeout")
+        if failure_rate >= settings.LLM_BREAKER_FAILURE_RATE:
+            return f"failure rate {failure_rate:.0%}"
+        refusal_rate = self.rate("refusal")
+        if refusal_rate >= settings.LLM_BREAKER_REFUSAL_RATE:
+            return f"refusal rate {refusal_rate:.0%}"
+        if self.ewma_latency is not None and self.ewma_latency > settings.LLM_BREAKER_SLOW_SECONDS:
+            return f"EWMA latency {self.ewma_latency:.1f}s"
+        return ""
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "reason": self.reason,
+            "calls": sum(self.totals.values()),
+            **self.totals,
+            "error_rate": round(self.rate("error"), 3),
+            "timeout_rate": round(self.rate("timeout"), 3),
+            "refusal_rate": round(self.rate("refusal"), 3),
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+        }
+
+
+_lock = threading.Lock()
+_models: Dict[str, ModelHealth] = {}
+
+
+def _health(model: str, provider: str = "openrouter") -> ModelHealth:
+    health = _models.get(model)
+    if health is None:
+        health = _models[model] = ModelHealth(model, provider)
+    return health
+
+
+def classify_error(error: BaseException) -> str:
+    """"timeout" for client/read timeouts, "error" for anything else."""
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+        return "timeout"
+    return "error"
+
+
+def record(model: str, outcome: str, latency: Optional[float] = None, provider: str = "openrouter") -> None:
+    """
+    Record one call's outcome ("ok", "error", "timeout" or "refusal").
+
+    Args:
+        latency: Seconds the call took (updates the EWMA), if it returned
+    """
+    if not settings.LLM_BREAKER_ENABLED:
+        return
+    with _lock:
+        health = _health(model, provider)
+        health.outcomes.append(outcome)
+        health.totals[outcome] += 1
+        if latency is not None:
+            health.ewma_latency = latency if health.ewma_latency is None else (
+                _EWMA_ALPHA * latency + (1 - _EWMA_ALPHA) * health.ewma_latency
+            )
+        if health.state != CLOSED:
+            return
+        reason = health.trip_reason()
+        if reason:
+            health.state = OPEN
+            health.opened_at = time.monotonic()
+            health.reason = reason
+    if reason:
+        logger.warning(f"Circuit breaker opened for {model}: {reason}")
+
+
+def is_available(model: str) -> bool:
+    """
+    Whether callers should use ``model`` now.
+
+    An open breaker whose cooldown has passed goes half-open and starts a
+    background probe; the model stays skipped until the probe succeeds.
+    """
+    if not settings.LLM_BREAKER_ENABLED:
+        return True
+    with _lock:
+        health = _models.get(model)
+        if health is None or health.state == CLOSED:
+            return True
+        if health.state == HALF_OPEN or time.monotonic() - health.opened_at < health.cooldown:
+            return False
+        health.state = HALF_OPEN
+    threading.Thread(target=_run_probe, args=(health,), daemon=True, name=f"probe-{model}").start()
+    return False
+
+
+def _probe_model(model: str, provider: str) -> None:
+    """Smallest possible completion; raises if the model is still unhealthy."""
+    from app.services.llm_clients import get_openai_client
+
+    start = time.perf_counter()
+    get_openai_client(provider).chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": "ping"}],
+        max_tokens=1,
+        timeout=_PROBE_TIMEOUT,
+    )
+    if time.perf_counter() - start > settings.LLM_BREAKER_SLOW_SECONDS:
+        raise TimeoutError(f"probe took {time.perf_counter() - start:.1f}s")
+
+
+def _run_probe(health: ModelHealth) -> None:
+    try:
+        _probe_model(health.model, health.provider)
+    except Exception as e:
+        with _lock:
+            health.state = OPEN
+            health.opened_at = time.monotonic()
+            health.cooldown = min(health.cooldown * 2, _MAX_COOLDOWN)
+        logger.warning(f"Probe of {health.model} failed ({e}), breaker open for {health.cooldown:.0f}s")
+        return
+    with _lock:
+        health.state = CLOSED
+        health.reason = ""
+        health.outcomes.clear()
+        health.ewma_latency = None
+        health.cooldown = settings.LLM_BREAKER_COOLDOWN
+    logger.info(f"Probe of {health.model} succeeded, breaker closed")
+
+
+def model_health_stats() -> Dict[str, Dict[str, Any]]:
+    """Breaker state, outcome rates and EWMA latency per model since process start."""
+    with _lock:
+        return {model: health.snapshot() for model, health in _models.items()}
+
+
+def reset_model_health() -> None:
+    with _lock:
+        _models.clear()
+
+
+class HealthCallback(BaseCallbackHandler):
+    """LangChain callback recording a chat model's calls into the breaker."""
+
+    def __init__(self, model: str, provider: str = "openrouter"):
+        self.model = model
+        self.provider = provider
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._started.pop(run_id, None)
+        record(self.model, "ok", time.perf_counter() - start if start else None, self.provider)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._started.pop(run_id, None)
+        record(self.model, classify_error(error), time.perf_counter() - start if start else None, self.provider)
@@ -10,6 +10,8 @@ sent to third-party LLM APIs.
 import re
 from typing import Dict, List, Tuple
 
+from app.services.sheet_frame import get_frame
+
 # ---------------------------------------------------------------------------
 # PII Patterns
 # ---------------------------------------------------------------------------
@@ -83,16 +85,10 @@ def scan_cells(cells: Dict[str, str], sample_limit: int = 200) -> Dict:
     sensitive_columns: List[str] = []
 
     # Check headers (row 1) for sensitive column names
-    cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-    for ref, value in cells.items():
-        match = cell_pattern.match(ref)
-        if not match:
-            continue
-        col, row = match.group(1), int(match.group(2))
-        if row == 1:
-            header_lower = str(value).lower().strip()
-            if header_lower in SENSITIVE_HEADERS:
-                sensitive_columns.append(f"{col} ({value})")
+    for col, value in get_frame(cells).headers.items():
+        header_lower = value.lower().strip()
+        if header_lower in SENSITIVE_HEADERS:
+            sensitive_columns.append(f"{col} ({value})")
 
     # Sample cell values for pattern matching
     sampled = 0
@@ -0,0 +1,362 @@
+"""
+Query constraints — numeric and date conditions pulled out of a search query.
+
+RAG questions like "orders over 500 in March" or "invoices between $1,000
+and $5,000 since 2024-01-01" contain conditions that are exact, not
+semantic. ``extract_constraints`` turns comparisons, ranges and date windows
+into RowConstraints on the columns SheetMetadata knows are numeric or dates,
+and ``ConstraintSet.row_mask`` evaluates them as one vectorized mask over
+the sheet's data rows. SheetRAG then ranks only the surviving rows, or
+returns them directly when nothing but the constraints is left of the query.
+
+Like the local query engine, extraction is conservative: a condition whose
+column is ambiguous is left in the query for semantic search.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.lexical_index import STOP_WORDS, tokenize
+from app.services.query_engine import find_column_mentions
+from app.services.sheet_analyzer import SheetMetadata, numeric_array
+from app.services.sheet_frame import SheetFrame
+
+
+# ---------------------------------------------------------------------------
+# Constraints
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RowConstraint:
+    """
+    One condition on a column.
+
+    Numeric bounds are plain floats; date bounds are day numbers
+    (``date.toordinal()``), with ``month`` set instead for a month without a
+    year ("in March").
+    """
+    column: str                         # Column letter
+    kind: str                           # "number" or "date"
+    low: Optional[float] = None
+    high: Optional[float] = None
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+    month: Optional[int] = None
+    text: str = ""                      # The query words this came from
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Evaluate over a float array of numbers or day numbers (NaN = no value)."""
+        with np.errstate(invalid="ignore"):
+            if self.month is not None:
+                return _months(values) == self.month
+            mask = ~np.isnan(values)
+            if self.low is not None:
+                mask &= values >= self.low if self.low_inclusive else values > self.low
+            if self.high is not None:
+                mask &= values <= self.high if self.high_inclusive else values < self.high
+            return mask
+
+
+@dataclass
+class ConstraintSet:
+    """Constraints extracted from a query, plus what's left of the query."""
+    constraints: List[RowConstraint] = field(default_factory=list)
+    residual: str = ""                  # Query with constraint phrases removed
+    filter_only: bool = False           # Residual has no search terms left
+
+    def __bool__(self) -> bool:
+        return bool(self.constraints)
+
+    def row_mask(self, frame: SheetFrame, rows: Sequence[int]) -> np.ndarray:
+        """Rows (aligned to ``rows``) satisfying every constraint."""
+        mask = np.ones(len(rows), dtype=bool)
+        for constraint in self.constraints:
+            mask &= constraint.mask(_column_values(frame, constraint.column, constraint.kind, rows))
+        return mask
+
+    def describe(self) -> str:
+        return ", ".join(c.text for c in self.constraints)
+
+
+def _column_values(frame: SheetFrame, col: str, kind: str, rows: Sequence[int]) -> np.ndarray:
+    """Parsed column, memoized on the request's frame."""
+    memo_key = ("constraint_values", col, kind, rows[0] if rows else 0, len(rows))
+    values = frame.derived.get(memo_key)
+    if values is None:
+        text = frame.aligned_column(col, rows)
+        values = numeric_array(text) if kind == "number" else day_numbers(text)
+        frame.derived[memo_key] = values
+    return values
+
+
+# ---------------------------------------------------------------------------
+# Date parsing
+# ---------------------------------------------------------------------------
+
+# strptime formats for sheet_analyzer.DATE_PATTERNS (slashes read as US M/D/Y)
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%m-%Y", "%d-%m-%y",
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%b %d %Y", "%B %d %Y",
+)
+
+
+def parse_date(value: str) -> Optional[date]:
+    value = " ".join(value.split())
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def day_numbers(values: Sequence[str]) -> np.ndarray:
+    """Day number per value (NaN if not a date); each distinct value is parsed once."""
+    lookup: Dict[str, float] = {}
+    result = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        number = lookup.get(value)
+        if number is None:
+            parsed = parse_date(value) if value else None
+            number = lookup[value] = float(parsed.toordinal()) if parsed else np.nan
+        result[i] = number
+    return result
+
+
+def _months(day_numbers_: np.ndarray) -> np.ndarray:
+    """Month (1-12) per day number; 0 where there's no date."""
+    valid = ~np.isnan(day_numbers_)
+    days = day_numbers_[valid].astype(np.int64) - date(1970, 1, 1).toordinal()
+    months = np.zeros(len(day_numbers_), dtype=np.int64)
+    months[valid] = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+    return months
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], 1)
+    for name in names
+}
+_MONTH = "(?:" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+
+_PERIOD = (
+    r"(?:\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}"
+    r"|q[1-4]\s+(?:19|20)\d{2}"
+    r"|\d{1,2}\s+" + _MONTH + r"\s+\d{4}"
+    r"|" + _MONTH + r"(?:\s+\d{1,2}(?:st|nd|rd|th)?,?)?(?:\s+(?:19|20)\d{2})?"
+    r"|(?:19|20)\d{2})"
+)
+
+_DATE_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (op, re.compile(pattern.replace("P", _PERIOD), re.IGNORECASE))
+    for op, pattern in [
+        ("between", r"\bbetween\s+(P)\s+and\s+(P)(?!\w)"),
+        ("from_to", r"\bfrom\s+(P)\s+(?:to|until|through)\s+(P)(?!\w)"),
+        ("before", r"\b(?:before|prior to|until|earlier than)\s+(P)(?!\w)"),
+        ("after", r"\b(?:after|later than)\s+(P)(?!\w)"),
+        ("since", r"\b(?:since|from|starting)\s+(P)(?!\w)"),
+        ("in", r"\b(?:in|during|on)\s+(P)(?!\w)"),
+    ]
+]
+
+_NUMBER = r"(-?\$?\d(?:[\d,]*\d)?(?:\.\d+)?[km]?)(?![\w/-])"
+
+_NUMBER_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (op, re.compile(pattern.replace("N", _NUMBER), re.IGNORECASE))
+    for op, pattern in [
+        ("between", r"\bbetween\s+N\s+(?:and|to)\s+N"),
+        (">=", r"(?:>=|\bat least|\bno less than|\bminimum of)\s*N"),
+        ("<=", r"(?:<=|\bat most|\bno more than|\bup to|\bmaximum of)\s*N"),
+        (">", r"(?:>|\bover|\babove|\bmore than|\bgreater than|\bhigher than|\bexceeding)\s*N"),
+        ("<", r"(?:<|\bunder|\bbelow|\bless than|\blower than|\bfewer than)\s*N"),
+    ]
+]
+
+# Headers that name the money column when a bare amount doesn't say which
+_MONEY_HEADER = re.compile(
+    r"\b(amount|total|price|revenue|sales|value|cost|spend|income|profit|payment)\b", re.IGNORECASE
+)
+
+# Nouns that name rows rather than filter them ("orders over 500")
+_ROW_NOUNS = frozenset(tokenize("rows records entries items lines orders transactions deals"))
+
+# Currency words that may follow a bare amount ("over 500 dollars")
+_CURRENCY_WORDS = frozenset(tokenize("dollars usd euros eur pounds gbp bucks"))
+
+_NEXT_WORD = re.compile(r"\s*([A-Za-z]+)")
+
+
+def _counts_something_else(query: str, end: int) -> bool:
+    """A bare number followed by a noun ("over 3 items", "2 years") counts that noun, not money."""
+    m = _NEXT_WORD.match(query, end)
+    if m is None:
+        return False
+    word = tokenize(m.group(1))
+    return bool(word) and word[0] not in STOP_WORDS and word[0] not in _CURRENCY_WORDS
+
+
+def _parse_number(text: str) -> Optional[float]:
+    text = text.lower()
+    scale = {"k": 1e3, "m": 1e6}.get(text[-1:], 1.0)
+    value = numeric_array([text.rstrip("km")])[0]
+    return None if value != value else float(value) * scale
+
+
+def _parse_period(text: str) -> Optional[Tuple[Optional[int], int, int]]:
+    """(month, first day, day after the last) for a period; month set only when no year is given."""
+    text = " ".join(text.lower().replace(".", " ").replace(",", " ").split())
+    full = parse_date(text)
+    if full is not None:
+        return None, full.toordinal(), full.toordinal() + 1
+
+    m = re.fullmatch(r"q([1-4]) (\d{4})", text)
+    if m:
+        quarter, year = int(m.group(1)), int(m.group(2))
+        start = date(year, 3 * quarter - 2, 1)
+        end = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+        return None, start.toordinal(), end.toordinal()
+
+    if re.fullmatch(r"\d{4}", text):
+        year = int(text)
+        return None, date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal()
+
+    words = text.split()
+    month = _MONTHS.get(words[0]) if words else None
+    if month is None:
+        return None
+    rest = [w.rstrip("stndrh") if w[:1].isdigit() and not w.isdigit() else w for w in words[1:]]
+    if rest and len(rest[-1]) == 4 and rest[-1].isdigit():
+        year = int(rest.pop())
+        if rest:
+            day = date(year, month, int(rest[0]))
+            return None, day.toordinal(), day.toordinal() + 1
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return None, date(year, month, 1).toordinal(), end.toordinal()
+    return (month, 0, 0) if not rest else None
+
+
+def _date_constraint(op: str, periods: List[str], column: str, text: str) -> Optional[RowConstraint]:
+    try:
+        parsed = [_parse_period(p) for p in periods]
+    except ValueError:  # e.g. "February 30 2024"
+        return None
+    if any(p is None for p in parsed):
+        return None
+    month, start, end = parsed[0]
+    if month is not None:
+        # A month without a year only makes sense as "in March"
+        return RowConstraint(column, "date", month=month, text=text) if op == "in" else None
+    if op in ("between", "from_to"):
+        if parsed[1][0] is not None:
+            return None
+        return RowConstraint(column, "date", low=start, high=parsed[1][2], high_inclusive=False, text=text)
+    bounds = {
+        "in": dict(low=start, high=end, high_inclusive=False),
+        "before": dict(high=start, high_inclusive=False),
+        "after": dict(low=end),
+        "since": dict(low=start),
+    }[op]
+    return RowConstraint(column, "date", text=text, **bounds)
+
+
+def extract_constraints(query: str, metadata: SheetMetadata) -> ConstraintSet:
+    """
+    Pull numeric/date constraints out of a search query.
+
+    Args:
+        query: The search query or chat question
+        metadata: Column types for the sheet
+
+    Returns:
+        ConstraintSet (falsy when the query has no usable constraints)
+    """
+    columns = {c.letter: c for c in metadata.columns}
+    date_columns = [c.letter for c in metadata.columns if c.column_type == "date"]
+    numeric_columns = [c.letter for c in metadata.columns if c.column_type == "numeric"]
+    if not date_columns and not numeric_columns:
+        return ConstraintSet(residual=query)
+
+    mentions = find_column_mentions(query, metadata)
+    taken: List[Tuple[int, int]] = []
+    used_mentions = set()
+    constraints: List[RowConstraint] = []
+
+    def free(start: int, end: int) -> bool:
+        return all(end <= s or start >= e for s, e in taken)
+
+    def mentioned(kinds: List[str], start: int, end: int) -> Optional[str]:
+        """Column of that type named next to the phrase, else the nearest one before it."""
+        near = [m for m in mentions if m.letter in kinds and (
+            0 <= start - m.end <= 12 or 0 <= m.start - end <= 2
+        )]
+        before = [m for m in mentions if m.letter in kinds and m.end <= start]
+        chosen = near[0] if near else (before[-1] if before else None)
+        if chosen is None:
+            return None
+        used_mentions.add((chosen.start, chosen.end))
+        return chosen.letter
+
+    # Date windows first, so "in 2024" isn't read as a number
+    for op, pattern in _DATE_PATTERNS:
+        for m in pattern.finditer(query):
+            if not free(m.start(), m.end()):
+                continue
+            column = mentioned(date_columns, m.start(), m.end()) or metadata.suggested_date_column
+            if column is None or columns[column].column_type != "date":
+                continue
+            constraint = _date_constraint(op, list(m.groups()), column, m.group(0).strip())
+            if constraint is not None:
+                constraints.append(constraint)
+                taken.append(m.span())
+
+    for op, pattern in _NUMBER_PATTERNS:
+        for m in pattern.finditer(query):
+            if not free(m.start(), m.end()):
+                continue
+            numbers = [_parse_number(g) for g in m.groups()]
+            if any(n is None for n in numbers):
+                continue
+            column = mentioned(numeric_columns, m.start(), m.end())
+            if column is None:
+                if _counts_something_else(query, m.end()):
+                    continue
+                money = [c for c in numeric_columns if _MONEY_HEADER.search(columns[c].header)]
+                if len(numeric_columns) == 1:
+                    column = numeric_columns[0]
+                elif len(money) == 1:
+                    column = money[0]
+                else:
+                    continue  # ambiguous: leave it to semantic search
+            if op == "between":
+                low, high = sorted(numbers)
+                constraint = RowConstraint(column, "number", low=low, high=high)
+            else:
+                bound = "low" if op.startswith(">") else "high"
+                constraint = RowConstraint(column, "number", **{
+                    bound: numbers[0], f"{bound}_inclusive": op.endswith("="),
+                })
+            constraint.text = m.group(0).strip()
+            constraints.append(constraint)
+            taken.append(m.span())
+
+    if not constraints:
+        return ConstraintSet(residual=query)
+
+    residual = list(query)
+    for start, end in taken + sorted(used_mentions):
+        residual[start:end] = " " * (end - start)
+    residual_text = " ".join("".join(residual).split())
+    terms = [t for t in tokenize(residual_text) if t not in STOP_WORDS and t not in _ROW_NOUNS]
+    return ConstraintSet(constraints, residual_text, filter_only=not terms)
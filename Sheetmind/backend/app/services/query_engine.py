@@ -0,0 +1,495 @@
+"""
+Local Query Engine — answers simple aggregate questions without an LLM.
+
+Chat questions like "total Revenue", "average GPA by Major" or "how many rows
+have Status = Open" are exact computations over the sheet. This module:
+
+1. Parses the question into a QueryPlan (aggregation, value column, group-by,
+   filters, top-N), resolving column names from SheetMetadata headers
+2. Executes the plan over the request's SheetFrame with numpy
+3. Returns a markdown answer plus exact SourceReference ranges
+
+The parser is deliberately conservative: anything it can't fully resolve
+(unknown columns, filter values not in the column, non-aggregate wording)
+returns None and the question goes to the LLM as before.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.message import SourceReference
+from app.services.group_by import group_aggregate
+from app.services.metadata_cache import get_sheet_metadata
+from app.services.sheet_analyzer import SheetMetadata, numeric_array
+from app.services.sheet_frame import SheetFrame, get_frame
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Query Plan
+# ---------------------------------------------------------------------------
+
+@dataclass
+class QueryFilter:
+    """A row filter: ``column op value``."""
+    column: str          # Column letter
+    op: str              # "=", "!=", ">", ">=", "<", "<="
+    value: str
+
+
+@dataclass
+class QueryPlan:
+    """Parsed form of an aggregate question."""
+    aggregation: str                      # sum, avg, count, min, max
+    value_column: Optional[str] = None    # None = count rows
+    group_column: Optional[str] = None
+    filters: List[QueryFilter] = field(default_factory=list)
+    top_n: Optional[int] = None
+    descending: bool = True
+
+
+@dataclass
+class QueryAnswer:
+    """Result of a locally answered question."""
+    text: str
+    sources: List[SourceReference]
+    plan: QueryPlan
+
+
+# ---------------------------------------------------------------------------
+# Intent Parser
+# ---------------------------------------------------------------------------
+
+# Wording that needs reasoning, actions or stats we don't compute -> LLM
+_NON_AGGREGATE_PATTERN = re.compile(
+    r"\b(why|explain|how (?:do|does|can|should|to)|formula|chart|graph|plot|visuali[sz]e|"
+    r"create|make|build|add|insert|delete|remove|highlight|sort|compare|trend|forecast|"
+    r"predict|correlat\w*|percent(?:age)?|ratio|growth|median|mode|std|deviation|"
+    r"variance|distinct|unique|duplicate\w*|summar\w*|insight\w*|analy[sz]\w*)\b",
+    re.IGNORECASE,
+)
+
+_TOP_N_PATTERN = re.compile(
+    r"\b(top|bottom|highest|lowest|largest|smallest|best|worst)\s+(\d{1,3})\b", re.IGNORECASE
+)
+
+# Checked in order: "total number of rows" is a count, "average total" an average
+_AGGREGATION_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    ("count", re.compile(r"\b(how many|count|number of)\b", re.IGNORECASE)),
+    ("avg", re.compile(r"\b(average|avg|mean)\b", re.IGNORECASE)),
+    ("sum", re.compile(r"\b(total|sum)\b", re.IGNORECASE)),
+    ("max", re.compile(r"\b(max|maximum|highest|largest|biggest)\b", re.IGNORECASE)),
+    ("min", re.compile(r"\b(min|minimum|lowest|smallest)\b", re.IGNORECASE)),
+]
+
+_GROUP_PREFIX_PATTERN = re.compile(
+    r"\b(?:group(?:ed)? by|broken down by|by|per|for each|for every|each|across)\s+$",
+    re.IGNORECASE,
+)
+
+# "who"/"which" questions ask for a label, not a value
+_LABEL_QUESTION_PATTERN = re.compile(r"\b(who|whom|whose|which)\b", re.IGNORECASE)
+
+_COLUMN_REF_PATTERN = re.compile(r"\bcolumn\s+([A-Z]{1,3})\b")
+
+# Operators right after a column mention; the value runs to a clause boundary
+_VALUE = r"""(?:"([^"]+)"|'([^']+)'|(.+?))(?=\s+(?:and|or|by|per|group(?:ed)?)\b|[,;]|$)"""
+_FILTER_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    (op, re.compile(r"^\s*" + pattern + r"\s*" + _VALUE, re.IGNORECASE))
+    for op, pattern in [
+        ("!=", r"(?:!=|<>|is not|isn't|not equal to|does not equal|doesn't equal)"),
+        (">=", r"(?:>=|is at least|at least|is greater than or equal to)"),
+        ("<=", r"(?:<=|is at most|at most|is less than or equal to)"),
+        (">", r"(?:>|is greater than|greater than|is more than|more than|is above|above|over)"),
+        ("<", r"(?:<|is less than|less than|is below|below|under)"),
+        ("=", r"(?:==|=|equals|is equal to|is|of)"),
+    ]
+]
+
+# Words an aggregate question may contain besides column names and filters.
+# Anything else (e.g. a bare value like "for South", or a number like "in
+# 2024") means we didn't fully understand the question.
+_FILLER_WORDS = frozenset("""
+    a an the of in on for to from with where which that who whose have has having
+    is are was were be been do does did what whats what's give me show tell list find
+    get calculate compute return please can you i we our my all each every per by and
+    total sum average avg mean count how many number rows row records record entries
+    entry items item values value max maximum min minimum highest lowest largest
+    smallest biggest top bottom best worst column columns sheet data table grouped
+    group broken down across overall whole entire there it its
+""".split())
+
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9']+")
+
+_AGG_LABELS = {"sum": "Total", "avg": "Average", "count": "Count", "min": "Minimum", "max": "Maximum"}
+
+
+@dataclass
+class ColumnMention:
+    """A span of the question that names a column."""
+
+    start: int
+    end: int
+    letter: str
+
+
+def find_column_mentions(question: str, metadata: SheetMetadata) -> List[ColumnMention]:
+    """Non-overlapping column mentions (header names, or "column C"), in order."""
+    candidates: List[ColumnMention] = []
+    lowered = question.lower()
+    letters = {c.letter for c in metadata.columns}
+
+    for col in metadata.columns:
+        header = col.header.strip().lower()
+        if not header:
+            continue
+        pattern = r"(?<!\w)" + re.escape(header) + r"(?:s|es)?(?!\w)"
+        for m in re.finditer(pattern, lowered):
+            candidates.append(ColumnMention(m.start(), m.end(), col.letter))
+
+    for m in _COLUMN_REF_PATTERN.finditer(question):
+        if m.group(1) in letters:
+            candidates.append(ColumnMention(m.start(), m.end(), m.group(1)))
+
+    # Longest match wins where mentions overlap ("Unit Price" over "Price")
+    candidates.sort(key=lambda c: (-(c.end - c.start), c.start))
+    chosen: List[ColumnMention] = []
+    for cand in candidates:
+        if all(cand.end <= c.start or cand.start >= c.end for c in chosen):
+            chosen.append(cand)
+    return sorted(chosen, key=lambda c: c.start)
+
+
+def _parse_filter(question: str, mention: ColumnMention) -> Optional[Tuple[QueryFilter, int]]:
+    """Filter right after a column mention, with the index where it ends."""
+    rest = question[mention.end:]
+    for op, pattern in _FILTER_PATTERNS:
+        m = pattern.match(rest)
+        if m:
+            value = next(g for g in m.groups() if g is not None).strip()
+            if value:
+                return QueryFilter(mention.letter, op, value), mention.end + m.end()
+    return None
+
+
+def parse_question(question: str, metadata: SheetMetadata) -> Optional[QueryPlan]:
+    """
+    Parse an aggregate question into a QueryPlan.
+
+    Returns:
+        QueryPlan, or None if the question isn't a simple aggregate we can
+        resolve exactly
+    """
+    text = question.strip().rstrip("?.! ")
+    if not text or not metadata.columns or _NON_AGGREGATE_PATTERN.search(text):
+        return None
+
+    columns = {c.letter: c for c in metadata.columns}
+    mentions = find_column_mentions(text, metadata)
+
+    top = _TOP_N_PATTERN.search(text)
+    if top:
+        aggregation = "sum"
+        top_n = int(top.group(2))
+        descending = top.group(1).lower() in ("top", "highest", "largest", "best")
+    else:
+        aggregation = next((name for name, p in _AGGREGATION_PATTERNS if p.search(text)), None)
+        if aggregation is None:
+            return None
+        top_n, descending = None, True
+
+    # Filters: "<column> <op> <value>"; mentions inside a filter value are ignored
+    filters: List[QueryFilter] = []
+    used: set = set()
+    spans = [(m.start, m.end) for m in mentions]
+    if top:
+        spans.append(top.span())
+    consumed_until = -1
+    for mention in mentions:
+        if mention.start < consumed_until:
+            used.add(id(mention))
+            continue
+        parsed = _parse_filter(text, mention)
+        if parsed is None:
+            continue
+        # "is"/"of" values are checked against the column at execution time
+        qfilter, end = parsed
+        filters.append(qfilter)
+        used.add(id(mention))
+        spans.append((mention.start, end))
+        consumed_until = end
+
+    leftover = list(text)
+    for start, end in spans:
+        leftover[start:end] = " " * (end - start)
+    if any(w.lower() not in _FILLER_WORDS for w in _WORD_PATTERN.findall("".join(leftover))):
+        return None
+
+    # Group-by: a mention preceded by "by" / "per" / "for each" ...
+    group_column = None
+    for mention in mentions:
+        if id(mention) in used:
+            continue
+        if _GROUP_PREFIX_PATTERN.search(text[:mention.start]):
+            col = columns[mention.letter]
+            # In top-N questions "by <numeric column>" names the ranking value
+            if top_n is not None and col.column_type == "numeric":
+                continue
+            group_column = mention.letter
+            used.add(id(mention))
+            break
+
+    remaining = [columns[m.letter] for m in mentions if id(m) not in used]
+    numeric = [c for c in remaining if c.column_type == "numeric"]
+    value_column = numeric[0].letter if numeric else None
+
+    if top_n is not None and group_column is None:
+        # "top 5 products by revenue": the non-numeric mention labels the rows
+        labels = [c for c in remaining if c.column_type != "numeric"]
+        if labels:
+            group_column = labels[0].letter
+
+    if aggregation != "count" and value_column is None:
+        return None
+    # A text column that isn't a filter or the group-by: "how many regions"
+    # asks for distinct values and "highest sales region" for a label, not
+    # the row count or the top value
+    unused_labels = [c for c in remaining if c.column_type != "numeric" and c.letter != group_column]
+    if unused_labels and aggregation in ("count", "max", "min"):
+        return None
+    if aggregation in ("max", "min") and top_n is None and _LABEL_QUESTION_PATTERN.search(text):
+        return None  # "who has the highest sales" wants a name
+    if len(numeric) > 1:
+        return None  # "total revenue and cost" etc. -> let the LLM phrase it
+
+    return QueryPlan(
+        aggregation=aggregation,
+        value_column=value_column,
+        group_column=group_column,
+        filters=filters,
+        top_n=top_n,
+        descending=descending,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+def _fmt(value: float) -> str:
+    if value != value:  # NaN
+        return "n/a"
+    if float(value).is_integer():
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+def _row_runs(rows: np.ndarray) -> List[Tuple[int, int]]:
+    """Collapse sorted row numbers into (start, end) runs."""
+    if not rows.size:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1)
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+    ends = np.concatenate((rows[breaks], [rows[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class _Columns:
+    """Column values aligned to the sheet's data rows, parsed on demand."""
+
+    def __init__(self, frame: SheetFrame):
+        self.frame = frame
+        self.rows = np.array(frame.data_row_numbers(frame.min_row), dtype=np.int64)
+        self._text: Dict[str, List[str]] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+
+    def text(self, col: str) -> List[str]:
+        if col not in self._text:
+            self._text[col] = self.frame.aligned_column(col, self.rows.tolist())
+        return self._text[col]
+
+    def numbers(self, col: str) -> np.ndarray:
+        if col not in self._numbers:
+            self._numbers[col] = numeric_array(self.text(col))
+        return self._numbers[col]
+
+
+def _filter_mask(columns: _Columns, qfilter: QueryFilter) -> Optional[np.ndarray]:
+    """Boolean mask over data rows, or None if the filter can't be applied exactly."""
+    numbers = columns.numbers(qfilter.column)
+    target = numeric_array([qfilter.value])[0]
+
+    if qfilter.op in (">", ">=", "<", "<="):
+        if target != target:
+            return None
+        with np.errstate(invalid="ignore"):
+            return {
+                ">": numbers > target, ">=": numbers >= target,
+                "<": numbers < target, "<=": numbers <= target,
+            }[qfilter.op]
+
+    if target == target and np.count_nonzero(~np.isnan(numbers)):
+        mask = numbers == target
+    else:
+        wanted = qfilter.value.strip().lower()
+        values = np.array([v.strip().lower() for v in columns.text(qfilter.column)], dtype=object)
+        mask = values == wanted
+    if qfilter.op == "=" and not mask.any():
+        return None  # value not in the column: probably not a filter we understood
+    return ~mask if qfilter.op == "!=" else mask
+
+
+def _aggregate(aggregation: str, numbers: np.ndarray) -> float:
+    # Callers narrow count plans to rows with a value, so count == rows
+    present = numbers[~np.isnan(numbers)]
+    if aggregation == "count":
+        return float(present.size)
+    if not present.size:
+        return float("nan")
+    return float({
+        "sum": np.sum, "avg": np.mean, "min": np.min, "max": np.max,
+    }[aggregation](present))
+
+
+def execute(plan: QueryPlan, frame: SheetFrame, metadata: SheetMetadata, sheet_name: str) -> Optional[QueryAnswer]:
+    """
+    Run a QueryPlan over the frame.
+
+    Returns:
+        QueryAnswer with markdown text and exact source ranges, or None if
+        the plan can't be answered exactly (e.g. no numeric values)
+    """
+    headers = {c.letter: c.header for c in metadata.columns}
+    columns = _Columns(frame)
+    if not columns.rows.size:
+        return None
+    first, last = int(columns.rows[0]), int(columns.rows[-1])
+    last_col = frame.columns[-1]
+
+    mask = np.ones(columns.rows.size, dtype=bool)
+    for qfilter in plan.filters:
+        filter_mask = _filter_mask(columns, qfilter)
+        if filter_mask is None:
+            return None
+        mask &= filter_mask
+
+    # "how many sales ..." counts the rows that have a Sales value, in the
+    # scalar, grouped and top-N paths alike
+    if plan.aggregation == "count" and plan.value_column:
+        mask &= ~np.isnan(columns.numbers(plan.value_column))
+
+    matched_rows = columns.rows[mask]
+    filter_desc = " and ".join(f"{headers[f.column]} {f.op} {f.value}" for f in plan.filters)
+    where = f" where {filter_desc}" if filter_desc else ""
+
+    def column_source(col: str) -> SourceReference:
+        return SourceReference(
+            label=f"{headers[col]} ({col}{first}:{col}{last})",
+            sheet=sheet_name,
+            range=f"{col}{first}:{col}{last}",
+        )
+
+    sources: List[SourceReference] = []
+    if plan.value_column:
+        sources.append(column_source(plan.value_column))
+    if plan.group_column:
+        sources.append(column_source(plan.group_column))
+    if plan.filters:
+        for start, end in _row_runs(matched_rows)[:10]:
+            label = f"Row {start}" if start == end else f"Rows {start}-{end}"
+            sources.append(SourceReference(label=label, sheet=sheet_name, range=f"A{start}:{last_col}{end}"))
+
+    numbers = columns.numbers(plan.value_column)[mask] if plan.value_column else None
+    agg_label = _AGG_LABELS[plan.aggregation]
+    value_header = headers.get(plan.value_column, "rows")
+
+    # --- Grouped (optionally top-N) ---
+    if plan.group_column:
+        keys = [v for v, keep in zip(columns.text(plan.group_column), mask) if keep]
+        results = group_aggregate(keys, plan.aggregation, numbers)
+        if not results:
+            return None
+        ordered = sorted(results.items(), key=lambda kv: kv[1], reverse=plan.descending)
+        shown = ordered[:plan.top_n or 20]
+        group_header = headers[plan.group_column]
+        metric = f"{agg_label} {value_header}" if plan.value_column else "Count"
+        title = (
+            f"{'Top' if plan.descending else 'Bottom'} {plan.top_n} {group_header} by {metric}"
+            if plan.top_n else f"{metric} by {group_header}"
+        )
+        lines = [f"**{title}**{where}:", "", f"| {group_header} | {metric} |", "|---|---|"]
+        lines += [f"| {key} | {_fmt(val)} |" for key, val in shown]
+        if len(ordered) > len(shown) and not plan.top_n:
+            lines.append(f"\n…and {len(ordered) - len(shown)} more groups.")
+        lines.append(f"\nComputed from {int(mask.sum()):,} rows (rows {first}-{last}).")
+        return QueryAnswer("\n".join(lines), sources, plan)
+
+    # --- Top-N rows (no label column) ---
+    if plan.top_n:
+        present = ~np.isnan(numbers)
+        order = np.argsort(numbers[present], kind="stable")
+        if plan.descending:
+            order = order[::-1]
+        picked = order[:plan.top_n]
+        rows = matched_rows[present][picked]
+        vals = numbers[present][picked]
+        lines = [f"**{'Top' if plan.descending else 'Bottom'} {plan.top_n} {value_header}**{where}:", ""]
+        lines += [f"{i + 1}. Row {r}: {_fmt(v)}" for i, (r, v) in enumerate(zip(rows.tolist(), vals.tolist()))]
+        col = plan.value_column
+        sources += [SourceReference(label=f"Cell {col}{r}", sheet=sheet_name, range=f"{col}{r}") for r in rows.tolist()]
+        return QueryAnswer("\n".join(lines), sources, plan)
+
+    # --- Scalar ---
+    if plan.value_column is None:
+        count = int(mask.sum())
+        text = f"**{count:,}** rows{where}."
+        return QueryAnswer(text, sources, plan)
+
+    result = _aggregate(plan.aggregation, numbers)
+    if result != result:
+        return None
+    text = f"**{agg_label} {value_header}**{where}: **{_fmt(result)}**"
+    if plan.aggregation in ("min", "max"):
+        present = ~np.isnan(numbers)
+        pick = np.nanargmax(numbers) if plan.aggregation == "max" else np.nanargmin(numbers)
+        if present.any():
+            row = int(matched_rows[pick])
+            col = plan.value_column
+            text += f" (row {row})"
+            sources.append(SourceReference(label=f"Cell {col}{row}", sheet=sheet_name, range=f"{col}{row}"))
+    counted = int((~np.isnan(numbers)).sum())
+    text += f"\n\nComputed from {counted:,} values in {plan.value_column}{first}:{plan.value_column}{last}."
+    return QueryAnswer(text, sources, plan)
+
+
+def answer_locally(question: str, cells: Dict, sheet_name: str = "Sheet1") -> Optional[QueryAnswer]:
+    """
+    Answer a question from the sheet data if it's a simple aggregate.
+
+    Args:
+        question: The user's chat message
+        cells: A1-keyed cells dict
+        sheet_name: Sheet the cells belong to
+
+    Returns:
+        QueryAnswer, or None when the LLM should handle the question
+    """
+    if not cells:
+        return None
+    try:
+        metadata = get_sheet_metadata(cells, sheet_name)
+        plan = parse_question(question, metadata)
+        if plan is None:
+            return None
+        answer = execute(plan, get_frame(cells), metadata, sheet_name)
+        if answer is not None:
+            logger.info(f"Local query engine answered: {plan}")
+        return answer
+    except Exception as e:
+        logger.warning(f"Local query engine failed, falling back to LLM: {e}")
+        return None
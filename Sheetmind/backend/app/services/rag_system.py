@@ -6,19 +6,35 @@ Enables semantic search across sheets with 500+ rows by:
 2. Storing in Chroma vector database
 3. Retrieving only relevant rows for AI queries
 
-Supports Google embeddings with OpenRouter API-based fallback.
+Supports Google embeddings with OpenRouter API-based fallback, and offline
+hashing embeddings (app.services.local_embeddings) when neither is available
+or RAG_EMBEDDING_PROVIDER="local". API row embeddings are cached by content
+(see app.services.embedding_cache).
 """
 
 import hashlib
 import json
 import logging
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from langchain_core.documents import Document
 
 from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.fingerprint import get_fingerprint
+from app.services.index_registry import IndexRegistry
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.local_embeddings import HashingEmbeddings
+from app.services.metadata_cache import get_sheet_metadata
+from app.services.query_constraints import extract_constraints
+from app.services.sheet_frame import get_frame
 
 logger = logging.getLogger(__name__)
 
@@ -67,20 +83,31 @@ def _get_openrouter_embeddings():
 
 
 def _get_embeddings():
-    """Get the best available embeddings model."""
+    """Get the embeddings model selected by RAG_EMBEDDING_PROVIDER."""
+    provider = settings.RAG_EMBEDDING_PROVIDER
+
     # Try Google first
-    if settings.GEMINI_API_KEY:
+    if provider in ("auto", "google") and settings.GEMINI_API_KEY:
         embeddings = _get_google_embeddings()
         if embeddings:
             return embeddings, "google"
 
     # Fall back to OpenRouter embeddings
-    if settings.OPENROUTER_API_KEY:
+    if provider in ("auto", "openrouter") and settings.OPENROUTER_API_KEY:
         embeddings = _get_openrouter_embeddings()
         if embeddings:
             return embeddings, "openrouter"
 
-    raise RuntimeError("No embedding model available. Provide GEMINI_API_KEY or OPENROUTER_API_KEY.")
+    # Offline hashing embeddings: no network, no API key
+    if provider in ("auto", "local"):
+        if provider == "auto":
+            logger.warning("No API embeddings model available, using local hashing embeddings")
+        return HashingEmbeddings(settings.RAG_LOCAL_EMBEDDING_DIMS), "local"
+
+    raise RuntimeError(
+        f"Embedding provider '{provider}' unavailable. Provide GEMINI_API_KEY or "
+        "OPENROUTER_API_KEY, or set RAG_EMBEDDING_PROVIDER=local."
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -90,100 +117,206 @@ def _get_embeddings():
 CHROMA_DIR = Path(settings.CHROMA_PERSIST_DIR)
 CHROMA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Embedding calls are network-bound; this pool bounds how many run at once
+# across all indexing jobs in the process (separate from the route's
+# _bg_executor, which runs index_sheet itself)
+_embed_executor = ThreadPoolExecutor(
+    max_workers=settings.RAG_EMBED_CONCURRENCY, thread_name_prefix="rag-embed"
+)
+
 
 # ---------------------------------------------------------------------------
 # SheetRAG Class
 # ---------------------------------------------------------------------------
 
+def rag_namespace(user_id: str, spreadsheet_id: Optional[str] = None) -> str:
+    """Index namespace for a user's spreadsheet (indexes are never shared across namespaces)."""
+    return f"{user_id}:{spreadsheet_id or 'default'}"
+
+
+DEFAULT_NAMESPACE = rag_namespace("anonymous")
+
+
 class SheetRAG:
-    """RAG system for spreadsheet data."""
+    """RAG system for spreadsheet data.
 
-    # Maximum number of vectorstores to keep in memory
-    MAX_CACHED = 10
+    Indexes are registered per (namespace, sheet) so two users' "Sheet1"
+    never share, overwrite or evict-and-delete each other's collection.
+    Loaded collections are kept in a size-aware LRU: the budget is
+    ``RAG_CACHE_MAX_BYTES`` of vectors (rows x dims x 4 bytes), not a count.
+    Worker processes coordinate through an IndexRegistry in CHROMA_DIR, so
+    a sheet is indexed by one worker and reopened by the others.
+    """
+
+    # Assumed vector width until the first embedding call reveals it
+    DEFAULT_DIMS = 768
+    # BM25 indexes kept in memory (cheap to rebuild from the request's cells)
+    MAX_LEXICAL = 32
 
     def __init__(self):
         """Initialize the RAG system."""
-        self._vectorstores: Dict[str, any] = {}
-        self._sheet_hashes: Dict[str, str] = {}  # sheet_name -> current hash
+        self._vectorstores: "OrderedDict[str, any]" = OrderedDict()  # collection -> store (LRU order)
+        self._store_bytes: Dict[str, int] = {}  # collection -> estimated vector bytes
+        self._sheet_hashes: Dict[str, str] = {}  # collection -> indexed sheet hash
+        self._indexed_rows: Dict[str, Dict[str, object]] = {}  # collection -> {doc_id: row(s)}
+        self._progress: Dict[str, Dict] = {}  # collection -> indexing progress
+        self._progress_lock = threading.Lock()
+        self._registry_lock = threading.RLock()
+        self._index_locks: Dict[str, threading.Lock] = {}
+        self._lexical: "OrderedDict[str, Tuple[str, List[Document], LexicalIndex]]" = OrderedDict()
+        self._registry = IndexRegistry(CHROMA_DIR)  # shared with the other workers
+        self._loaded_versions: Dict[str, int] = {}  # collection -> registry version loaded
+        self._loaded_embeddings: Dict[str, str] = {}  # collection -> embedding id of its vectors
         self._embeddings = None
         self._embedding_type = None
+        self._dims: Optional[int] = None
 
     def _ensure_embeddings(self):
         """Ensure embeddings are loaded."""
         if self._embeddings is None:
-            self._embeddings, self._embedding_type = _get_embeddings()
+            embeddings, self._embedding_type = _get_embeddings()
+            if self._embedding_type == "local":
+                # Hashing is cheaper than a cache lookup
+                self._embeddings = embeddings
+            else:
+                model = getattr(embeddings, "model", "") or "default"
+                self._embeddings = CachedEmbeddings(embeddings, f"{self._embedding_type}:{model}")
         return self._embeddings
 
+    def _embedding_id(self) -> str:
+        """
+        The vector space new embeddings land in: provider, model and, when the
+        model declares it, vector width. Collections built with another id
+        (e.g. before "auto" fell back to local hashing) are rebuilt.
+        """
+        embeddings = self._ensure_embeddings()
+        if isinstance(embeddings, CachedEmbeddings):
+            return embeddings.model
+        model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        dims = getattr(embeddings, "dims", None) or getattr(embeddings, "size", None)
+        return f"{self._embedding_type}:{model}" + (f":{dims}" if dims else "")
+
     def _get_sheet_hash(self, cells: Dict) -> str:
-        """Generate a hash of sheet data to detect changes."""
-        content = json.dumps(cells, sort_keys=True)
-        return hashlib.md5(content.encode()).hexdigest()[:12]
+        """Short content hash of the sheet (memoized per request) to detect changes."""
+        return get_fingerprint(cells).short()
 
-    def is_stale(self, cells: Dict, sheet_name: str) -> bool:
+    def is_stale(self, cells: Dict, sheet_name: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
         """Check if the current index is outdated for this sheet data."""
         current_hash = self._get_sheet_hash(cells)
-        stored_hash = self._sheet_hashes.get(sheet_name)
+        stored_hash = self._sheet_hashes.get(self._collection_name(sheet_name, namespace))
         return stored_hash is not None and stored_hash != current_hash
 
-    def _cleanup_old_versions(self, sheet_name: str, keep_collection: str) -> None:
-        """Remove old index versions for a sheet (memory + disk)."""
-        prefix = sheet_name.replace(" ", "_") + "_"
-        old_keys = [
-            k for k in self._vectorstores
-            if k.startswith(prefix) and k != keep_collection
-        ]
-
-        for key in old_keys:
-            del self._vectorstores[key]
-            # Remove Chroma directory from disk
-            old_path = CHROMA_DIR / key
-            if old_path.exists():
+    @staticmethod
+    def _collection_name(sheet_name: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+        """
+        One Chroma collection per (namespace, sheet), updated in place as the
+        sheet changes. Chroma names allow 3-63 chars of [A-Za-z0-9_-], so the
+        readable part is sanitized and the namespace + full sheet name hashed.
+        """
+        safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", sheet_name)[:40].strip("_-") or "sheet"
+        digest = hashlib.blake2b(f"{namespace}\0{sheet_name}".encode(), digest_size=6).hexdigest()
+        return f"{safe_name}_ns{digest}"
+
+    def _legacy_collections(self, sheet_name: str) -> List[str]:
+        """Un-namespaced ``{sheet}_{hash}`` / ``{sheet}_rows`` collections from older versions."""
+        safe_name = sheet_name.replace(" ", "_")
+        pattern = re.compile(re.escape(safe_name) + r"_(?:rows|[0-9a-f]{12})")
+        names = set(self._vectorstores) | {p.name for p in CHROMA_DIR.iterdir() if p.is_dir()}
+        return sorted(name for name in names if pattern.fullmatch(name))
+
+    def _drop(self, collection_name: str, delete_files: bool = False) -> None:
+        """Forget a collection (memory), optionally deleting it from disk."""
+        with self._registry_lock:
+            vectorstore = self._vectorstores.pop(collection_name, None)
+            self._store_bytes.pop(collection_name, None)
+            self._indexed_rows.pop(collection_name, None)
+            self._sheet_hashes.pop(collection_name, None)
+            self._lexical.pop(collection_name, None)
+            self._loaded_versions.pop(collection_name, None)
+            self._loaded_embeddings.pop(collection_name, None)
+        if vectorstore is not None:
+            # Release Chroma's process-local copy so a reopen reads from disk
+            try:
+                vectorstore._client.close()
+            except Exception as e:
+                logger.debug(f"Closing Chroma client for {collection_name} failed: {e}")
+        if delete_files:
+            with self._progress_lock:
+                self._progress.pop(collection_name, None)
+            self._registry.remove(collection_name)
+            path = CHROMA_DIR / collection_name
+            if path.exists():
                 import shutil
                 try:
-                    shutil.rmtree(old_path)
-                    logger.info(f"Cleaned up old index: {key}")
+                    shutil.rmtree(path)
+                    logger.info(f"Deleted index: {collection_name}")
                 except Exception as e:
-                    logger.warning(f"Failed to delete old index dir {key}: {e}")
+                    logger.warning(f"Failed to delete index dir {collection_name}: {e}")
+
+    def _cleanup_old_versions(self, sheet_name: str) -> None:
+        """Remove pre-namespacing index versions of a sheet (memory + disk)."""
+        for key in self._legacy_collections(sheet_name):
+            self._drop(key, delete_files=True)
+
+    def _register(self, collection_name: str, vectorstore, row_count: int) -> None:
+        """Mark a collection most recently used and record its vector size."""
+        with self._registry_lock:
+            self._vectorstores.pop(collection_name, None)
+            self._vectorstores[collection_name] = vectorstore
+            self._store_bytes[collection_name] = row_count * (self._dims or self.DEFAULT_DIMS) * 4
+            self._evict_if_needed(keep=collection_name)
+
+    def _touch(self, collection_name: str):
+        """The loaded store for a collection (marked most recently used), or None."""
+        with self._registry_lock:
+            vectorstore = self._vectorstores.get(collection_name)
+            if vectorstore is not None:
+                self._vectorstores.move_to_end(collection_name)
+            return vectorstore
 
-    def _evict_if_needed(self) -> None:
-        """Evict oldest vectorstores if we exceed MAX_CACHED."""
-        while len(self._vectorstores) > self.MAX_CACHED:
-            oldest_key = next(iter(self._vectorstores))
-            del self._vectorstores[oldest_key]
-            logger.info(f"Evicted cached vectorstore: {oldest_key}")
+    def _evict_if_needed(self, keep: Optional[str] = None) -> None:
+        """Unload least recently used collections while over the byte budget.
+
+        Evicted collections stay on disk and reload on next use.
+        """
+        with self._registry_lock:
+            while sum(self._store_bytes.values()) > settings.RAG_CACHE_MAX_BYTES:
+                oldest_key = next((k for k in self._vectorstores if k != keep), None)
+                if oldest_key is None:
+                    break
+                freed = self._store_bytes.get(oldest_key, 0)
+                self._drop(oldest_key)
+                logger.info(f"Evicted cached vectorstore: {oldest_key} ({freed // 1024}KB)")
+
+    def _index_lock(self, collection_name: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._index_locks.setdefault(collection_name, threading.Lock())
 
     def _cells_to_documents(self, cells: Dict, sheet_name: str) -> List[Document]:
         """
         Convert spreadsheet cells to LangChain documents.
         Each row becomes a document with metadata.
-        """
-        cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-        # Parse cells into rows and extract headers
-        rows: Dict[int, Dict[str, str]] = {}
-        headers: Dict[str, str] = {}
-
-        for cell_ref, value in cells.items():
-            match = cell_pattern.match(cell_ref)
-            if not match:
-                continue
-
-            col = match.group(1)
-            row_num = int(match.group(2))
 
-            if row_num == 1:
-                headers[col] = str(value)
-            else:
-                if row_num not in rows:
-                    rows[row_num] = {}
-                rows[row_num][col] = str(value)
+        ``page_content`` holds only the row's values (no row number), so a row
+        that moves keeps its embedding. Each document's ``id`` is a hash of
+        that content, suffixed for repeated identical rows. Memoized on the
+        request's frame (lexical search and indexing share the list).
+        """
+        frame = get_frame(cells)
+        memo_key = ("rag_documents", sheet_name)
+        cached = frame.derived.get(memo_key)
+        if cached is not None:
+            return cached
+        headers = frame.headers
 
         # Sort columns for consistent ordering
-        sorted_cols = sorted(headers.keys(), key=lambda c: (len(c), c))
+        sorted_cols = list(headers.keys())
 
         # Create documents from rows
         documents = []
-        for row_num, row_data in rows.items():
+        seen: Dict[str, int] = {}
+        for row_num in frame.data_row_numbers():
+            row_data = frame.row(row_num)
             # Create readable text representation
             parts = []
             for col in sorted_cols:
@@ -193,24 +326,185 @@ class SheetRAG:
                     parts.append(f"{header}: {value}")
 
             if parts:
-                text = f"Row {row_num}: " + " | ".join(parts)
+                text = " | ".join(parts)
                 doc = Document(
+                    id=self._content_id(text, seen),
                     page_content=text,
                     metadata={
                         "sheet": sheet_name,
                         "row": row_num,
-                        "cells": json.dumps(row_data),
+                        "cells": dumps(row_data),
                     }
                 )
                 documents.append(doc)
 
+        frame.derived[memo_key] = documents
         return documents
 
+    @staticmethod
+    def _content_id(text: str, seen: Dict[str, int]) -> str:
+        """Hash of ``text``, suffixed when the same text was already seen."""
+        content_hash = hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+        return f"{content_hash}-{occurrence}" if occurrence else content_hash
+
+    def _vector_documents(self, cells: Dict, sheet_name: str) -> List[Document]:
+        """
+        Documents stored in the vector index.
+
+        With RAG_CHUNK_ROWS > 1, up to that many rows are packed into one
+        document (consecutive rows, or rows sharing a RAG_CHUNK_BY value),
+        so big sheets need N-fold fewer embeddings and vectors. Chunks carry
+        their rows in metadata ("rows", JSON) so hits expand back to rows;
+        "row" is the chunk's first row. Lexical search and result formatting
+        always use the per-row documents.
+        """
+        documents = self._cells_to_documents(cells, sheet_name)
+        chunk_rows = settings.RAG_CHUNK_ROWS
+        if chunk_rows <= 1 or not documents:
+            return documents
+
+        frame = get_frame(cells)
+        memo_key = ("rag_chunks", sheet_name, chunk_rows, settings.RAG_CHUNK_BY)
+        cached = frame.derived.get(memo_key)
+        if cached is not None:
+            return cached
+
+        column = self._chunk_column(frame)
+        if column:
+            groups: Dict[str, List[Document]] = {}
+            for doc in documents:
+                groups.setdefault(frame.get(column, doc.metadata["row"]).strip(), []).append(doc)
+            runs = list(groups.values())
+        else:
+            runs = [documents]
+
+        chunks = []
+        seen: Dict[str, int] = {}
+        for run in runs:
+            for start in range(0, len(run), chunk_rows):
+                part = run[start:start + chunk_rows]
+                text = "\n".join(doc.page_content for doc in part)
+                rows = [doc.metadata["row"] for doc in part]
+                chunks.append(Document(
+                    id=self._content_id(text, seen),
+                    page_content=text,
+                    metadata={"sheet": sheet_name, "row": rows[0], "row_end": rows[-1], "rows": dumps(rows)},
+                ))
+
+        frame.derived[memo_key] = chunks
+        return chunks
+
+    @staticmethod
+    def _chunk_column(frame) -> Optional[str]:
+        """Column letter for RAG_CHUNK_BY (a letter or a header), if it exists."""
+        wanted = settings.RAG_CHUNK_BY.strip()
+        if not wanted:
+            return None
+        if wanted.upper() in frame.headers:
+            return wanted.upper()
+        return next(
+            (col for col, header in frame.headers.items() if header.strip().lower() == wanted.lower()),
+            None,
+        )
+
+    @staticmethod
+    def _doc_rows(metadata: Dict) -> List[int]:
+        """Rows a vector document covers."""
+        if "rows" in metadata:
+            return loads(metadata["rows"])
+        return [metadata.get("row")]
+
+    @staticmethod
+    def _doc_position(metadata: Dict):
+        """What changes when a document moves: its row, or its chunk's row list."""
+        return metadata.get("rows", metadata.get("row"))
+
+    @staticmethod
+    def _row_text(row: Optional[int], content: str) -> str:
+        return f"Row {row}: {content}"
+
+    def _open_collection(self, collection_name: str, embeddings) -> Tuple[object, Dict[str, object]]:
+        """Load (or create) a sheet's collection and its {doc_id: position} map (see _doc_position)."""
+        from langchain_community.vectorstores import Chroma
+
+        vectorstore = self._vectorstores.get(collection_name)
+        indexed = self._indexed_rows.get(collection_name)
+        if vectorstore is None:
+            vectorstore = Chroma(
+                collection_name=collection_name,
+                embedding_function=embeddings,
+                persist_directory=str(CHROMA_DIR / collection_name),
+            )
+            indexed = None
+        if indexed is None:
+            stored = vectorstore.get(include=["metadatas"])
+            indexed = {
+                doc_id: self._doc_position(meta)
+                for doc_id, meta in zip(stored["ids"], stored["metadatas"])
+            }
+        return vectorstore, indexed
+
+    def _set_progress(self, collection_name: str, **fields) -> None:
+        with self._progress_lock:
+            self._progress.setdefault(collection_name, {}).update(fields)
+
+    def get_index_progress(self, sheet_name: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Dict]:
+        """
+        Progress of the latest indexing run for a sheet.
+
+        Returns:
+            {"status": "indexing" | "indexed" | "error", "indexed": documents
+            in the index so far, "total": documents for the sheet (rows, or
+            row chunks with RAG_CHUNK_ROWS > 1)}, or None if the sheet hasn't
+            been indexed by this process
+        """
+        with self._progress_lock:
+            progress = self._progress.get(self._collection_name(sheet_name, namespace))
+            return dict(progress) if progress else None
+
+    def _embed_and_add(self, vectorstore, documents: List[Document], collection_name: str) -> None:
+        """
+        Embed documents in batches on the embedding pool and write each batch
+        to the collection as soon as it completes.
+
+        Raises:
+            Exception: The first failed batch (remaining batches are cancelled;
+                batches already written stay in the collection)
+        """
+        embeddings = self._ensure_embeddings()
+        batch_size = max(1, settings.RAG_EMBED_BATCH_SIZE)
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+
+        futures = {
+            _embed_executor.submit(embeddings.embed_documents, [doc.page_content for doc in batch]): batch
+            for batch in batches
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors = future.result()
+                if vectors:
+                    self._dims = len(vectors[0])
+                vectorstore._collection.upsert(
+                    ids=[doc.id for doc in batch],
+                    embeddings=vectors,
+                    documents=[doc.page_content for doc in batch],
+                    metadatas=[doc.metadata for doc in batch],
+                )
+                with self._progress_lock:
+                    self._progress[collection_name]["indexed"] += len(batch)
+        finally:
+            for future in futures:
+                future.cancel()
+
     def index_sheet(
         self,
         cells: Dict,
         sheet_name: str,
-        force_reindex: bool = False
+        force_reindex: bool = False,
+        namespace: str = DEFAULT_NAMESPACE,
     ) -> Dict:
         """
         Index a sheet's data for semantic search.
@@ -219,31 +513,95 @@ class SheetRAG:
             cells: Dictionary of cell references to values
             sheet_name: Name of the sheet
             force_reindex: If True, reindex even if unchanged
+            namespace: Owner of the index (see rag_namespace)
 
         Returns:
             Status dict with indexed row count and embedding type
         """
         try:
-            from langchain_community.vectorstores import Chroma
+            from langchain_community.vectorstores import Chroma  # noqa: F401
         except ImportError:
             return {"error": "chromadb not installed", "indexed": 0}
 
+        collection_name = self._collection_name(sheet_name, namespace)
         sheet_hash = self._get_sheet_hash(cells)
-        collection_name = f"{sheet_name}_{sheet_hash}".replace(" ", "_")
-
-        # Check if already indexed with same data
-        if collection_name in self._vectorstores and not force_reindex:
+        # Concurrent requests for the same sheet wait for one indexing run:
+        # threads on the in-process lock, other workers on the registry's file lock
+        with self._index_lock(collection_name):
+            if not force_reindex:
+                reused = self._reuse_index(collection_name, sheet_hash)
+                if reused is not None:
+                    return reused
+            try:
+                with self._registry.lock(collection_name, settings.RAG_INDEX_LOCK_TIMEOUT):
+                    # Another worker may have indexed this content while we waited
+                    if not force_reindex:
+                        reused = self._reuse_index(collection_name, sheet_hash)
+                        if reused is not None:
+                            return reused
+                    return self._index_collection(cells, sheet_name, collection_name, sheet_hash, force_reindex)
+            except TimeoutError as e:
+                logger.warning(str(e))
+                return {"error": str(e), "indexed": 0}
+
+    def _registry_current(self, collection_name: str) -> bool:
+        """Whether the loaded collection is the latest version any worker wrote."""
+        entry = self._registry.read(collection_name)
+        return entry is None or entry["version"] == self._loaded_versions.get(collection_name)
+
+    def _reuse_index(self, collection_name: str, sheet_hash: str) -> Optional[Dict]:
+        """
+        Status dict if the collection already holds ``sheet_hash`` (loaded
+        here, or written by another worker and reopened now), else None.
+        """
+        entry = self._registry.read(collection_name)
+        embedding_id = self._embedding_id()
+        if (
+            self._touch(collection_name) is not None
+            and self._sheet_hashes.get(collection_name) == sheet_hash
+            and self._loaded_embeddings.get(collection_name) == embedding_id
+            and (entry is None or entry["version"] == self._loaded_versions.get(collection_name))
+        ):
             return {
                 "status": "already_indexed",
                 "collection": collection_name,
                 "embedding_type": self._embedding_type,
             }
+        if entry is None or entry["sheet_hash"] != sheet_hash or entry.get("embedding") != embedding_id:
+            return None
 
-        # Clean up old versions of this sheet's index before creating new one
-        self._cleanup_old_versions(sheet_name, keep_collection=collection_name)
+        try:
+            embeddings = self._ensure_embeddings()
+            self._drop(collection_name)  # stale local copy, if any
+            vectorstore, indexed = self._open_collection(collection_name, embeddings)
+        except Exception as e:
+            logger.warning(f"Failed to reopen {collection_name}, re-indexing: {e}")
+            return None
+        with self._registry_lock:
+            self._indexed_rows[collection_name] = indexed
+            self._sheet_hashes[collection_name] = sheet_hash
+            self._loaded_versions[collection_name] = entry["version"]
+            self._loaded_embeddings[collection_name] = embedding_id
+            self._register(collection_name, vectorstore, len(indexed))
+        self._set_progress(collection_name, status="indexed", indexed=len(indexed), total=entry["documents"])
+        logger.info(f"Reopened {collection_name} indexed by another worker (v{entry['version']})")
+        return {
+            "status": "already_indexed",
+            "collection": collection_name,
+            "indexed": len(indexed),
+            "embedded": 0,
+            "embedding_type": self._embedding_type,
+        }
+
+    def _index_collection(
+        self, cells: Dict, sheet_name: str, collection_name: str, sheet_hash: str, force_reindex: bool
+    ) -> Dict:
+        """Diff the sheet against the collection and write the changes (holding both index locks)."""
+        # Drop un-namespaced indexes left over from older versions
+        self._cleanup_old_versions(sheet_name)
 
-        # Convert to documents
-        documents = self._cells_to_documents(cells, sheet_name)
+        # Convert to documents (rows, or row chunks)
+        documents = self._vector_documents(cells, sheet_name)
 
         if not documents:
             return {"status": "no_data", "indexed": 0}
@@ -254,31 +612,79 @@ class SheetRAG:
         except RuntimeError as e:
             return {"error": str(e), "indexed": 0}
 
-        # Create vector store
+        # Diff against what the collection already holds: embed only new or
+        # changed rows, delete removed ones, re-point moved rows' metadata
         try:
-            persist_path = str(CHROMA_DIR / collection_name)
-            vectorstore = Chroma.from_documents(
-                documents=documents,
-                embedding=embeddings,
-                persist_directory=persist_path,
-                collection_name=collection_name,
+            embedding_id = self._embedding_id()
+            entry = self._registry.read(collection_name)
+            if (CHROMA_DIR / collection_name).exists() and (entry or {}).get("embedding") != embedding_id:
+                # Vectors from another model (or of unknown origin) can't be
+                # diffed against or searched with this one: start over. The
+                # registry entry (and its lock file, which we hold) stays.
+                logger.info(f"Rebuilding {collection_name}: embeddings changed to {embedding_id}")
+                self._drop(collection_name)
+                self._open_collection(collection_name, embeddings)[0].delete_collection()
+            elif not self._registry_current(collection_name):
+                self._drop(collection_name)  # another worker wrote since we loaded it
+            vectorstore, indexed = self._open_collection(collection_name, embeddings)
+            if force_reindex and indexed:
+                vectorstore.delete(ids=list(indexed))
+                indexed = {}
+
+            current = {doc.id: doc for doc in documents}
+            added = [doc for doc_id, doc in current.items() if doc_id not in indexed]
+            removed = [doc_id for doc_id in indexed if doc_id not in current]
+            moved = [
+                doc for doc_id, doc in current.items()
+                if doc_id in indexed and indexed[doc_id] != self._doc_position(doc.metadata)
+            ]
+
+            self._set_progress(
+                collection_name, status="indexing",
+                indexed=len(documents) - len(added), total=len(documents),
             )
+            if removed:
+                vectorstore.delete(ids=removed)
+            if added:
+                self._embed_and_add(vectorstore, added, collection_name)
+            if moved:
+                vectorstore._collection.update(
+                    ids=[doc.id for doc in moved],
+                    metadatas=[doc.metadata for doc in moved],
+                )
 
-            self._vectorstores[collection_name] = vectorstore
-            self._sheet_hashes[sheet_name] = sheet_hash
-            self._evict_if_needed()
-
-            logger.info(f"Indexed {len(documents)} rows from '{sheet_name}' using {self._embedding_type} embeddings")
+            with self._registry_lock:
+                self._indexed_rows[collection_name] = {
+                    doc_id: self._doc_position(doc.metadata) for doc_id, doc in current.items()
+                }
+                self._sheet_hashes[collection_name] = sheet_hash
+                self._loaded_versions[collection_name] = self._registry.write(
+                    collection_name, sheet_hash, len(current), embedding_id
+                )
+                self._loaded_embeddings[collection_name] = embedding_id
+                self._register(collection_name, vectorstore, len(current))
+            self._set_progress(collection_name, status="indexed")
+
+            logger.info(
+                f"Indexed '{sheet_name}' using {self._embedding_type} embeddings: "
+                f"{len(added)} embedded, {len(removed)} removed, {len(moved)} moved, "
+                f"{len(documents)} {'chunks' if settings.RAG_CHUNK_ROWS > 1 else 'rows'} total"
+            )
 
             return {
-                "status": "indexed",
+                "status": "indexed" if added or removed or moved else "already_indexed",
                 "collection": collection_name,
                 "indexed": len(documents),
+                "embedded": len(added),
+                "removed": len(removed),
+                "moved": len(moved),
                 "embedding_type": self._embedding_type,
             }
 
         except Exception as e:
             logger.error(f"Failed to index sheet: {e}")
+            self._set_progress(collection_name, status="error")
+            self._drop(collection_name)
             return {"error": str(e), "indexed": 0}
 
     def search(
@@ -287,66 +693,182 @@ class SheetRAG:
         sheet_name: str,
         cells: Dict,
         k: int = None,
+        namespace: str = DEFAULT_NAMESPACE,
     ) -> List[Dict]:
         """
-        Semantic search for relevant rows.
+        Hybrid search for relevant rows.
+
+        Numeric and date conditions in the query ("over 500", "in March")
+        are applied first as an exact row filter (see query_constraints):
+        only matching rows are ranked, and when nothing else is left of the
+        query the matching rows are returned as-is (``match="filter"``).
+
+        Then BM25 runs over the rows. If the top lexical hit covers the
+        query (RAG_LEXICAL_CONFIDENCE), those hits are returned without
+        calling the embeddings API; otherwise vector search runs too and the
+        two rankings are merged with reciprocal-rank fusion.
 
         Args:
             query: Natural language search query
             sheet_name: Sheet to search in
             cells: Sheet data (for auto-indexing if needed)
             k: Number of results to return (default from settings)
+            namespace: Owner of the index (see rag_namespace)
 
         Returns:
-            List of matching rows with scores
+            List of matching rows with scores (0 = best) and ``match``
+            ("filter", "lexical", "vector" or "both")
         """
         if k is None:
             k = settings.RAG_RESULTS_COUNT
 
-        # Ensure indexed
-        sheet_hash = self._get_sheet_hash(cells)
-        collection_name = f"{sheet_name}_{sheet_hash}".replace(" ", "_")
+        collection_name = self._collection_name(sheet_name, namespace)
+
+        documents, lexical = self._lexical_index(cells, sheet_name, collection_name)
+
+        # Structured constraints: rank only the rows that satisfy them
+        allowed_rows, doc_mask = None, None
+        constraints = extract_constraints(query, get_sheet_metadata(cells, sheet_name))
+        if constraints:
+            frame = get_frame(cells)
+            data_rows = frame.data_row_numbers()
+            row_mask = constraints.row_mask(frame, data_rows)
+            allowed_rows = set(np.asarray(data_rows, dtype=np.int64)[row_mask].tolist())
+            logger.info(
+                f"RAG constraints [{constraints.describe()}] on '{sheet_name}': "
+                f"{len(allowed_rows)}/{len(data_rows)} rows"
+            )
+            if constraints.filter_only:
+                matched = [doc for doc in documents if doc.metadata["row"] in allowed_rows]
+                return [self._format_result(doc, 0.0, "filter") for doc in matched[:k]]
+            if not allowed_rows:
+                return []
+            query = constraints.residual
+            doc_mask = np.fromiter(
+                (doc.metadata["row"] in allowed_rows for doc in documents), dtype=bool, count=len(documents)
+            )
 
-        if collection_name not in self._vectorstores:
-            result = self.index_sheet(cells, sheet_name)
+        # Lexical first: exact keyword lookups never touch the embeddings API
+        lexical_hits = lexical.search(query, k, mask=doc_mask)
+        if lexical_hits and lexical.confidence(query, lexical_hits[0][0]) >= settings.RAG_LEXICAL_CONFIDENCE:
+            top_score = lexical_hits[0][1]
+            return [
+                self._format_result(documents[i], 1 - score / top_score, "lexical")
+                for i, score in lexical_hits
+            ]
+
+        vector_rows = self._vector_search(query, sheet_name, cells, k, namespace, collection_name, allowed_rows)
+        lexical_rows = [documents[i].metadata["row"] for i, _ in lexical_hits]
+        if vector_rows is None:
+            vector_rows = []  # vector search unavailable: lexical results only
+
+        # Reciprocal-rank fusion of both rankings, keyed by row
+        by_row = {doc.metadata["row"]: doc for doc in documents}
+        fused = [
+            (row, score) for row, score in reciprocal_rank_fusion([lexical_rows, vector_rows])
+            if row in by_row
+        ][:k]
+        if not fused:
+            return []
+        lexical_set, vector_set = set(lexical_rows), set(vector_rows)
+        top_score = fused[0][1]
+        return [
+            self._format_result(
+                by_row[row], 1 - score / top_score,
+                "both" if row in lexical_set and row in vector_set
+                else "lexical" if row in lexical_set else "vector",
+            )
+            for row, score in fused
+        ]
+
+    def _vector_search(
+        self,
+        query: str,
+        sheet_name: str,
+        cells: Dict,
+        k: int,
+        namespace: str,
+        collection_name: str,
+        allowed_rows: Optional[set] = None,
+    ) -> Optional[List[int]]:
+        """Row numbers ranked by vector similarity (among ``allowed_rows`` if given), or None if vector search failed."""
+        # Ensure indexed and up to date (incremental if the sheet changed)
+        vectorstore = self._touch(collection_name)
+        if (
+            vectorstore is None
+            or self.is_stale(cells, sheet_name, namespace)
+            or not self._registry_current(collection_name)
+        ):
+            result = self.index_sheet(cells, sheet_name, namespace=namespace)
             if "error" in result:
                 logger.warning(f"RAG indexing failed: {result['error']}")
-                return []
+                return None
+            vectorstore = self._touch(collection_name)
 
-        vectorstore = self._vectorstores.get(collection_name)
         if not vectorstore:
-            return []
+            return None
 
-        try:
-            # Search with scores
-            results = vectorstore.similarity_search_with_score(query, k=k)
-
-            # Format results
-            formatted = []
-            for doc, score in results:
-                try:
-                    cell_data = json.loads(doc.metadata.get("cells", "{}"))
-                except (json.JSONDecodeError, TypeError):
-                    cell_data = {}
-                formatted.append({
-                    "row": doc.metadata.get("row"),
-                    "content": doc.page_content,
-                    "cells": cell_data,
-                    "score": float(score),
-                    "sheet": doc.metadata.get("sheet"),
-                })
-
-            return formatted
+        chunk_rows = max(1, settings.RAG_CHUNK_ROWS)
+        where = None
+        if allowed_rows is not None:
+            # Chunks are filtered by their first row: keep chunks holding any allowed row
+            anchors = sorted(
+                doc.metadata["row"] for doc in self._vector_documents(cells, sheet_name)
+                if not allowed_rows.isdisjoint(self._doc_rows(doc.metadata))
+            ) if chunk_rows > 1 else sorted(allowed_rows)
+            where = {"row": {"$in": anchors}}
 
+        try:
+            results = vectorstore.similarity_search_with_score(query, k=-(-k // chunk_rows), filter=where)
+            rows = [row for doc, _ in results for row in self._doc_rows(doc.metadata)]
+            if allowed_rows is not None:
+                rows = [row for row in rows if row in allowed_rows]
+            return rows[:k]
         except Exception as e:
             logger.error(f"RAG search failed: {e}")
-            return []
+            return None
+
+    def _lexical_index(
+        self, cells: Dict, sheet_name: str, collection_name: str
+    ) -> Tuple[List[Document], LexicalIndex]:
+        """The sheet's row documents and BM25 index (rebuilt only when the sheet changes)."""
+        sheet_hash = self._get_sheet_hash(cells)
+        with self._registry_lock:
+            cached = self._lexical.get(collection_name)
+            if cached is not None and cached[0] == sheet_hash:
+                self._lexical.move_to_end(collection_name)
+                return cached[1], cached[2]
+
+        documents = self._cells_to_documents(cells, sheet_name)
+        lexical = LexicalIndex([doc.page_content for doc in documents])
+        with self._registry_lock:
+            self._lexical[collection_name] = (sheet_hash, documents, lexical)
+            self._lexical.move_to_end(collection_name)
+            while len(self._lexical) > self.MAX_LEXICAL:
+                self._lexical.popitem(last=False)
+        return documents, lexical
+
+    def _format_result(self, doc: Document, score: float, match: str) -> Dict:
+        """Search result dict; ``score`` is 0 for the best hit, lower is better."""
+        try:
+            cell_data = loads(doc.metadata.get("cells", "{}"))
+        except (json.JSONDecodeError, TypeError):
+            cell_data = {}
+        return {
+            "row": doc.metadata.get("row"),
+            "content": self._row_text(doc.metadata.get("row"), doc.page_content),
+            "cells": cell_data,
+            "score": round(float(score), 4),
+            "sheet": doc.metadata.get("sheet"),
+            "match": match,
+        }
 
     def search_multi_sheet(
         self,
         query: str,
         sheets: Dict[str, Dict],  # {sheet_name: cells}
         k: int = None,
+        namespace: str = DEFAULT_NAMESPACE,
     ) -> List[Dict]:
         """
         Search across multiple sheets.
@@ -355,6 +877,7 @@ class SheetRAG:
             query: Search query
             sheets: Dictionary mapping sheet names to their cells
             k: Results per sheet
+            namespace: Owner of the indexes (see rag_namespace)
 
         Returns:
             Combined results from all sheets, sorted by score
@@ -365,10 +888,10 @@ class SheetRAG:
         all_results = []
 
         for sheet_name, cells in sheets.items():
-            results = self.search(query, sheet_name, cells, k=k)
+            results = self.search(query, sheet_name, cells, k=k, namespace=namespace)
             all_results.extend(results)
 
-        # Sort by score (lower is better for Chroma) and return top results
+        # Sort by score (lower is better) and return top results
         all_results.sort(key=lambda x: x["score"])
         return all_results[:k]
 
@@ -378,6 +901,7 @@ class SheetRAG:
         cells: Dict,
         sheet_name: str,
         max_rows: int = None,
+        namespace: str = DEFAULT_NAMESPACE,
     ) -> Tuple[str, List[int], bool]:
         """
         Get relevant context for an AI query.
@@ -390,6 +914,7 @@ class SheetRAG:
             cells: Sheet data
             sheet_name: Sheet name
             max_rows: Maximum rows to include
+            namespace: Owner of the index (see rag_namespace)
 
         Returns:
             (context_string, list_of_row_numbers, used_rag)
@@ -398,22 +923,18 @@ class SheetRAG:
             max_rows = settings.RAG_RESULTS_COUNT
 
         # Count rows
-        row_count = len(set(
-            int(re.match(r"[A-Z]+(\d+)", ref).group(1))
-            for ref in cells.keys()
-            if re.match(r"[A-Z]+(\d+)", ref)
-        ))
+        row_count = get_frame(cells).row_count
 
         # For small sheets, return all data (no RAG needed)
         if row_count <= settings.RAG_THRESHOLD_ROWS:
             return self._format_all_cells(cells, sheet_name), [], False
 
         # For large sheets, detect stale index and log re-indexing
-        if self.is_stale(cells, sheet_name):
-            logger.info(f"Sheet '{sheet_name}' data changed — re-indexing for RAG")
+        if self.is_stale(cells, sheet_name, namespace):
+            logger.info(f"Sheet '{sheet_name}' data changed — updating RAG index incrementally")
 
         # For large sheets, use RAG (auto-indexes if needed via search → index_sheet)
-        results = self.search(query, sheet_name, cells, k=max_rows)
+        results = self.search(query, sheet_name, cells, k=max_rows, namespace=namespace)
 
         if not results:
             # RAG failed, fall back to all data with warning
@@ -432,7 +953,10 @@ class SheetRAG:
             row_numbers.append(r["row"])
 
         lines.append("")
-        lines.append(f"Note: Showing {len(results)} most relevant rows via RAG semantic search.")
+        if results[0]["match"] == "filter":
+            lines.append(f"Note: Showing {len(results)} rows matching the question's numeric/date conditions.")
+        else:
+            lines.append(f"Note: Showing {len(results)} most relevant rows via RAG semantic search.")
 
         return "\n".join(lines), row_numbers, True
 
@@ -445,47 +969,33 @@ class SheetRAG:
 
         lines = [f"All data from '{sheet_name}' ({len(docs)} rows):"]
         for doc in docs[:max_docs]:
-            lines.append(doc.page_content)
+            lines.append(self._row_text(doc.metadata["row"], doc.page_content))
 
         if len(docs) > max_docs:
             lines.append(f"... and {len(docs) - max_docs} more rows")
 
         return "\n".join(lines)
 
-    def clear_index(self, sheet_name: str = None):
+    def clear_index(self, sheet_name: str = None, namespace: str = DEFAULT_NAMESPACE):
         """
         Clear indexed data (memory + disk).
 
         Args:
-            sheet_name: If provided, clear only this sheet's index.
-                       If None, clear all indexes.
+            sheet_name: If provided, clear only this sheet's index in
+                       ``namespace``. If None, clear all loaded indexes.
+            namespace: Owner of the index (see rag_namespace)
         """
-        import shutil
-
         if sheet_name:
-            prefix = sheet_name.replace(" ", "_") + "_"
-            keys_to_remove = [k for k in self._vectorstores if k.startswith(prefix)]
-            for key in keys_to_remove:
-                del self._vectorstores[key]
-                old_path = CHROMA_DIR / key
-                if old_path.exists():
-                    try:
-                        shutil.rmtree(old_path)
-                    except Exception:
-                        pass
+            keys = [self._collection_name(sheet_name, namespace)] + self._legacy_collections(sheet_name)
+            for key in keys:
+                self._drop(key, delete_files=True)
                 logger.info(f"Cleared index for {key}")
-            self._sheet_hashes.pop(sheet_name, None)
         else:
             # Clear all
-            for key in list(self._vectorstores.keys()):
-                old_path = CHROMA_DIR / key
-                if old_path.exists():
-                    try:
-                        shutil.rmtree(old_path)
-                    except Exception:
-                        pass
-            self._vectorstores.clear()
-            self._sheet_hashes.clear()
+            with self._registry_lock:
+                keys = list(self._vectorstores.keys())
+            for key in keys:
+                self._drop(key, delete_files=True)
             logger.info("Cleared all RAG indexes")
 
 
@@ -536,9 +1046,10 @@ def _create_rag_tools():
 
         sheet_name = context.get("sheetName", "Sheet1")
         cells = context["cells"]
+        namespace = context.get("ragNamespace", DEFAULT_NAMESPACE)
 
         rag = get_rag()
-        results = rag.search(query, sheet_name, cells, k=max_results)
+        results = rag.search(query, sheet_name, cells, k=max_results, namespace=namespace)
 
         if not results:
             return '{"results": [], "message": "No matching rows found"}'
@@ -568,15 +1079,10 @@ def _create_rag_tools():
 
         cells = context["cells"]
         sheet_name = context.get("sheetName", "Sheet1")
+        namespace = context.get("ragNamespace", DEFAULT_NAMESPACE)
 
         # Build the row content
-        row_content = []
-        cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-        for cell_ref, value in cells.items():
-            match = cell_pattern.match(cell_ref)
-            if match and int(match.group(2)) == row_number:
-                row_content.append(str(value))
+        row_content = list(get_frame(cells).row(row_number).values())
 
         if not row_content:
             return f'{{"error": "Row {row_number} not found"}}'
@@ -584,7 +1090,7 @@ def _create_rag_tools():
         query = " ".join(row_content)
 
         rag = get_rag()
-        results = rag.search(query, sheet_name, cells, k=max_results + 1)
+        results = rag.search(query, sheet_name, cells, k=max_results + 1, namespace=namespace)
 
         # Remove the source row itself
         results = [r for r in results if r["row"] != row_number]
@@ -7,9 +7,14 @@ This enables smarter, more accurate formula generation without guessing.
 
 import logging
 import re
+from collections import Counter
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.sheet_frame import SheetFrame, get_frame
 
 logger = logging.getLogger(__name__)
 
@@ -187,182 +192,296 @@ def _parse_numeric(value: str) -> Optional[float]:
         return None
 
 
-def _detect_column_type(values: List[str]) -> str:
+# ---------------------------------------------------------------------------
+# Vectorized Column Classification
+# ---------------------------------------------------------------------------
+# Columns are classified in bulk instead of value-by-value:
+#   - an all-numeric column (the common case) is cleaned with five C-level
+#     str.replace calls on the newline-joined column and coerced straight
+#     into a float64 array
+#   - other columns are classified per distinct value (weighted by how often
+#     it occurs): one regex findall over the joined distinct values picks the
+#     numeric candidates, one more the DATE_PATTERNS matches
+# The rules are identical to _is_numeric / _is_date above.
+#
+# The line regexes run over "\n" + joined + "\n", start with a literal "\n"
+# and capture the whole line, so the regex engine skips from newline to
+# newline instead of attempting a match at every character.
+
+_EMPTY_NUMBERS = np.empty(0, dtype=np.float64)
+
+# Same cleanup as _parse_numeric, in the same order
+_NUMERIC_CLEANUP = (
+    (",", ""),
+    ("$", ""),
+    ("%", ""),
+    ("(", "-"),
+    (")", ""),
+)
+
+# Superset of what float() accepts; matches are confirmed with float()
+_NUMERIC_LINES_REGEX = re.compile(
+    r"\n([^\S\n]*[+-]?"
+    r"(?:(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:e[+-]?\d[\d_]*)?|inf(?:inity)?|nan)"
+    r"[^\S\n]*)(?=\n)",
+    re.IGNORECASE,
+)
+
+# DATE_PATTERNS as one alternation. Whitespace classes exclude "\n" so a match
+# can never span two values, and surrounding whitespace is allowed because
+# _is_date strips before matching.
+_DATE_LINES_REGEX = re.compile(
+    r"\n([^\S\n]*(?:"
+    + "|".join(p[1:-1].replace(r"\s", r"[^\S\n]") for p in DATE_PATTERNS)
+    + r")[^\S\n]*)(?=\n)",
+    re.IGNORECASE,
+)
+
+
+def _wrap_lines(values: List[str]) -> str:
+    """Join values for the line regexes: one value per line, newline-delimited."""
+    return "\n" + "\n".join(values) + "\n"
+
+
+def _non_empty(values: List[str]) -> List[str]:
+    """Values that are not blank (same rule as ``v and v.strip()``)."""
+    non_empty = list(filter(None, values))
+    # Whitespace-only values are rare; only rebuild the list if there are any
+    if any(map(str.isspace, non_empty)):
+        return [v for v in non_empty if not v.isspace()]
+    return non_empty
+
+
+def _single_line(values: List[str]) -> List[str]:
+    """Make values safe to join with newlines (no-op for the common case)."""
+    if "\n".join(values).count("\n") != len(values) - 1:
+        return [v.replace("\n", " ") for v in values]
+    return values
+
+
+def _matching_values(pattern: re.Pattern, values: List[str], lines: List[str]) -> List[str]:
+    """The ``values`` whose line (same position in ``lines``) a line regex matches."""
+    matched = set(pattern.findall(_wrap_lines(lines)))
+    if not matched:
+        return []
+    return [value for value, line in zip(values, lines) if line in matched]
+
+
+def _to_float_array(values: List[str]) -> np.ndarray:
+    """float64 array straight from strings; raises ValueError like float()."""
+    return np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+
+
+def _clean_numeric(lines: List[str]) -> List[str]:
+    """Apply the _parse_numeric cleanup to newline-free values in bulk."""
+    joined = "\n".join(lines)
+    for old, new in _NUMERIC_CLEANUP:
+        if old in joined:
+            joined = joined.replace(old, new)
+    return joined.split("\n")
+
+
+def _parse_numbers(values: List[str]) -> Dict[str, float]:
+    """{value: number} for the distinct ``values`` that _parse_numeric accepts."""
+    cleaned = _clean_numeric(_single_line(values))
+    candidates = set(_NUMERIC_LINES_REGEX.findall(_wrap_lines(cleaned)))
+    numbers = {}
+    if not candidates:
+        return numbers
+    for value, text in zip(values, cleaned):
+        if text in candidates:
+            try:
+                numbers[value] = float(text)
+            except ValueError:  # rare: e.g. misplaced underscores
+                pass
+    return numbers
+
+
+def numeric_array(values: List[str]) -> np.ndarray:
     """
-    Detect the predominant type of a column.
+    Parse values like ``_parse_numeric``, vectorized.
 
-    Returns: "numeric", "date", "categorical", "text", or "empty"
+    Returns:
+        float64 array aligned to ``values`` (NaN where a value isn't numeric)
     """
-    if not values:
-        return "empty"
+    numbers = _parse_numbers(list(set(values)))
+    return np.fromiter(
+        (numbers.get(v, np.nan) for v in values), dtype=np.float64, count=len(values)
+    )
+
 
-    # Filter out empty values
-    non_empty = [v for v in values if v and str(v).strip()]
+def _classify_column(
+    non_empty: List[str], unique_values: Optional[set] = None
+) -> Tuple[str, np.ndarray]:
+    """
+    Detect the predominant type of a column's non-empty values.
+
+    Args:
+        non_empty: Non-blank values in row order
+        unique_values: ``set(non_empty)``, if the caller already has it
 
+    Returns:
+        (column_type, numbers) — for numeric columns, one float per value in
+        row order (NaN where a value isn't numeric); empty otherwise
+    """
     if not non_empty:
-        return "empty"
+        return "empty", _EMPTY_NUMBERS
 
     total = len(non_empty)
-    numeric_count = 0
-    date_count = 0
-
-    for val in non_empty:
-        val_str = str(val)
-        if _is_numeric(val_str):
-            numeric_count += 1
-        elif _is_date(val_str):
-            date_count += 1
+    if unique_values is None:
+        unique_values = set(non_empty)
+
+    # Fast path: every value parses as a number in one bulk pass
+    # (skipped outright when the first value already isn't numeric)
+    if _parse_numeric(non_empty[0]) is not None:
+        cleaned = _clean_numeric(non_empty)
+        # A length mismatch means some value had an embedded newline
+        if len(cleaned) == total:
+            try:
+                return "numeric", _to_float_array(cleaned)
+            except ValueError:
+                pass
+
+    # Mixed or text column: classify each distinct value once, weighted by count
+    counts: Optional[Counter] = None
+
+    def occurrences(values) -> int:
+        nonlocal counts
+        if len(unique_values) == total or not values:
+            return len(values)
+        if counts is None:
+            counts = Counter(non_empty)
+        return sum(counts[v] for v in values)
+
+    distinct = list(unique_values)
+    numbers = _parse_numbers(distinct)
 
     # Require 80% threshold for numeric
-    if numeric_count / total >= 0.8:
-        return "numeric"
+    if occurrences(numbers) / total >= 0.8:
+        values = (numbers.get(v, np.nan) for v in non_empty)
+        return "numeric", np.fromiter(values, dtype=np.float64, count=total)
+
+    # Dates are only counted among non-numeric values
+    candidates = [v for v in distinct if v not in numbers] if numbers else distinct
+    dates = _matching_values(_DATE_LINES_REGEX, candidates, _single_line(candidates))
 
     # Require 50% threshold for date
-    if date_count / total >= 0.5:
-        return "date"
+    if occurrences(dates) / total >= 0.5:
+        return "date", _EMPTY_NUMBERS
 
     # Check for categorical (low cardinality text)
-    unique_values = set(non_empty)
-    unique_ratio = len(unique_values) / total
+    unique_count = len(unique_values)
+    unique_ratio = unique_count / total
 
     # If less than 30% unique values and fewer than 20 categories, it's categorical
-    if unique_ratio < 0.3 and len(unique_values) <= 20:
-        return "categorical"
+    if unique_ratio < 0.3 and unique_count <= 20:
+        return "categorical", _EMPTY_NUMBERS
 
-    return "text"
+    return "text", _EMPTY_NUMBERS
 
 
-# ---------------------------------------------------------------------------
-# Main Analyzer Function
-# ---------------------------------------------------------------------------
-
-def analyze_sheet(cells: Dict[str, str], sheet_name: str = "Sheet1") -> SheetMetadata:
+def _detect_column_type(values: List[str]) -> str:
     """
-    Analyze sheet structure and return comprehensive metadata.
+    Detect the predominant type of a column.
 
-    This should be called ONCE before the agent runs to provide
-    accurate context about the sheet structure.
+    Returns: "numeric", "date", "categorical", "text", or "empty"
+    """
+    if not values:
+        return "empty"
+    return _classify_column(_non_empty([str(v) for v in values]))[0]
 
-    Args:
-        cells: Dictionary mapping cell references (e.g., "A1") to values
-        sheet_name: Name of the sheet being analyzed
 
-    Returns:
-        SheetMetadata object with complete analysis
+def _analyze_column(
+    letter: str, header: str, data_values: List[str], total_count: int
+) -> ColumnMetadata:
     """
-    if not cells:
-        return SheetMetadata(
-            sheet_name=sheet_name,
-            total_rows=0,
-            data_rows=0,
-            last_row=0,
-            total_columns=0,
-        )
+    Build ColumnMetadata for one column.
 
-    # Parse cell references to extract structure
-    cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-    # Organize data by column
-    column_data: Dict[str, Dict[int, str]] = {}  # column_letter -> {row: value}
-    all_rows = set()
-    all_cols = set()
+    Args:
+        letter: Column letter
+        header: Header text
+        data_values: Populated values below the header, in row order
+        total_count: Number of data rows (gaps count as empty values)
+    """
+    non_empty_values = _non_empty(data_values)
+    unique_values = set(non_empty_values)
+    col_type, numbers = _classify_column(non_empty_values, unique_values)
+
+    col_meta = ColumnMetadata(
+        letter=letter,
+        header=str(header),
+        column_type=col_type,
+        unique_count=len(unique_values),
+        null_count=total_count - len(non_empty_values),
+        total_count=total_count,
+        samples=non_empty_values[:5],
+    )
 
-    for ref, value in cells.items():
-        match = cell_pattern.match(ref)
-        if not match:
-            continue
+    # Calculate numeric stats from array reductions
+    if col_type == "numeric":
+        parsed = numbers[~np.isnan(numbers)]
+        if parsed.size:
+            total = float(parsed.sum())
+            col_meta.min_value = float(parsed.min())
+            col_meta.max_value = float(parsed.max())
+            col_meta.avg_value = total / parsed.size
+            col_meta.sum_value = total
 
-        col_letter = match.group(1)
-        row_num = int(match.group(2))
+    # Store categories for categorical columns
+    if col_type == "categorical":
+        col_meta.categories = sorted(unique_values)[:20]
 
-        all_rows.add(row_num)
-        all_cols.add(col_letter)
+    return col_meta
 
-        if col_letter not in column_data:
-            column_data[col_letter] = {}
-        column_data[col_letter][row_num] = str(value) if value is not None else ""
 
-    if not all_rows or not all_cols:
-        return SheetMetadata(
-            sheet_name=sheet_name,
-            total_rows=0,
-            data_rows=0,
-            last_row=0,
-            total_columns=0,
-        )
+# ---------------------------------------------------------------------------
+# Main Analyzer Function
+# ---------------------------------------------------------------------------
 
-    # Sort columns alphabetically (A, B, C, ... AA, AB)
-    sorted_cols = sorted(all_cols, key=lambda c: (len(c), c))
-    min_row = min(all_rows)
-    max_row = max(all_rows)
-    total_rows = max_row - min_row + 1
-    data_rows = total_rows - 1  # Assuming row 1 is header
+def _empty_metadata(sheet_name: str) -> SheetMetadata:
+    return SheetMetadata(
+        sheet_name=sheet_name,
+        total_rows=0,
+        data_rows=0,
+        last_row=0,
+        total_columns=0,
+    )
 
-    # Analyze each column
-    columns: List[ColumnMetadata] = []
-    suggested_group_by: List[str] = []
-    suggested_aggregate: List[str] = []
-    suggested_date_column: Optional[str] = None
 
-    for col_letter in sorted_cols:
-        col_rows = column_data.get(col_letter, {})
+def _column_inputs(frame: SheetFrame) -> List[Tuple[str, str, List[str]]]:
+    """(letter, header, populated data values) for every column of a non-empty frame."""
+    min_row = frame.min_row
+    inputs = []
+    for col_letter in frame.columns:
+        col_rows = frame.column(col_letter)
 
         # Get header (row 1 or min_row)
         header = col_rows.get(min_row, col_rows.get(1, f"Column {col_letter}"))
+        inputs.append((col_letter, header, frame.column_values(col_letter, start_row=min_row + 1)))
+    return inputs
 
-        # Get data values (excluding header)
-        data_values = [
-            col_rows.get(r, "")
-            for r in range(min_row + 1, max_row + 1)
-            if r in col_rows or r <= max_row
-        ]
 
-        # Detect column type
-        col_type = _detect_column_type(data_values)
-
-        # Calculate statistics
-        non_empty_values = [v for v in data_values if v and str(v).strip()]
-        unique_values = list(set(non_empty_values))
-        null_count = len(data_values) - len(non_empty_values)
-
-        col_meta = ColumnMetadata(
-            letter=col_letter,
-            header=str(header),
-            column_type=col_type,
-            unique_count=len(unique_values),
-            null_count=null_count,
-            total_count=len(data_values),
-            samples=non_empty_values[:5],
-        )
+def _assemble_metadata(
+    sheet_name: str, frame: SheetFrame, columns: List[ColumnMetadata]
+) -> SheetMetadata:
+    """Combine per-column metadata into SheetMetadata with grouping/aggregate suggestions."""
+    total_rows = frame.max_row - frame.min_row + 1
+    suggested_group_by: List[str] = []
+    suggested_aggregate: List[str] = []
+    suggested_date_column: Optional[str] = None
 
-        # Calculate numeric stats
-        if col_type == "numeric":
-            numeric_vals = []
-            for v in non_empty_values:
-                parsed = _parse_numeric(v)
-                if parsed is not None:
-                    numeric_vals.append(parsed)
-
-            if numeric_vals:
-                col_meta.min_value = min(numeric_vals)
-                col_meta.max_value = max(numeric_vals)
-                col_meta.avg_value = sum(numeric_vals) / len(numeric_vals)
-                col_meta.sum_value = sum(numeric_vals)
-
-            # Numeric columns are good for aggregation
-            suggested_aggregate.append(col_letter)
-
-        # Store categories for categorical columns
-        if col_type == "categorical":
-            col_meta.categories = sorted(unique_values)[:20]
-            # Categorical columns are good for grouping
-            suggested_group_by.append(col_letter)
+    for col_meta in columns:
+        # Numeric columns are good for aggregation
+        if col_meta.column_type == "numeric":
+            suggested_aggregate.append(col_meta.letter)
 
-        # Track date columns
-        if col_type == "date" and not suggested_date_column:
-            suggested_date_column = col_letter
+        # Categorical columns are good for grouping
+        if col_meta.column_type == "categorical":
+            suggested_group_by.append(col_meta.letter)
 
-        columns.append(col_meta)
+        # Track date columns
+        if col_meta.column_type == "date" and not suggested_date_column:
+            suggested_date_column = col_meta.letter
 
     logger.info(
         f"Analyzed sheet '{sheet_name}': {total_rows} rows, {len(columns)} columns, "
@@ -372,8 +491,8 @@ def analyze_sheet(cells: Dict[str, str], sheet_name: str = "Sheet1") -> SheetMet
     return SheetMetadata(
         sheet_name=sheet_name,
         total_rows=total_rows,
-        data_rows=data_rows,
-        last_row=max_row,
+        data_rows=total_rows - 1,  # Assuming row 1 is header
+        last_row=frame.max_row,
         total_columns=len(columns),
         columns=columns,
         suggested_group_by=suggested_group_by,
@@ -382,6 +501,35 @@ def analyze_sheet(cells: Dict[str, str], sheet_name: str = "Sheet1") -> SheetMet
     )
 
 
+def analyze_sheet(cells: Dict[str, str], sheet_name: str = "Sheet1") -> SheetMetadata:
+    """
+    Analyze sheet structure and return comprehensive metadata.
+
+    This should be called ONCE before the agent runs to provide
+    accurate context about the sheet structure. Request handlers should
+    prefer ``metadata_cache.get_sheet_metadata()``, which reuses results
+    for unchanged sheets and columns.
+
+    Args:
+        cells: Dictionary mapping cell references (e.g., "A1") to values
+        sheet_name: Name of the sheet being analyzed
+
+    Returns:
+        SheetMetadata object with complete analysis
+    """
+    frame = get_frame(cells) if cells else None
+
+    if frame is None or frame.is_empty:
+        return _empty_metadata(sheet_name)
+
+    data_rows = frame.max_row - frame.min_row
+    columns = [
+        _analyze_column(letter, header, values, total_count=data_rows)
+        for letter, header, values in _column_inputs(frame)
+    ]
+    return _assemble_metadata(sheet_name, frame, columns)
+
+
 def format_metadata_for_prompt(metadata: SheetMetadata) -> str:
     """
     Format sheet metadata as a string for inclusion in the agent prompt.
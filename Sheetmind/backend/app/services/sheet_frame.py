@@ -0,0 +1,399 @@
+"""
+Columnar sheet representation shared by every consumer of ``sheet_data``.
+
+The frontend sends sheet contents as an A1-keyed dict (``{"A1": "Name", ...}``).
+Parsing those references used to happen separately in the analyzer, the prompt
+builder, RAG, PII scanning, quick actions, SmartExecutor and every LangChain
+reader tool. ``SheetFrame`` parses the dict once into column/row indexes, and
+``get_frame()`` memoizes the result so all consumers of the same request share it.
+Compact row- and column-major payloads are decoded by ``decode_sheet_data()``.
+"""
+
+import logging
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import repeat, zip_longest
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CELL_REF_PATTERN = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+def column_sort_key(letter: str) -> Tuple[int, str]:
+    """Sort key ordering column letters as A, B, ..., Z, AA, AB."""
+    return (len(letter), letter)
+
+
+def column_letter_to_index(letter: str) -> int:
+    """Convert a column letter to a 1-based index (A -> 1, AA -> 27)."""
+    index = 0
+    for ch in letter:
+        index = index * 26 + (ord(ch) - 64)
+    return index
+
+
+def column_index_to_letter(index: int) -> str:
+    """Convert a 1-based column index to its letter (1 -> A, 27 -> AA)."""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _to_str(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+class SheetFrame:
+    """
+    Parsed, columnar view of an A1-keyed cells dict.
+
+    Attributes:
+        cells: The original cells dict (kept for exact lookups)
+        columns: Column letters in sheet order (A, B, ..., AA)
+        col_index: Column letter -> 0-based position in ``columns``
+        column_data: Column letter -> {row_number: value}
+        rows: Row number -> {column_letter: value}
+        row_numbers: Sorted row numbers that contain at least one cell
+        headers: Column letter -> row 1 value, in column order
+        min_row / max_row: First and last populated rows (0 if empty)
+        derived: Memo for values computed from the frame (e.g. fingerprints)
+
+    All values are stored as strings (``None`` becomes ``""``).
+    """
+
+    __slots__ = (
+        "cells", "columns", "col_index", "column_data", "rows",
+        "row_numbers", "headers", "min_row", "max_row", "derived", "_sorted_columns",
+    )
+
+    def __init__(self, cells: Dict[str, Any]):
+        column_data: Dict[str, Dict[int, str]] = {}
+        rows: Dict[int, Dict[str, str]] = {}
+
+        match = CELL_REF_PATTERN.match
+        for ref, value in cells.items():
+            m = match(ref)
+            if m is None:
+                continue
+            col, row = m.groups()
+            row = int(row)
+            val = value if value.__class__ is str else _to_str(value)
+
+            try:
+                column_data[col][row] = val
+            except KeyError:
+                column_data[col] = {row: val}
+            try:
+                rows[row][col] = val
+            except KeyError:
+                rows[row] = {col: val}
+
+        self._index(cells, column_data, rows)
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: Dict[str, Sequence[Any]],
+        first_row: int = 1,
+        max_cells: Optional[int] = None,
+    ) -> "SheetFrame":
+        """
+        Build a frame from column-major values without parsing A1 references.
+
+        Args:
+            columns: Column letter -> values from ``first_row`` down
+                (``None`` marks an absent cell)
+            first_row: Sheet row of each list's first value
+            max_cells: Stop with a ValueError as soon as there are more cells
+
+        The equivalent A1-keyed dict is built as ``cells`` for consumers that
+        still read the legacy format.
+        """
+        return cls._from_column_items(columns.items(), first_row, max_cells)
+
+    @classmethod
+    def _from_column_items(
+        cls,
+        columns: Iterable[Tuple[str, Sequence[Any]]],
+        first_row: int,
+        max_cells: Optional[int],
+    ) -> "SheetFrame":
+        frame = cls.__new__(cls)
+        cells: Dict[str, str] = {}
+        column_data: Dict[str, Dict[int, str]] = {}
+        rows: Dict[int, Dict[str, str]] = {}
+
+        for col, values in columns:
+            col_cells: Dict[int, str] = {}
+            for row, value in enumerate(values, first_row):
+                if value is None:
+                    continue
+                val = value if value.__class__ is str else str(value)
+                col_cells[row] = val
+                cells[f"{col}{row}"] = val
+                try:
+                    rows[row][col] = val
+                except KeyError:
+                    rows[row] = {col: val}
+            if col_cells:
+                column_data[col] = col_cells
+            if max_cells is not None and len(cells) > max_cells:
+                raise ValueError(f"Sheet data too large ({len(cells)}+ cells). Maximum is {max_cells}.")
+
+        frame._index(cells, column_data, rows)
+        return frame
+
+    @classmethod
+    def from_grid(
+        cls,
+        rows: List[List[Any]],
+        origin: str = "A1",
+        headers: Optional[List[Any]] = None,
+        max_cells: Optional[int] = None,
+    ) -> "SheetFrame":
+        """
+        Build a frame from row-major values anchored at ``origin``.
+
+        Args:
+            rows: Data rows (``None`` marks an absent cell)
+            origin: A1 reference of the top-left value
+            headers: Optional header row placed at ``origin`` above ``rows``
+            max_cells: Stop with a ValueError as soon as there are more cells
+        """
+        m = CELL_REF_PATTERN.match(origin.upper())
+        if m is None:
+            raise ValueError(f"Invalid origin cell reference: {origin!r}")
+        first_col = column_letter_to_index(m.group(1))
+        first_row = int(m.group(2))
+
+        grid = [headers, *rows] if headers is not None else rows
+        # Transpose lazily, one column at a time, padding short rows with
+        # None (absent cells), so an oversized grid stops at max_cells
+        columns = (
+            (column_index_to_letter(first_col + i), values)
+            for i, values in enumerate(zip_longest(*grid))
+        )
+        return cls._from_column_items(columns, first_row, max_cells)
+
+    def _index(
+        self,
+        cells: Dict[str, Any],
+        column_data: Dict[str, Dict[int, str]],
+        rows: Dict[int, Dict[str, str]],
+    ) -> None:
+        self.cells = cells
+        self.columns: List[str] = sorted(column_data, key=column_sort_key)
+        self.col_index: Dict[str, int] = {c: i for i, c in enumerate(self.columns)}
+        self.column_data = column_data
+        self.rows = rows
+        self.row_numbers: List[int] = sorted(rows)
+        self.min_row = self.row_numbers[0] if self.row_numbers else 0
+        self.max_row = self.row_numbers[-1] if self.row_numbers else 0
+        header_cells = rows.get(1, {})
+        self.headers: Dict[str, str] = {
+            c: header_cells[c] for c in self.columns if c in header_cells
+        }
+        self.derived: Dict[str, Any] = {}
+        # col -> (sorted row numbers, values in the same order), built on first use
+        self._sorted_columns: Dict[str, Tuple[List[int], List[str]]] = {}
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.row_numbers
+
+    @property
+    def row_count(self) -> int:
+        """Number of distinct populated rows (including the header row)."""
+        return len(self.row_numbers)
+
+    def get(self, col: str, row: int, default: str = "") -> str:
+        """Value at ``col``/``row`` or ``default`` if the cell is absent."""
+        return self.column_data.get(col, {}).get(row, default)
+
+    def column(self, col: str) -> Dict[int, str]:
+        """All populated cells in a column as {row_number: value}."""
+        return self.column_data.get(col, {})
+
+    def _sorted_column(self, col: str) -> Tuple[List[int], List[str]]:
+        cached = self._sorted_columns.get(col)
+        if cached is None:
+            col_cells = self.column_data.get(col, {})
+            rows = list(col_cells)
+            # Cells usually arrive row-major, so columns are already in order
+            if rows == sorted(rows):
+                cached = (rows, list(col_cells.values()))
+            else:
+                items = sorted(col_cells.items())
+                cached = ([r for r, _ in items], [v for _, v in items])
+            self._sorted_columns[col] = cached
+        return cached
+
+    def column_items(
+        self, col: str, start_row: int = 2, limit: Optional[int] = None
+    ) -> List[Tuple[int, str]]:
+        """Populated (row, value) pairs for ``col`` from ``start_row`` on, sorted by row."""
+        rows, values = self._sorted_column(col)
+        start = bisect_left(rows, start_row)
+        end = len(rows) if limit is None else min(len(rows), start + limit)
+        return list(zip(rows[start:end], values[start:end]))
+
+    def column_values(self, col: str, start_row: int = 2) -> List[str]:
+        """Populated values for ``col`` from ``start_row`` on, in row order."""
+        rows, values = self._sorted_column(col)
+        return values[bisect_left(rows, start_row):]
+
+    def dense_column(self, col: str, start_row: int, end_row: int) -> List[str]:
+        """Values for rows ``start_row..end_row`` inclusive, with ``""`` for gaps."""
+        col_cells = self.column_data.get(col, {})
+        return [col_cells.get(r, "") for r in range(start_row, end_row + 1)]
+
+    def aligned_column(self, col: str, rows: Sequence[int]) -> List[str]:
+        """Values for exactly ``rows`` (in that order), with ``""`` for gaps."""
+        return list(map(self.column_data.get(col, {}).get, rows, repeat("")))
+
+    def row(self, row: int) -> Dict[str, str]:
+        """All populated cells in a row as {column_letter: value}."""
+        return self.rows.get(row, {})
+
+    def data_row_numbers(self, header_row: int = 1) -> List[int]:
+        """Sorted populated row numbers below ``header_row``."""
+        return self.row_numbers[bisect_right(self.row_numbers, header_row):]
+
+    def data_row_count(self, header_row: int = 1) -> int:
+        """Number of populated rows below ``header_row``."""
+        return len(self.row_numbers) - bisect_right(self.row_numbers, header_row)
+
+
+# ---------------------------------------------------------------------------
+# Per-request memoization
+# ---------------------------------------------------------------------------
+# A request's cells dict is passed by reference through the chat route, the
+# agent, SmartExecutor, RAG and the tools, often across pool threads, so the
+# frame is memoized by dict identity. Entries hold a strong reference to the
+# dict so an id() can't be recycled while its entry is alive, and a hit also
+# requires ``entry[0] is cells``. Identity says nothing about content, so a
+# cells dict must not be modified once it has been passed to get_frame().
+
+_FRAME_CACHE_SIZE = 8
+_frame_cache: "OrderedDict[int, Tuple[Dict, int, SheetFrame]]" = OrderedDict()
+_frame_lock = threading.Lock()
+
+
+def get_frame(cells: Optional[Dict[str, Any]]) -> SheetFrame:
+    """
+    Return the SheetFrame for ``cells``, parsing it only on first use.
+
+    The memo is keyed on the dict's identity, so callers must treat ``cells``
+    as immutable: editing a value in place (same cell count) would return the
+    stale frame and fingerprint. Build a new dict instead (as
+    ``sheet_snapshots.apply_patch`` does).
+
+    Args:
+        cells: A1-keyed cells dict (``None`` is treated as empty)
+
+    Returns:
+        Shared SheetFrame for this dict
+    """
+    if not cells:
+        return SheetFrame({})
+
+    key = id(cells)
+    with _frame_lock:
+        entry = _frame_cache.get(key)
+        # Size check is a cheap tripwire for mutation; callers must not mutate
+        if entry is not None and entry[0] is cells and entry[1] == len(cells):
+            _frame_cache.move_to_end(key)
+            return entry[2]
+
+    frame = SheetFrame(cells)
+    _remember(cells, frame)
+    return frame
+
+
+def _remember(cells: Dict[str, Any], frame: SheetFrame) -> None:
+    with _frame_lock:
+        key = id(cells)
+        _frame_cache[key] = (cells, len(cells), frame)
+        _frame_cache.move_to_end(key)
+        while len(_frame_cache) > _FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+
+
+# ---------------------------------------------------------------------------
+# Compact wire formats
+# ---------------------------------------------------------------------------
+# Besides the legacy {"cells": {"A1": ...}} payload, sheet_data may be sent as
+#   {"format": "rows", "origin": "A1", "headers": [...], "rows": [[...], ...]}
+#   {"format": "columns", "origin": "A1", "columns": {"A": [...], "B": [...]}}
+# which don't repeat a cell reference per value. Both are built straight into
+# a SheetFrame; the A1 dict is derived from it for legacy consumers. The
+# explicit "format" keeps the older {"headers": [...], "rows": [...]} payload
+# (read by ai_provider._build_context_message) out of this path.
+
+COMPACT_FORMATS = ("rows", "columns")
+_COMPACT_KEYS = ("format", "origin", "headers", "rows", "columns")
+_COLUMN_LETTERS = re.compile(r"^[A-Z]+$")
+
+
+def is_compact_sheet_data(sheet_data: Dict[str, Any]) -> bool:
+    return "cells" not in sheet_data and sheet_data.get("format") in COMPACT_FORMATS
+
+
+def decode_sheet_data(sheet_data: Dict[str, Any], max_cells: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Normalize a compact ``sheet_data`` payload to the legacy ``cells`` form.
+
+    The frame built from the compact payload is registered for the derived
+    cells dict, so ``get_frame()`` never has to parse its references.
+    Other payloads are returned unchanged.
+
+    Args:
+        sheet_data: Request payload
+        max_cells: Reject the payload as soon as decoding passes this many cells
+
+    Raises:
+        ValueError: Malformed or oversized compact payload
+    """
+    if not is_compact_sheet_data(sheet_data):
+        return sheet_data
+
+    origin = sheet_data.get("origin") or "A1"
+    if not isinstance(origin, str):
+        raise ValueError("sheet_data.origin must be an A1 cell reference")
+
+    if sheet_data["format"] == "rows":
+        rows = sheet_data.get("rows")
+        headers = sheet_data.get("headers")
+        if not isinstance(rows, list) or not all(isinstance(r, list) for r in rows):
+            raise ValueError("sheet_data.rows must be a list of lists")
+        if headers is not None and not isinstance(headers, list):
+            raise ValueError("sheet_data.headers must be a list")
+        frame = SheetFrame.from_grid(rows, origin=origin, headers=headers, max_cells=max_cells)
+    else:
+        columns = sheet_data.get("columns")
+        if not isinstance(columns, dict) or not all(
+            isinstance(k, str) and _COLUMN_LETTERS.match(k) and isinstance(v, list)
+            for k, v in columns.items()
+        ):
+            raise ValueError("sheet_data.columns must map column letters to lists")
+        m = CELL_REF_PATTERN.match(origin.upper())
+        if m is None:
+            raise ValueError(f"Invalid origin cell reference: {origin!r}")
+        frame = SheetFrame.from_columns(columns, first_row=int(m.group(2)), max_cells=max_cells)
+
+    _remember(frame.cells, frame)
+    decoded = {k: v for k, v in sheet_data.items() if k not in _COMPACT_KEYS}
+    decoded["cells"] = frame.cells
+    return decoded
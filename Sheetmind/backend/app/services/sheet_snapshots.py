@@ -0,0 +1,172 @@
+"""
+Sheet snapshots for delta uploads.
+
+After each /chat/query that sends ``spreadsheet_id`` or ``base_fingerprint``
+(clients opting in to delta uploads) the server keeps the sheet's cells per
+(user, spreadsheet, sheet), tagged with the sheet fingerprint root, and
+returns that root to the client as ``sheet_fingerprint``. On the next turn the client can send
+``base_fingerprint`` plus a ``sheet_patch`` of changed cells (``null`` clears
+a cell) instead of re-uploading the whole sheet.
+
+Two tiers: an in-process LRU, then Redis (shared across workers, 1 hour TTL).
+Redis keeps the root under its own key, so re-saving an unchanged sheet
+costs one small GET instead of fetching and decoding the whole snapshot.
+If the base snapshot is missing or doesn't match, the caller gets a
+SnapshotMismatch and the client must resend the full sheet.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.serialization import dumps, loads
+from app.services.fingerprint import get_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = 3600  # 1 hour in seconds
+_LOCAL_SNAPSHOTS = 32
+
+# (user_id, spreadsheet_id, sheet_name) -> (fingerprint root, cells)
+_snapshots: "OrderedDict[Tuple[str, str, str], Tuple[str, Dict[str, Any]]]" = OrderedDict()
+_snapshot_lock = threading.Lock()
+
+
+class SnapshotMismatch(Exception):
+    """The client's base_fingerprint has no matching snapshot on the server."""
+
+
+def _snapshot_key(user_id: str, spreadsheet_id: Optional[str], sheet_name: str) -> Tuple[str, str, str]:
+    # Two workbooks can both have a "Sheet1"
+    return (user_id, spreadsheet_id or "default", sheet_name)
+
+
+def _redis_key(key: Tuple[str, str, str]) -> str:
+    return "snapshot:" + ":".join(key)
+
+
+def _redis():
+    try:
+        from app.services.cache import _get_redis
+        return _get_redis()
+    except Exception:
+        return None
+
+
+def _remember(key: Tuple[str, str, str], root: str, cells: Dict[str, Any]) -> None:
+    with _snapshot_lock:
+        _snapshots[key] = (root, cells)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > _LOCAL_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+
+
+def _load(key: Tuple[str, str, str]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    with _snapshot_lock:
+        entry = _snapshots.get(key)
+    if entry is not None:
+        return entry
+
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        raw = r.get(_redis_key(key))
+        if raw:
+            data = loads(raw)
+            entry = (data["fingerprint"], data["cells"])
+            _remember(key, *entry)
+            return entry
+    except Exception as e:
+        logger.warning(f"Snapshot load failed: {e}")
+    return None
+
+
+def _stored_root(key: Tuple[str, str, str]) -> Optional[str]:
+    """Fingerprint root of the stored snapshot, without loading its cells."""
+    with _snapshot_lock:
+        entry = _snapshots.get(key)
+    if entry is not None:
+        return entry[0]
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        root = r.get(_redis_key(key) + ":root")
+        return root.decode() if isinstance(root, bytes) else root
+    except Exception as e:
+        logger.warning(f"Snapshot root lookup failed: {e}")
+        return None
+
+
+def save_snapshot(
+    user_id: str,
+    sheet_name: str,
+    cells: Dict[str, Any],
+    spreadsheet_id: Optional[str] = None,
+) -> str:
+    """
+    Store ``cells`` as the base for the next delta upload.
+
+    Returns:
+        The fingerprint root to hand back to the client
+    """
+    key = _snapshot_key(user_id, spreadsheet_id, sheet_name)
+    root = get_fingerprint(cells).root
+    stored = _stored_root(key)
+    _remember(key, root, cells)
+    if stored == root:
+        return root
+
+    r = _redis()
+    if r is not None:
+        try:
+            payload = dumps({"fingerprint": root, "cells": cells})
+            pipe = r.pipeline(transaction=False)
+            pipe.setex(_redis_key(key), SNAPSHOT_TTL, payload)
+            pipe.setex(_redis_key(key) + ":root", SNAPSHOT_TTL, root)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Snapshot save failed: {e}")
+    return root
+
+
+def apply_patch(
+    user_id: str,
+    sheet_name: str,
+    base_fingerprint: str,
+    patch: Optional[Dict[str, Any]],
+    spreadsheet_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Rebuild the full cells dict from the stored snapshot and a cell patch.
+
+    Args:
+        user_id: Owner of the snapshot
+        sheet_name: Sheet the snapshot belongs to
+        base_fingerprint: Fingerprint the client's patch was computed against
+        patch: {cell_ref: value}; ``None`` values remove the cell
+        spreadsheet_id: Workbook the sheet belongs to
+
+    Returns:
+        New cells dict (the stored snapshot is not modified)
+
+    Raises:
+        SnapshotMismatch: No snapshot, or it doesn't match ``base_fingerprint``
+    """
+    entry = _load(_snapshot_key(user_id, spreadsheet_id, sheet_name))
+    if entry is None or entry[0] != base_fingerprint:
+        raise SnapshotMismatch(
+            f"No snapshot {base_fingerprint[:12]} for sheet '{sheet_name}'"
+        )
+
+    # Always a new dict: get_frame() memoizes by identity, so the stored
+    # snapshot (and any frame built from it) must never be edited in place
+    cells = dict(entry[1])
+    for ref, value in (patch or {}).items():
+        if value is None:
+            cells.pop(ref, None)
+        else:
+            cells[ref] = value
+    return cells
@@ -15,6 +15,14 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
+from app.core.serialization import dumps, loads
+from app.services.fingerprint import get_fingerprint
+from app.services.group_by import group_rows
+from app.services.sheet_analyzer import numeric_array
+from app.services.sheet_frame import get_frame
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,15 +33,18 @@ logger = logging.getLogger(__name__)
 _CLASSIFIER_CACHE_TTL = 1800  # 30 minutes
 
 
-def _classifier_cache_key(request: str, headers: List[str], col_types: List[str]) -> str:
-    """Build a cache key from the request and sheet structure.
+def _classifier_cache_key(
+    request: str, headers: List[str], col_types: List[str], sheet_hash: str = ""
+) -> str:
+    """Build a cache key from the request, sheet structure and sheet fingerprint.
 
     Numbers are preserved (not normalized) because they carry semantic meaning
-    (e.g., "top 5" vs "top 10").
+    (e.g., "top 5" vs "top 10"). The fingerprint is included because the
+    classifier sees a data sample and may answer simple questions from it.
     """
     normalized = request.lower().strip()
     # Sort headers/types for stability
-    key_data = f"{normalized}|{'|'.join(sorted(headers))}|{'|'.join(sorted(col_types))}"
+    key_data = f"{normalized}|{'|'.join(sorted(headers))}|{'|'.join(sorted(col_types))}|{sheet_hash}"
     return f"classifier:{hashlib.sha256(key_data.encode()).hexdigest()[:24]}"
 
 
@@ -47,7 +58,7 @@ def _get_cached_classification(cache_key: str) -> Optional[Dict]:
         data = r.get(cache_key)
         if data:
             logger.info(f"Classifier cache HIT: {cache_key[:20]}...")
-            return json.loads(data)
+            return loads(data)
     except Exception:
         pass
     return None
@@ -60,7 +71,7 @@ def _set_cached_classification(cache_key: str, result: Dict):
         r = _get_redis()
         if r is None:
             return
-        r.setex(cache_key, _CLASSIFIER_CACHE_TTL, json.dumps(result))
+        r.setex(cache_key, _CLASSIFIER_CACHE_TTL, dumps(result))
         logger.info(f"Classifier cache SET: {cache_key[:20]}...")
     except Exception:
         pass
@@ -344,42 +355,26 @@ def template_find_duplicates(
     Returns:
         (actions, response_text, chart_data) where chart_data is (labels, values, header) or None
     """
-    import re as _re
-
-    cell_pattern = _re.compile(r"^([A-Z]+)(\d+)$")
+    frame = get_frame(cells)
 
-    # Build column_letter -> {value -> [row_numbers]} map
+    # Group each column's values; values appearing 2+ times are duplicates
     col_letters = {letter for letter, _ in columns_info}
-    col_duplicates = {}  # col_letter -> {value: [rows]}
-
-    for ref, val in cells.items():
-        m = cell_pattern.match(ref)
-        if not m:
-            continue
-        col = m.group(1)
-        row = int(m.group(2))
-        if row < 2 or col not in col_letters:
-            continue  # skip header row and irrelevant columns
-        str_val = str(val).strip()
-        if not str_val:
-            continue
-        if col not in col_duplicates:
-            col_duplicates[col] = {}
-        if str_val not in col_duplicates[col]:
-            col_duplicates[col][str_val] = []
-        col_duplicates[col][str_val].append(row)
-
-    # Filter to values appearing 2+ times
     col_header_map = {letter: header for letter, header in columns_info}
     duplicate_entries = []  # [(value, column_header, count, rows_list)]
     highlight_rows = set()
 
-    for col_letter in sorted(col_duplicates.keys()):
-        for value, rows in col_duplicates[col_letter].items():
-            if len(rows) >= 2:
-                header = col_header_map.get(col_letter, col_letter)
-                duplicate_entries.append((value, header, len(rows), sorted(rows)))
-                highlight_rows.update(rows)
+    for col_letter in sorted(col_letters):
+        items = frame.column_items(col_letter, start_row=2)  # skip header row
+        if not items:
+            continue
+        rows = np.array([row for row, _ in items])
+        groups = group_rows([val for _, val in items])
+        header = col_header_map.get(col_letter, col_letter)
+        for value, size, members in zip(groups.keys, groups.sizes.tolist(), groups.members()):
+            if size >= 2:
+                dupe_rows = rows[members].tolist()
+                duplicate_entries.append((value, header, size, dupe_rows))
+                highlight_rows.update(dupe_rows)
 
     if not duplicate_entries:
         return [], "No duplicate values found in the selected columns.", None
@@ -543,7 +538,8 @@ class SmartExecutor:
         # --- Phase 1B: Check classifier cache ---
         headers = [c.get("header", "") for c in sheet_metadata.get("columns", [])]
         col_types = [c.get("type", "") for c in sheet_metadata.get("columns", [])]
-        cache_key = _classifier_cache_key(user_request, headers, col_types)
+        sheet_hash = get_fingerprint(cells).short() if cells else ""
+        cache_key = _classifier_cache_key(user_request, headers, col_types, sheet_hash)
 
         cached = _get_cached_classification(cache_key)
         if cached:
@@ -769,25 +765,13 @@ class SmartExecutor:
         if not cells:
             return "No cell data available."
 
-        cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-        # Collect all columns and rows
-        col_rows: Dict[str, Dict[int, str]] = {}  # col_letter -> {row -> value}
-        for ref, val in cells.items():
-            m = cell_pattern.match(ref)
-            if not m:
-                continue
-            col = m.group(1)
-            row = int(m.group(2))
-            if col not in col_rows:
-                col_rows[col] = {}
-            col_rows[col][row] = str(val)
-
-        if not col_rows:
+        frame = get_frame(cells)
+        if frame.is_empty:
             return "No cell data available."
 
         # Sort columns alphabetically
-        sorted_cols = sorted(col_rows.keys())
+        sorted_cols = sorted(frame.columns)
+        col_rows = frame.column_data  # col_letter -> {row -> value}
 
         # Build header row (row 1) and first 5 data rows (rows 2-6)
         rows_to_show = [1, 2, 3, 4, 5, 6]
@@ -1142,70 +1126,32 @@ class SmartExecutor:
         if not cells:
             return None
 
-        cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
-
-        # Parse group and value columns from cells
-        group_values = {}  # row -> group_value
-        value_values = {}  # row -> numeric_value
-        for ref, val in cells.items():
-            m = cell_pattern.match(ref)
-            if not m:
-                continue
-            col = m.group(1)
-            row = int(m.group(2))
-            if row < 2:
-                continue
-            if col == group_col:
-                group_values[row] = str(val).strip()
-            elif col == value_col:
-                try:
-                    value_values[row] = float(str(val).replace(",", "").replace("$", "").replace("%", ""))
-                except (ValueError, TypeError):
-                    pass
-
-        if not group_values:
+        frame = get_frame(cells)
+        rows = frame.data_row_numbers()
+        groups = group_rows(frame.aligned_column(group_col, rows))
+        if not len(groups):
             return None
 
-        # Aggregate by group
-        aggregated = {}  # group -> [values]
-        for row, group in group_values.items():
-            if not group:
-                continue
-            if group not in aggregated:
-                aggregated[group] = []
-            if row in value_values:
-                aggregated[group].append(value_values[row])
-
-        if not aggregated:
+        if aggregation not in ("sum", "avg", "count", "min", "max"):
+            aggregation = "sum"
+        if aggregation == "count":
+            values = None
+        elif value_col == group_col:
             return None
+        else:
+            values = numeric_array(frame.aligned_column(value_col, rows))
 
-        # Compute aggregation
-        results = {}
-        for group, vals in aggregated.items():
-            if not vals:
-                if aggregation == "count":
-                    results[group] = len([r for r, g in group_values.items() if g == group])
-                continue
-            if aggregation == "sum":
-                results[group] = sum(vals)
-            elif aggregation == "count":
-                results[group] = len([r for r, g in group_values.items() if g == group])
-            elif aggregation == "avg":
-                results[group] = sum(vals) / len(vals)
-            elif aggregation == "max":
-                results[group] = max(vals)
-            elif aggregation == "min":
-                results[group] = min(vals)
-            else:
-                results[group] = sum(vals)
-
+        results = groups.to_dict(aggregation, values)
         if not results:
             return None
 
         # Sort by value descending
         sorted_items = sorted(results.items(), key=lambda x: x[1], reverse=True)
         labels = [item[0] for item in sorted_items]
-        values = [round(item[1], 2) for item in sorted_items]
+        if aggregation == "count":
+            values = [int(item[1]) for item in sorted_items]
+        else:
+            values = [round(item[1], 2) for item in sorted_items]
 
         return self._build_inline_chart(labels, values, value_header, chart_type)
 
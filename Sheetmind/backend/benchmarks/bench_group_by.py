@@ -0,0 +1,85 @@
+"""
+Benchmark: group-by kernel vs the previous per-group inline chart aggregation.
+
+Run from the backend directory:
+    python -m benchmarks.bench_group_by [--rows 50000] [--groups 500]
+
+"previous" is the algorithm _build_inline_chart_from_cells used before the
+kernel (row dicts, then a rescan of every row per group for ``count``).
+"kernel" times app.services.group_by on the same aligned columns, and
+"inline chart" the full SmartExecutor path on a shared frame.
+"""
+
+import argparse
+import random
+from typing import Dict, List
+
+from app.services.group_by import group_rows
+from app.services.sheet_analyzer import numeric_array
+from app.services.sheet_frame import SheetFrame
+from app.services.smart_executor import SmartExecutor
+from benchmarks.bench_sheet_analyzer import best_ms
+
+
+def previous_aggregate(frame: SheetFrame, group_col: str, value_col: str, aggregation: str) -> Dict:
+    """Reference implementation (pre-kernel _build_inline_chart_from_cells)."""
+    group_values = {row: val.strip() for row, val in frame.column(group_col).items() if row >= 2}
+    value_values = {}
+    for row, val in frame.column(value_col).items():
+        if row < 2:
+            continue
+        try:
+            value_values[row] = float(val.replace(",", "").replace("$", "").replace("%", ""))
+        except (ValueError, TypeError):
+            pass
+    aggregated: Dict[str, List[float]] = {}
+    for row, group in group_values.items():
+        if group:
+            aggregated.setdefault(group, [])
+            if row in value_values:
+                aggregated[group].append(value_values[row])
+    results = {}
+    for group, vals in aggregated.items():
+        if aggregation == "count":
+            results[group] = len([r for r, g in group_values.items() if g == group])
+        elif vals:
+            results[group] = sum(vals)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--groups", type=int, default=500)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    frame = SheetFrame.from_columns({
+        "A": ["Category"] + [f"Cat {rnd.randrange(args.groups)}" for _ in range(args.rows)],
+        "B": ["Region"] + [rnd.choice(["North", "South", "East", "West"]) for _ in range(args.rows)],
+        "C": ["Amount"] + [f"{rnd.uniform(1, 9999):,.2f}" for _ in range(args.rows)],
+    })
+    cells = frame.cells
+    rows = frame.data_row_numbers()
+    categories = frame.aligned_column("A", rows)
+    regions = frame.aligned_column("B", rows)
+    amounts = numeric_array(frame.aligned_column("C", rows))
+    executor = SmartExecutor.__new__(SmartExecutor)
+
+    print(f"{args.rows:,} rows, {args.groups} groups")
+    cases = [
+        ("previous sum", lambda: previous_aggregate(frame, "A", "C", "sum"), 3),
+        ("previous count", lambda: previous_aggregate(frame, "A", "C", "count"), 1),
+        ("kernel sum", lambda: group_rows(categories).aggregate("sum", amounts), 10),
+        ("kernel count", lambda: group_rows(categories).aggregate("count"), 10),
+        ("kernel min+max+avg", lambda: [group_rows(categories).aggregate(a, amounts) for a in ("min", "max", "avg")], 10),
+        ("kernel distinct", lambda: group_rows(categories).aggregate("distinct", regions), 10),
+        ("kernel 2-key sum", lambda: group_rows(categories, regions).aggregate("sum", amounts), 10),
+        ("inline chart (count)", lambda: executor._build_inline_chart_from_cells(cells, "A", "C", "Amount", "count"), 10),
+    ]
+    for name, fn, repeat in cases:
+        print(f"{name:<22} {best_ms(fn, repeat=repeat):>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: stdlib JSON path vs the fast serializer (app.core.serialization).
+
+Run from the backend directory:
+    python -m benchmarks.bench_json
+
+Measures the three places JSON cost shows up per /chat/query:
+- response encode: FastAPI's default (jsonable_encoder + JSONResponse) vs
+  returning FastJSONResponse directly, on a representative agent response
+  (steps, reasoning steps, sheet metadata, chart config)
+- request decode: json.loads vs loads on a 50k-cell sheet_data body
+- cache round trip: Redis-style dumps/loads of the cached chat response
+"""
+
+import json
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import serialization
+from app.core.serialization import FastJSONResponse
+from app.services.sheet_analyzer import analyze_sheet
+from benchmarks.bench_sheet_analyzer import best_ms, make_sheet
+
+
+def make_chat_response(cells) -> dict:
+    """A ChatResponse-shaped dict like an action-mode agent reply."""
+    metadata = analyze_sheet(cells, "Sales").to_dict()
+    steps = [
+        {
+            "step": i + 1,
+            "description": f"Write SUMIF for group {i}",
+            "action": {"action": "setFormula", "sheet": "Summary", "cell": f"B{i + 2}",
+                       "formula": f"=SUMIF(Sales!C:C,A{i + 2},Sales!E:E)"},
+            "formula": f"=SUMIF(Sales!C:C,A{i + 2},Sales!E:E)",
+            "about": "Sum of amount per region",
+        }
+        for i in range(25)
+    ]
+    reasoning = [
+        {"step": i + 1, "thought": "Look at the region column " * 4, "tool": "get_column_stats",
+         "tool_input": '{"column": "C"}', "result": "uniqueCount: 4, values: North, South, East, West"}
+        for i in range(8)
+    ]
+    chart = {
+        "type": "bar",
+        "title": "Amount by Region",
+        "labels": [f"Label {i}" for i in range(200)],
+        "datasets": [{"label": "Amount", "data": [i * 1.5 for i in range(200)]}],
+    }
+    return {
+        "conversation_id": str(uuid.uuid4()),
+        "message_id": str(uuid.uuid4()),
+        "content": "Here is a summary of amount by region. " * 40,
+        "sources": [{"label": f"Rows 2-{n}", "sheet": "Sales", "range": f"A2:J{n}"} for n in range(10, 30)],
+        "chart_config": chart,
+        "steps": steps,
+        "reasoning_steps": reasoning,
+        "sheet_metadata": metadata,
+        "agent_timing": {"analysis_ms": 12, "llm_ms": 2300, "tools_ms": 41},
+        "quick_actions": None,
+        "used_rag": True,
+    }
+
+
+def main() -> None:
+    cells = make_sheet(4999, "mixed")
+    response = make_chat_response(cells)
+    request_body = json.dumps({"message": "sum of amount by region", "sheet_data": {"cells": cells}}).encode()
+
+    rows = [
+        ("response encode", lambda: JSONResponse(jsonable_encoder(response)),
+         lambda: FastJSONResponse(response)),
+        ("request decode (50k cells)", lambda: json.loads(request_body),
+         lambda: serialization.loads(request_body)),
+        ("cache round trip", lambda: json.loads(json.dumps(response, default=str)),
+         lambda: serialization.loads(serialization.dumps(response, default=str))),
+    ]
+
+    backend = "orjson" if serialization.orjson is not None else "stdlib (orjson not installed)"
+    print(f"fast backend: {backend}")
+    print(f"{'case':<28} {'stdlib':>9} {'fast':>9} {'speedup':>8}")
+    for name, slow, fast in rows:
+        slow_ms = best_ms(slow, repeat=15)
+        fast_ms = best_ms(fast, repeat=15)
+        print(f"{name:<28} {slow_ms:>7.2f}ms {fast_ms:>7.2f}ms {slow_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: the full RAG path offline, on local hashing embeddings.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rag [--rows 5000] [--chunk-rows 1]
+
+Times embedding throughput, a cold index into a temporary Chroma
+directory, an incremental re-index after a one-cell edit, and keyword
+(lexical) and paraphrase (hybrid) searches. ``--chunk-rows N`` packs N rows
+into each vector document (RAG_CHUNK_ROWS). No API keys or network needed.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.services import rag_system
+from app.services.local_embeddings import HashingEmbeddings
+from benchmarks.bench_sheet_analyzer import best_ms, make_sheet
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-rows", type=int, default=1)
+    args = parser.parse_args()
+
+    settings.RAG_EMBEDDING_PROVIDER = "local"
+    settings.RAG_CHUNK_ROWS = args.chunk_rows
+    cells = make_sheet(args.rows, "mixed")
+    embeddings = HashingEmbeddings(settings.RAG_LOCAL_EMBEDDING_DIMS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag_system.CHROMA_DIR = Path(tmp)
+        rag = rag_system.SheetRAG()
+        texts = [doc.page_content for doc in rag._cells_to_documents(cells, "Bench")]
+        vector_texts = [doc.page_content for doc in rag._vector_documents(cells, "Bench")]
+
+        embed_ms = best_ms(lambda: embeddings.embed_documents(vector_texts), repeat=3)
+        print(f"{len(texts):,} rows in {len(vector_texts):,} vector documents, {embeddings.dims} dims")
+        print(f"{'embed all documents':<22} {embed_ms:>9.1f}ms ({embed_ms * 1000 / len(texts):.1f}us/row)")
+        print(f"{'embed query':<22} {best_ms(lambda: embeddings.embed_query('late orders in the north')):>9.3f}ms")
+
+        start = time.perf_counter()
+        rag.index_sheet(cells, "Bench")
+        print(f"{'cold index':<22} {(time.perf_counter() - start) * 1000:>9.1f}ms")
+
+        edited = dict(cells, B2=cells.get("B2", "") + " edited")
+        start = time.perf_counter()
+        result = rag.index_sheet(edited, "Bench")
+        print(f"{'1-cell re-index':<22} {(time.perf_counter() - start) * 1000:>9.1f}ms ({result.get('embedded')} embedded)")
+
+        keyword = texts[len(texts) // 2].split(" | ")[0]
+        print(f"{'keyword search':<22} {best_ms(lambda: rag.search(keyword, 'Bench', edited, k=10)):>9.1f}ms")
+        print(f"{'paraphrase search':<22} {best_ms(lambda: rag.search('big sales up north', 'Bench', edited, k=10)):>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
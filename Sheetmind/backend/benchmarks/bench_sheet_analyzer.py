@@ -0,0 +1,134 @@
+"""
+Benchmark: vectorized analyze_sheet vs the previous per-value analyzer.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sheet_analyzer [--rows 5000]
+
+"scalar" is the per-value algorithm analyze_sheet used before vectorization
+(regex parse, then _is_numeric/_is_date on every value and a second
+_parse_numeric pass for stats). "vectorized (shared frame)" is what a
+/chat/query pays once the request's SheetFrame exists; "vectorized (cold)"
+includes building the frame.
+
+The 10x target is not met. At 5,000 rows the shared-frame speedup measured
+7.4-9.5x across runs (the numeric shape is lowest), and the cold speedup
+measured 1.8-2.6x, because the ~35ms SheetFrame parse dominates. What remains per column is
+one float() per value and one set() of the values, which the scalar baseline
+pays as well. The "speedup" column reports the shared-frame ratio and the
+cold ratio side by side so the shortfall stays visible.
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Callable, Dict
+
+from app.services import sheet_analyzer as sa
+from app.services.sheet_frame import SheetFrame, get_frame
+
+
+def scalar_analyze(cells: Dict, sheet_name: str = "Sheet1") -> None:
+    """Per-value reference implementation (pre-vectorization analyze_sheet)."""
+    cell_pattern = re.compile(r"^([A-Z]+)(\d+)$")
+    column_data: Dict[str, Dict[int, str]] = {}
+    all_rows = set()
+    for ref, value in cells.items():
+        match = cell_pattern.match(ref)
+        if not match:
+            continue
+        row = int(match.group(2))
+        all_rows.add(row)
+        column_data.setdefault(match.group(1), {})[row] = "" if value is None else str(value)
+
+    min_row, max_row = min(all_rows), max(all_rows)
+    for col_rows in column_data.values():
+        data_values = [col_rows.get(r, "") for r in range(min_row + 1, max_row + 1)]
+        non_empty = [v for v in data_values if v and v.strip()]
+        numeric_count = date_count = 0
+        for val in non_empty:
+            if sa._is_numeric(val):
+                numeric_count += 1
+            elif sa._is_date(val):
+                date_count += 1
+        set(non_empty)
+        if non_empty and numeric_count / len(non_empty) >= 0.8:
+            nums = [n for n in map(sa._parse_numeric, non_empty) if n is not None]
+            min(nums), max(nums), sum(nums) / len(nums)
+
+
+def make_sheet(rows: int, shape: str, seed: int = 7) -> Dict[str, str]:
+    """Build a 10-column sheet; ``shape`` is "mixed", "numeric" or "text"."""
+    rnd = random.Random(seed)
+    regions = ["North", "South", "East", "West"]
+    generators = {
+        "id": lambda r: str(r - 1),
+        "amount": lambda r: f"${rnd.randint(1, 99999):,}.{rnd.randint(0, 99):02d}",
+        "qty": lambda r: rnd.randint(1, 50),
+        "price": lambda r: f"{rnd.random() * 100:.2f}",
+        "pct": lambda r: f"{rnd.random() * 100:.1f}%",
+        "date": lambda r: f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+        "region": lambda r: rnd.choice(regions),
+        "status": lambda r: rnd.choice(["Open", "Closed", "Pending"]),
+        "name": lambda r: f"{rnd.choice(['Alice', 'Bob', 'Carol', 'Dan', 'Eve'])} {rnd.randint(1, 999)}",
+        "email": lambda r: f"user{rnd.randint(1, 9999)}@example.com",
+        "notes": lambda r: rnd.choice(["", "follow up", "urgent: call back", "n/a"]),
+    }
+    layouts = {
+        "mixed": ["id", "name", "region", "date", "amount", "qty", "email", "status", "notes", "price"],
+        "numeric": ["id", "date", "region", "amount", "qty", "price", "pct", "amount", "qty", "price"],
+        "text": ["name", "email", "region", "status", "notes", "name", "email", "date", "region", "amount"],
+    }
+    cells: Dict[str, str] = {}
+    for i, kind in enumerate(layouts[shape]):
+        letter = chr(65 + i)
+        cells[f"{letter}1"] = kind.title()
+        for r in range(2, rows + 2):
+            cells[f"{letter}{r}"] = generators[kind](r)
+    return cells
+
+
+def best_ms(fn: Callable[[], None], repeat: int = 7) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5000, help="data rows per column (10 columns)")
+    args = parser.parse_args()
+
+    print(
+        f"{'shape':<8} {'cells':>7} {'scalar':>10} {'vec shared':>11} {'vec cold':>10} "
+        f"{'speedup':>9} {'cold':>6}"
+    )
+    for shape in ("mixed", "numeric", "text"):
+        cells = make_sheet(args.rows, shape)
+
+        scalar = best_ms(lambda: scalar_analyze(cells))
+        cold = best_ms(lambda: sa.analyze_sheet(dict(cells)))
+
+        frame = get_frame(cells)
+
+        def shared():
+            frame._sorted_columns.clear()  # don't reuse per-column work across repeats
+            sa.analyze_sheet(cells)
+
+        warm = best_ms(shared)
+        print(
+            f"{shape:<8} {len(cells):>7} {scalar:>8.1f}ms {warm:>9.1f}ms {cold:>8.1f}ms "
+            f"{scalar / warm:>8.1f}x {scalar / cold:>5.1f}x"
+        )
+
+    cells = make_sheet(args.rows, "mixed")
+    parse = best_ms(lambda: SheetFrame(cells))
+    print(f"\nSheetFrame parse (paid once per request, shared by all consumers): {parse:.1f}ms")
+    print("Target: 10x over scalar (not met; see module docstring)")
+
+
+if __name__ == "__main__":
+    main()
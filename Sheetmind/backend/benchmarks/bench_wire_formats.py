@@ -0,0 +1,66 @@
+"""
+Benchmark: sheet_data wire formats for /chat/query.
+
+Run from the backend directory:
+    python -m benchmarks.bench_wire_formats [--rows 5000]
+
+Compares the legacy A1-keyed ``cells`` dict with the compact row-major
+(``origin``/``headers``/``rows``) and column-major (``columns``) payloads:
+request body size and server-side decode time (json.loads + ChatRequest
+validation + SheetFrame ready for the analyzer).
+"""
+
+import argparse
+import json
+from typing import Dict
+
+from app.schemas.message import ChatRequest
+from app.services.sheet_frame import column_index_to_letter, get_frame
+from benchmarks.bench_sheet_analyzer import best_ms, make_sheet
+
+
+def to_grid(cells: Dict[str, str], rows: int, width: int) -> Dict:
+    letters = [column_index_to_letter(i + 1) for i in range(width)]
+    return {
+        "format": "rows",
+        "origin": "A1",
+        "headers": [cells.get(f"{c}1") for c in letters],
+        "rows": [[cells.get(f"{c}{r}") for c in letters] for r in range(2, rows + 2)],
+    }
+
+
+def to_columns(cells: Dict[str, str], rows: int, width: int) -> Dict:
+    letters = [column_index_to_letter(i + 1) for i in range(width)]
+    return {
+        "format": "columns",
+        "origin": "A1",
+        "columns": {c: [cells.get(f"{c}{r}") for r in range(1, rows + 2)] for c in letters},
+    }
+
+
+def decode(body: bytes) -> None:
+    request = ChatRequest.model_validate(json.loads(body))
+    get_frame(request.sheet_data["cells"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=4999, help="data rows (10 columns, 50k cells max)")
+    args = parser.parse_args()
+
+    cells = make_sheet(args.rows, "mixed")
+    payloads = {
+        "cells": {"cells": cells},
+        "rows": to_grid(cells, args.rows, 10),
+        "columns": to_columns(cells, args.rows, 10),
+    }
+
+    print(f"{'format':<8} {'body':>10} {'decode':>10}")
+    for name, sheet_data in payloads.items():
+        body = json.dumps({"message": "sum of sales by region", "sheet_data": sheet_data}).encode()
+        ms = best_ms(lambda: decode(body))
+        print(f"{name:<8} {len(body) / 1024:>8.0f}KB {ms:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,62 @@ def test_root_redirects_or_responds():
     assert response.status_code in [200, 307, 404]
 
 
+# =============================================================================
+# Request Limit Tests
+# =============================================================================
+
+def test_oversized_body_rejected_before_parsing():
+    """Test that bodies over the limit get 413, with or without Content-Length."""
+    from app.core.config import settings
+
+    body = b'{"message": "' + b'x' * settings.MAX_REQUEST_BODY_BYTES + b'"}'
+    headers = {'Content-Type': 'application/json'}
+
+    response = client.post('/api/chat/query', content=body, headers=headers)
+    assert response.status_code == 413
+
+    chunks = (body[i:i + 65536] for i in range(0, len(body), 65536))
+    response = client.post('/api/chat/query', content=chunks, headers=headers)
+    assert response.status_code == 413
+
+
+def test_chat_request_rejects_too_many_cells():
+    """Test that the cell-count limit applies to legacy and compact sheet_data."""
+    from pydantic import ValidationError
+    from app.schemas.message import ChatRequest
+
+    limit = ChatRequest.MAX_SHEET_CELLS
+    with pytest.raises(ValidationError):
+        ChatRequest(message='hi', sheet_data={'cells': {f'A{i}': 'x' for i in range(1, limit + 2)}})
+    with pytest.raises(ValidationError):
+        ChatRequest(message='hi', sheet_data={'format': 'rows', 'rows': [['x'] * 100] * (limit // 100 + 1)})
+    with pytest.raises(ValidationError, match='Maximum is'):
+        ChatRequest(message='hi', sheet_data={'format': 'columns', 'columns': {'A': ['x'] * (limit + 1)}})
+
+
+def test_fast_serializer_round_trip():
+    """Test the fast JSON layer on API-shaped payloads."""
+    import uuid
+    from app.core.serialization import dumps, loads, FastJSONResponse
+    from app.schemas.message import QuickAction
+
+    conversation_id = uuid.uuid4()
+    payload = {
+        'conversation_id': conversation_id,
+        'quick_actions': [QuickAction(label='Sum', prompt='sum of sales')],
+        'categories': {'North'},
+        'content': 'Résumé',
+    }
+
+    decoded = loads(dumps(payload))
+    assert decoded['conversation_id'] == str(conversation_id)
+    assert decoded['quick_actions'] == [{'label': 'Sum', 'prompt': 'sum of sales'}]
+    assert decoded['categories'] == ['North']
+    assert decoded['content'] == 'Résumé'
+    assert dumps({'b': 1, 'a': 2}, sort_keys=True) == '{"a":2,"b":1}'
+    assert loads(FastJSONResponse(payload).body) == decoded
+
+
 # =============================================================================
 # Sheet Analyzer Tests
 # =============================================================================
@@ -89,6 +145,594 @@ def test_sheet_analyzer_empty_data():
     assert len(metadata.columns) == 0
 
 
+def test_sheet_analyzer_mixed_numeric_formats():
+    """Test that currency, accounting and percent values are classified and summarized as numbers."""
+    from app.services.sheet_analyzer import analyze_sheet
+
+    cells = {
+        'A1': 'Amount', 'B1': 'Date', 'C1': 'Note',
+        'A2': '$1,234', 'B2': '2024-01-15', 'C2': 'ok',
+        'A3': '(5)', 'B3': '01/02/2024', 'C3': '',
+        'A4': '50%', 'B4': 'Jan 3, 2024', 'C4': 'ok',
+        'A5': '', 'B5': '2024-02-01', 'C5': 'late',
+    }
+
+    metadata = analyze_sheet(cells, 'Mixed')
+    amount, date, note = metadata.columns
+
+    assert amount.column_type == 'numeric'
+    assert (amount.min_value, amount.max_value) == (-5, 1234)
+    assert amount.null_count == 1
+    assert date.column_type == 'date'
+    assert note.unique_count == 2
+
+
+def test_metadata_cache_reuses_unchanged_columns():
+    """Test that cached metadata is reused per sheet and per unchanged column."""
+    from app.services.metadata_cache import get_sheet_metadata, clear_local_cache
+
+    clear_local_cache()
+    cells = {
+        'A1': 'Region', 'B1': 'Sales',
+        'A2': 'North', 'B2': '10',
+        'A3': 'South', 'B3': '20',
+    }
+
+    first = get_sheet_metadata(cells, 'Data')
+    assert get_sheet_metadata(dict(cells), 'Data') is first
+
+    edited = get_sheet_metadata({**cells, 'B3': '25'}, 'Data')
+    assert edited is not first
+    assert edited.columns[0] is first.columns[0]
+    assert edited.columns[1].max_value == 25
+
+    # Moving a column keeps its analysis, under the new letter
+    moved = get_sheet_metadata({'B1': 'Region', 'B2': 'North', 'B3': 'South'}, 'Data')
+    assert moved.columns[0].letter == 'B'
+    assert moved.columns[0].unique_count == first.columns[0].unique_count
+
+
+# =============================================================================
+# Sheet Frame Tests
+# =============================================================================
+
+def test_sheet_frame_parses_columns_and_rows():
+    """Test that SheetFrame indexes cells by column and row in sheet order."""
+    from app.services.sheet_frame import SheetFrame
+
+    frame = SheetFrame({
+        'AA1': 'Notes', 'B1': 'Amount', 'A1': 'Name',
+        'A2': 'John', 'B2': 100, 'AA2': None,
+        'A4': 'Bob', 'bad-ref': 'x',
+    })
+
+    assert frame.columns == ['A', 'B', 'AA']
+    assert frame.headers == {'A': 'Name', 'B': 'Amount', 'AA': 'Notes'}
+    assert frame.row_numbers == [1, 2, 4]
+    assert frame.max_row == 4
+    assert frame.get('B', 2) == '100'
+    assert frame.get('AA', 2) == ''
+    assert frame.column_items('A') == [(2, 'John'), (4, 'Bob')]
+    assert frame.dense_column('A', 2, 4) == ['John', '', 'Bob']
+
+
+def test_get_frame_is_shared_per_cells_dict():
+    """Test that get_frame parses a cells dict once and reuses the result."""
+    from app.services.sheet_frame import get_frame
+
+    cells = {'A1': 'Name', 'A2': 'John'}
+    frame = get_frame(cells)
+
+    assert get_frame(cells) is frame
+    assert get_frame(dict(cells)) is not frame
+
+    cells['A3'] = 'Alice'
+    assert get_frame(cells).max_row == 3
+
+
+def test_compact_sheet_data_decodes_to_frame():
+    """Test that row- and column-major payloads decode to the same sheet as legacy cells."""
+    from app.schemas.message import ChatRequest
+    from app.services.sheet_frame import SheetFrame, get_frame
+
+    legacy = {'A1': 'Region', 'B1': 'Sales', 'A2': 'North', 'B2': '10', 'A3': 'South'}
+    rows = ChatRequest(message='hi', sheet_data={
+        'format': 'rows', 'origin': 'A1', 'headers': ['Region', 'Sales'], 'rows': [['North', 10], ['South']],
+    })
+    columns = ChatRequest(message='hi', sheet_data={
+        'format': 'columns', 'columns': {'A': ['Region', 'North', 'South'], 'B': ['Sales', '10', None]},
+    })
+
+    for request in (rows, columns):
+        cells = request.sheet_data['cells']
+        assert cells == legacy
+        frame = get_frame(cells)
+        assert frame.cells is cells
+        assert frame.column_data == SheetFrame(legacy).column_data
+
+    with pytest.raises(ValueError):
+        ChatRequest(message='hi', sheet_data={'format': 'rows', 'origin': 'bad', 'rows': [['x']]})
+
+    # Without the format marker, {"headers", "rows"} is the older payload
+    # read by ai_provider._build_context_message and passes through as-is
+    legacy_rows = {'headers': ['Region'], 'rows': [['North']]}
+    assert ChatRequest(message='hi', sheet_data=legacy_rows).sheet_data == legacy_rows
+
+
+def test_fingerprint_reports_changed_rows_and_columns():
+    """Test that the sheet fingerprint is memoized and pinpoints edits."""
+    from app.services.fingerprint import get_fingerprint
+
+    cells = {
+        'A1': 'Region', 'B1': 'Sales',
+        'A2': 'North', 'B2': '10',
+        'A3': 'South', 'B3': '20',
+    }
+    before = get_fingerprint(cells)
+    assert get_fingerprint(cells) is before
+    assert get_fingerprint(dict(cells)).root == before.root
+
+    after = get_fingerprint({**cells, 'B3': '25', 'A4': 'East'})
+    assert after.root != before.root
+    assert after.changed_rows(before) == [3, 4]
+    assert after.changed_columns(before) == ['A', 'B']
+    assert get_fingerprint({'A1': 'Region', 'A2': 'North'}).removed_rows(before) == [3]
+
+
+def test_sheet_snapshot_applies_delta_patch():
+    """Test that a delta upload rebuilds the sheet from the stored snapshot."""
+    from app.services.fingerprint import get_fingerprint
+    from app.services.sheet_snapshots import SnapshotMismatch, apply_patch, save_snapshot
+
+    cells = {'A1': 'Region', 'A2': 'North', 'A3': 'South'}
+    base = save_snapshot('user-1', 'Data', cells)
+
+    patched = apply_patch('user-1', 'Data', base, {'A3': None, 'A4': 'East'})
+    assert patched == {'A1': 'Region', 'A2': 'North', 'A4': 'East'}
+    assert cells['A3'] == 'South'
+    assert get_fingerprint(patched).root != base
+
+    with pytest.raises(SnapshotMismatch):
+        apply_patch('user-1', 'Data', 'stale-fingerprint', {})
+    with pytest.raises(SnapshotMismatch):
+        apply_patch('user-2', 'Data', base, {})
+
+    # Same sheet name in another workbook: separate bases
+    other = save_snapshot('user-1', 'Data', {'A1': 'Item', 'A2': 'Bolt'}, spreadsheet_id='book-2')
+    assert apply_patch('user-1', 'Data', base, {})['A1'] == 'Region'
+    assert apply_patch('user-1', 'Data', other, {}, spreadsheet_id='book-2')['A2'] == 'Bolt'
+    with pytest.raises(SnapshotMismatch):
+        apply_patch('user-1', 'Data', base, {}, spreadsheet_id='book-2')
+
+
+def test_sheet_patch_is_validated(monkeypatch):
+    """Test that patch keys must be A1 references and the patched sheet must fit the cell limit."""
+    from pydantic import ValidationError
+    from app.api.routes import chat as chat_routes
+    from app.core.auth import get_current_user
+    from app.schemas.message import ChatRequest
+    from app.services.sheet_snapshots import save_snapshot
+
+    with pytest.raises(ValidationError):
+        ChatRequest(message='hi', base_fingerprint='abc', sheet_patch={'B7': '1', 'Sheet2!A1': 'x'})
+    with pytest.raises(ValidationError):
+        ChatRequest(message='hi', base_fingerprint='abc', sheet_patch={'__proto__': 'x'})
+    with pytest.raises(ValidationError):
+        ChatRequest(message='hi', base_fingerprint='abc', sheet_patch={'B7': {'nested': [1, 2]}})
+    assert ChatRequest(message='hi', base_fingerprint='abc', sheet_patch={'B7': 4.5, 'C1': None}).sheet_patch
+
+    base = save_snapshot('user-1', 'Big', {'A1': 'Region', 'A2': 'North', 'A3': 'South'})
+    monkeypatch.setattr(ChatRequest, 'MAX_SHEET_CELLS', 4)
+    monkeypatch.setattr(chat_routes, 'get_supabase', lambda: None)
+    monkeypatch.setattr(chat_routes, 'check_rate_limit', lambda *a: {'allowed': True})
+    app.dependency_overrides[get_current_user] = lambda: {'id': 'user-1', 'tier': 'pro'}
+    try:
+        response = client.post('/api/chat/query', json={
+            'message': 'Total?',
+            'sheet_name': 'Big',
+            'base_fingerprint': base,
+            'sheet_patch': {'A4': 'East', 'A5': 'West'},
+        })
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+    assert response.status_code == 413
+
+
+# =============================================================================
+# Local Query Engine Tests
+# =============================================================================
+
+QUERY_CELLS = {
+    'A1': 'Region', 'B1': 'Status', 'C1': 'Sales',
+    'A2': 'North', 'B2': 'Open', 'C2': '100',
+    'A3': 'South', 'B3': 'Closed', 'C3': '50',
+    'A4': 'North', 'B4': 'Open', 'C4': '$1,200',
+    'A5': 'East', 'B5': 'Open', 'C5': '30',
+}
+
+
+def test_local_query_filtered_sum_and_grouped_average():
+    """Test that simple aggregates are computed locally with exact sources."""
+    from app.services.query_engine import answer_locally
+
+    total = answer_locally('What is the total sales where status is Open?', QUERY_CELLS, 'Data')
+    assert '1,330' in total.text
+    assert [s.range for s in total.sources] == ['C2:C5', 'A2:C2', 'A4:C5']
+
+    grouped = answer_locally('average sales by region', QUERY_CELLS, 'Data')
+    assert '| North | 650 |' in grouped.text
+    assert grouped.plan.group_column == 'A'
+
+
+def test_local_query_defers_to_llm():
+    """Test that questions the parser can't fully resolve return None."""
+    from app.services.query_engine import answer_locally
+
+    assert answer_locally('why are sales low?', QUERY_CELLS, 'Data') is None
+    assert answer_locally('total sales for South', QUERY_CELLS, 'Data') is None
+    assert answer_locally('total sales where region is Mars', QUERY_CELLS, 'Data') is None
+    # Leftover numbers (a year, a bare value) are filters we didn't resolve
+    assert answer_locally('total sales in 2024', QUERY_CELLS, 'Data') is None
+    assert answer_locally('total sales for 2023', QUERY_CELLS, 'Data') is None
+    assert answer_locally('total sales 2024', QUERY_CELLS, 'Data') is None
+    # Counting a text column asks for distinct values, not rows
+    assert answer_locally('how many regions', QUERY_CELLS, 'Data') is None
+    # Max/min questions that ask for a label rather than the value
+    assert answer_locally('highest sales region', QUERY_CELLS, 'Data') is None
+    assert answer_locally('who has the highest sales', QUERY_CELLS, 'Data') is None
+    assert answer_locally('which has the lowest sales', QUERY_CELLS, 'Data') is None
+    assert '1,200' in answer_locally('highest sales', QUERY_CELLS, 'Data').text
+    assert '| North | 1,200 |' in answer_locally('highest sales per region', QUERY_CELLS, 'Data').text
+
+
+def test_local_query_counts_rows_with_a_value():
+    """Test that scalar, grouped and row counts agree on what they count."""
+    from app.services.query_engine import answer_locally
+
+    cells = {**QUERY_CELLS, 'A6': 'North', 'B6': 'Open', 'C6': ''}
+    assert '**5** rows' in answer_locally('how many rows', cells, 'Data').text
+    assert '**4**' in answer_locally('how many sales', cells, 'Data').text
+    grouped = answer_locally('count sales by region', cells, 'Data')
+    assert '| North | 2 |' in grouped.text
+    assert 'Computed from 4 rows' in grouped.text
+    assert '| North | 3 |' in answer_locally('number of rows per region', cells, 'Data').text
+    assert answer_locally('top 2 sales', cells, 'Data').plan.top_n == 2
+
+
+# =============================================================================
+# RAG Tests
+# =============================================================================
+
+def test_rag_reindex_embeds_only_changed_rows(tmp_path, monkeypatch):
+    """Test that re-indexing an edited sheet only embeds new or changed rows."""
+    pytest.importorskip('chromadb')
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services import rag_system
+
+    embedded = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            embedded.append(len(texts))
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    monkeypatch.setattr(rag_system.settings, 'RAG_EMBED_BATCH_SIZE', 16)
+    rag = rag_system.SheetRAG()
+    rag._embeddings, rag._embedding_type = CountingEmbeddings(size=8), 'fake'
+
+    cells = {'A1': 'Name', 'B1': 'City'}
+    for r in range(2, 52):
+        cells[f'A{r}'], cells[f'B{r}'] = f'Person {r}', 'Rome'
+    assert rag.index_sheet(cells, 'Data')['embedded'] == 50
+    assert sorted(embedded) == [2, 16, 16, 16]
+    assert rag.get_index_progress('Data') == {'status': 'indexed', 'indexed': 50, 'total': 50}
+    embedded.clear()
+
+    # Insert a row at the top (shifting all others) and edit one cell
+    shifted = {'A1': 'Name', 'B1': 'City', 'A2': 'New person', 'B2': 'Oslo'}
+    for r in range(2, 52):
+        shifted[f'A{r + 1}'], shifted[f'B{r + 1}'] = f'Person {r}', 'Rome'
+    shifted['B10'] = 'Paris'
+
+    result = rag.index_sheet(shifted, 'Data')
+    assert (result['embedded'], result['removed'], result['moved']) == (2, 1, 49)
+    assert embedded == [2]
+    assert rag.search('Oslo', 'Data', shifted, k=51)[0]['content'].startswith('Row ')
+
+
+def test_rag_indexes_are_namespaced_per_user(tmp_path, monkeypatch):
+    """Test that two users' same-named sheets keep separate indexes."""
+    pytest.importorskip('chromadb')
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services import rag_system
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    rag = rag_system.SheetRAG()
+    rag._embeddings, rag._embedding_type = DeterministicFakeEmbedding(size=8), 'fake'
+    alice = rag_system.rag_namespace('alice', 'sheet-a')
+    bob = rag_system.rag_namespace('bob')
+
+    alice_cells = {'A1': 'Name', 'A2': 'Ann', 'A3': 'Al'}
+    bob_cells = {'A1': 'Name', 'A2': 'Bob'}
+    assert rag.index_sheet(alice_cells, 'Sheet1', namespace=alice)['embedded'] == 2
+    assert rag.index_sheet(bob_cells, 'Sheet1', namespace=bob)['embedded'] == 1
+
+    # Neither sees the other's index as stale, and both stay on disk
+    assert not rag.is_stale(alice_cells, 'Sheet1', alice)
+    assert rag.index_sheet(alice_cells, 'Sheet1', namespace=alice)['status'] == 'already_indexed'
+    assert len([p for p in tmp_path.iterdir() if p.name != '_registry']) == 2
+    assert [r['row'] for r in rag.search('Bob', 'Sheet1', bob_cells, k=5, namespace=bob)] == [2]
+
+    # Over the byte budget, the least recently used index is unloaded (not deleted)
+    monkeypatch.setattr(rag_system.settings, 'RAG_CACHE_MAX_BYTES', 3 * 8 * 4)
+    rag.index_sheet({'A1': 'Name', 'A2': 'Cy'}, 'Sheet2', namespace=alice)
+    assert rag._collection_name('Sheet1', bob) not in rag._vectorstores
+    assert rag.index_sheet(bob_cells, 'Sheet1', namespace=bob)['embedded'] == 0
+
+
+def test_rag_hybrid_search_skips_vectors_for_keyword_queries(tmp_path, monkeypatch):
+    """Test that exact keyword lookups are answered by BM25 alone."""
+    pytest.importorskip('chromadb')
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services import rag_system
+
+    embedded = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    rag = rag_system.SheetRAG()
+    rag._embeddings, rag._embedding_type = CountingEmbeddings(size=8), 'fake'
+
+    cells = {'A1': 'SKU', 'B1': 'Customer', 'C1': 'Note'}
+    for r in range(2, 40):
+        cells[f'A{r}'], cells[f'B{r}'], cells[f'C{r}'] = str(1000 + r), f'Client {r}', 'ok'
+    cells['B20'] = 'Acme Corp'
+
+    hits = rag.search('show rows for Acme Corp', 'Data', cells, k=3)
+    assert hits[0]['row'] == 20 and hits[0]['match'] == 'lexical'
+    assert rag.search('SKU 1,010', 'Data', cells, k=3)[0]['row'] == 10
+    assert embedded == []
+
+    fused = rag.search('frustrated shopper', 'Data', cells, k=3)
+    assert len(embedded) == 38 and {h['match'] for h in fused} == {'vector'}
+
+
+def test_local_hashing_embeddings_work_offline(monkeypatch):
+    """Test the offline embeddings provider is deterministic and token-aware."""
+    import numpy as np
+    from app.services import rag_system
+    from app.services.local_embeddings import HashingEmbeddings
+
+    embeddings = HashingEmbeddings(dims=256)
+    a, b, c = np.array(embeddings.embed_documents(
+        ['Customer: Acme Corp | Status: late', 'customers acme corp late', 'Region: North | Total: 42']
+    ))
+    assert a.shape == (256,) and abs(np.linalg.norm(a) - 1) < 1e-6
+    assert a @ b > 0.5 > a @ c
+    assert embeddings.embed_query('Acme Corp') == HashingEmbeddings(dims=256).embed_query('Acme Corp')
+
+    monkeypatch.setattr(rag_system.settings, 'RAG_EMBEDDING_PROVIDER', 'local')
+    model, kind = rag_system._get_embeddings()
+    assert kind == 'local' and isinstance(model, HashingEmbeddings)
+
+
+def test_rag_applies_numeric_and_date_constraints_before_ranking(tmp_path, monkeypatch):
+    """Test "over 500 in March" filters rows exactly instead of matching semantically."""
+    pytest.importorskip('chromadb')
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services import rag_system
+
+    embedded = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    rag = rag_system.SheetRAG()
+    rag._embeddings, rag._embedding_type = CountingEmbeddings(size=8), 'fake'
+
+    cells = {'A1': 'Order', 'B1': 'Date', 'C1': 'Amount', 'D1': 'Customer'}
+    for r in range(2, 62):
+        cells[f'A{r}'] = f'ORD-{r}'
+        cells[f'B{r}'] = f'2024-{(r % 6) + 1:02d}-{(r % 27) + 1:02d}'
+        cells[f'C{r}'] = f'${(r * 37) % 1000:,}'
+        cells[f'D{r}'] = 'Acme Corp' if r % 2 else 'Globex'
+    expected = [
+        r for r in range(2, 62)
+        if (r % 6) + 1 == 3 and (r * 37) % 1000 > 500
+    ]
+
+    hits = rag.search('orders over 500 in March', 'Orders', cells, k=50)
+    assert [h['row'] for h in hits] == expected
+    assert {h['match'] for h in hits} == {'filter'}
+
+    hits = rag.search('Acme Corp with amount between 100 and 400', 'Orders', cells, k=50)
+    assert hits and all(r % 2 and 100 <= (r * 37) % 1000 <= 400 for r in (h['row'] for h in hits))
+    assert embedded == []
+
+
+def test_bare_numbers_counting_other_nouns_are_not_amounts():
+    """Test "over 3 items" / "over 2 years" aren't read as a filter on the money column."""
+    from app.services.query_constraints import extract_constraints
+    from app.services.sheet_analyzer import analyze_sheet
+
+    metadata = analyze_sheet({
+        'A1': 'Customer', 'B1': 'Amount', 'C1': 'Quantity',
+        'A2': 'Acme', 'B2': '$500', 'C2': '3',
+    }, 'Orders')
+
+    for query in ('customers with over 3 items', 'accounts open for over 2 years', 'late by over 30 days'):
+        assert not extract_constraints(query, metadata), query
+
+    for query, low in (('orders over 500', 500), ('over $1,000 dollars', 1000), ('over 500, newest first', 500)):
+        constraints = extract_constraints(query, metadata).constraints
+        assert [(c.column, c.low) for c in constraints] == [('B', low)], query
+    assert [c.column for c in extract_constraints('quantity over 3 items', metadata).constraints] == ['C']
+
+
+def test_rag_chunked_documents_expand_hits_to_rows(tmp_path, monkeypatch):
+    """Test RAG_CHUNK_ROWS packs rows into vector documents and hits expand back to rows."""
+    pytest.importorskip('chromadb')
+    from app.services import rag_system
+    from app.services.local_embeddings import HashingEmbeddings
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    monkeypatch.setattr(rag_system.settings, 'RAG_CHUNK_ROWS', 10)
+    rag = rag_system.SheetRAG()
+    rag._embeddings, rag._embedding_type = HashingEmbeddings(dims=64), 'local'
+
+    cells = {'A1': 'Ticket', 'B1': 'Note'}
+    for r in range(2, 62):
+        cells[f'A{r}'] = f'T-{r}'
+        cells[f'B{r}'] = 'package arrived damaged and torn' if 42 <= r <= 45 else 'resolved quickly'
+
+    result = rag.index_sheet(cells, 'Tickets')
+    assert result['indexed'] == 6 and result['embedded'] == 6
+
+    rows = rag._vector_search('damage to the parcel', 'Tickets', cells, 10, rag_system.DEFAULT_NAMESPACE,
+                              rag._collection_name('Tickets'))
+    assert rows == list(range(42, 52))
+
+    assert rag.index_sheet(dict(cells, B30='escalated'), 'Tickets')['embedded'] == 1
+
+
+def test_rag_workers_share_indexes_through_registry(tmp_path, monkeypatch):
+    """Test a second worker reopens a sheet another worker indexed instead of re-embedding it."""
+    pytest.importorskip('chromadb')
+    from app.services import rag_system
+    from app.services.local_embeddings import HashingEmbeddings
+
+    class CountingEmbeddings(HashingEmbeddings):
+        calls = []
+
+        def embed_documents(self, texts):
+            self.calls.extend(texts)
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    workers = [rag_system.SheetRAG(), rag_system.SheetRAG()]
+    for rag in workers:
+        rag._embeddings, rag._embedding_type = CountingEmbeddings(dims=32), 'local'
+
+    cells = {'A1': 'Item', 'B1': 'Note'}
+    for r in range(2, 30):
+        cells[f'A{r}'], cells[f'B{r}'] = f'Item {r}', 'in stock'
+    cells['B7'] = 'water damaged crate'
+
+    assert workers[0].index_sheet(cells, 'Stock')['embedded'] == 28
+    assert workers[1].index_sheet(cells, 'Stock')['embedded'] == 0
+    assert len(CountingEmbeddings.calls) == 28
+
+    # Worker 1 edits the sheet; worker 0 sees the new version, not its stale copy
+    edited = dict(cells, B12='crate crushed by forklift')
+    assert workers[1].index_sheet(edited, 'Stock')['embedded'] == 1
+    name = workers[0]._collection_name('Stock')
+    rows = workers[0]._vector_search('crate crushed by forklift', 'Stock', edited, 1, rag_system.DEFAULT_NAMESPACE, name)
+    assert rows == [12] and len(CountingEmbeddings.calls) == 29
+
+
+def test_rag_rebuilds_index_when_embedding_model_changes(tmp_path, monkeypatch):
+    """Test an index built with another embedding model is rebuilt, not reused or patched."""
+    pytest.importorskip('chromadb')
+    from app.services import rag_system
+    from app.services.local_embeddings import HashingEmbeddings
+
+    monkeypatch.setattr(rag_system, 'CHROMA_DIR', tmp_path)
+    cells = {'A1': 'Item', 'B1': 'Note'}
+    for r in range(2, 12):
+        cells[f'A{r}'], cells[f'B{r}'] = f'Item {r}', 'in stock'
+    cells['B7'] = 'water damaged crate'
+
+    old = rag_system.SheetRAG()
+    old._embeddings, old._embedding_type = HashingEmbeddings(dims=32), 'local'
+    assert old.index_sheet(cells, 'Stock')['embedded'] == 10
+
+    new = rag_system.SheetRAG()
+    new._embeddings, new._embedding_type = HashingEmbeddings(dims=64), 'local'
+    assert new.index_sheet(cells, 'Stock')['embedded'] == 10
+    edited = dict(cells, B3='crate crushed by forklift')
+    assert new.index_sheet(edited, 'Stock')['embedded'] == 1
+    name = new._collection_name('Stock')
+    assert new._registry.read(name)['embedding'] == 'local:hashing-64:64'
+    rows = new._vector_search('crate crushed by forklift', 'Stock', edited, 1, rag_system.DEFAULT_NAMESPACE, name)
+    assert rows == [3]
+
+
+def test_embedding_cache_embeds_each_text_once():
+    """Test that cached embeddings only send unseen texts to the model."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services.embedding_cache import CachedEmbeddings, clear_local_cache, embedding_cache_stats
+
+    embedded = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    clear_local_cache()
+    cached = CachedEmbeddings(CountingEmbeddings(size=8), 'fake:test')
+    first = cached.embed_documents(['Name: Ann', 'Name: Bob', 'Name: Ann'])
+    second = cached.embed_documents(['Name:  Bob', 'Name: Cy'])
+
+    assert embedded == ['Name: Ann', 'Name: Bob', 'Name: Cy']
+    assert first[0] == first[2] and second[0] == first[1]
+    assert CachedEmbeddings(CountingEmbeddings(size=8), 'other').embed_documents(['Name: Ann'])
+    assert embedded[-1] == 'Name: Ann'
+    assert embedding_cache_stats()['local_hits'] == 1
+
+
+def test_lru_cache_bounded_by_size():
+    """Test that a sized LRUCache evicts least recently used entries once over its byte budget."""
+    import numpy as np
+    from app.services.lru import LRUCache
+
+    lru = LRUCache(3 * 400, sizeof=lambda v: v.nbytes)
+    for key in 'abc':
+        lru.set(key, np.zeros(100, dtype=np.float32))
+    lru.get('a')
+    lru.set('d', np.zeros(100, dtype=np.float32))
+    assert lru.get('b') is None and lru.get('a') is not None
+    assert (len(lru), lru.size) == (3, 1200)
+    lru.set('a', np.zeros(200, dtype=np.float32))
+    assert (len(lru), lru.size) == (2, 1200)
+
+
+# =============================================================================
+# LangChain Tools Tests
+# =============================================================================
+
+def test_reader_tools_use_context_indexes():
+    """Test that reader tools answer from the indexes built by set_sheet_context."""
+    import json
+    from app.services.langchain_tools import (
+        set_sheet_context, get_sheet_context, get_column_stats, get_column_values, count_rows,
+    )
+
+    set_sheet_context({'cells': {
+        'A1': 'Region', 'B1': 'Sales',
+        'A2': 'North', 'B2': '10',
+        'A3': 'South', 'B3': '20',
+        'A4': 'North', 'B4': '30',
+    }})
+
+    stats = json.loads(get_column_stats.invoke({'column': 'a'}))
+    assert stats['header'] == 'Region'
+    assert stats['uniqueCount'] == 2
+    assert 'A' in get_sheet_context()['columnStats']
+
+    values = json.loads(get_column_values.invoke({'column': 'B', 'limit': 2}))
+    assert values == [{'row': 2, 'value': '10'}, {'row': 3, 'value': '20'}]
+    assert count_rows.invoke({}) == '3'
+
+
 # =============================================================================
 # SmartExecutor Tests
 # =============================================================================
@@ -140,6 +784,45 @@ def test_template_grouped_summary_chart():
     assert actions[-1]['chartType'] == 'bar'
 
 
+def test_group_by_kernel_aggregations():
+    """Test single- and multi-key grouping with every aggregation."""
+    from app.services.group_by import group_rows
+
+    regions = ['North', 'South', 'North', ' ', 'South']
+    products = ['Apple', 'Pear', 'Apple', 'Apple', 'Fig']
+    sales = [10.0, 20.0, float('nan'), 40.0, 50.0]
+
+    groups = group_rows(regions)
+    assert groups.keys == ['North', 'South']
+    assert groups.aggregate('count').tolist() == [2, 2]
+    assert groups.aggregate('sum', sales).tolist() == [10, 70]
+    assert groups.aggregate('max', sales).tolist() == [10, 50]
+    assert groups.aggregate('distinct', products).tolist() == [1, 2]
+    assert [m.tolist() for m in groups.members()] == [[0, 2], [1, 4]]
+
+    pairs = group_rows(regions, products)
+    assert pairs.to_dict('sum', sales) == {('North', 'Apple'): 10, ('South', 'Pear'): 20, ('South', 'Fig'): 50}
+
+
+def test_inline_chart_counts_groups():
+    """Test that the inline chart aggregates cells through the group-by kernel."""
+    from app.services.smart_executor import SmartExecutor
+
+    cells = {
+        'A1': 'Region', 'B1': 'Sales',
+        'A2': 'North', 'B2': '$1,000',
+        'A3': 'South', 'B3': '20',
+        'A4': 'North', 'B4': '(5)',
+    }
+    executor = SmartExecutor.__new__(SmartExecutor)
+    counts = executor._build_inline_chart_from_cells(cells, 'A', 'B', 'Sales', 'count')
+    assert counts['data']['labels'] == ['North', 'South']
+    assert counts['data']['datasets'][0]['data'] == [2, 1]
+
+    totals = executor._build_inline_chart_from_cells(cells, 'A', 'B', 'Sales', 'sum')
+    assert totals['data']['datasets'][0]['data'] == [995, 20]
+
+
 # =============================================================================
 # Intent Detection Tests
 # =============================================================================
@@ -213,5 +896,254 @@ def test_chat_endpoint_authenticated():
 # Run Tests
 # =============================================================================
 
+
+# ============================================================
+# LLM Client Registry Tests
+# ============================================================
+
+def test_llm_clients_are_shared_and_reuse_connections(monkeypatch):
+    """Test call sites share one client per (provider, model, params) and one keep-alive pool."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.services import ai_provider, llm_clients
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+
+    assert ai_provider._get_openrouter_client() is ai_provider._get_openrouter_client()
+    a = llm_clients.get_chat_model('google/gemini-2.0-flash-001', temperature=0.1, max_tokens=2048)
+    assert a is llm_clients.get_chat_model('google/gemini-2.0-flash-001', max_tokens=2048, temperature=0.1)
+    assert a is not llm_clients.get_chat_model('google/gemini-2.0-flash-001', temperature=0.0, max_tokens=512)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        before = llm_clients.llm_client_stats()['openrouter']
+        client = llm_clients.get_http_client('openrouter')
+        for _ in range(5):
+            assert client.get(f'http://127.0.0.1:{server.server_port}/').text == 'ok'
+        after = llm_clients.llm_client_stats()['openrouter']
+        assert after['requests'] - before['requests'] == 5
+        assert after['connections'] - before['connections'] == 1
+    finally:
+        server.shutdown()
+
+
+def test_async_chat_falls_back_without_blocking_event_loop(monkeypatch):
+    """Test achat_completion walks the fallback chain and concurrent chats overlap on one loop."""
+    import asyncio
+    import time
+    from app.services import ai_provider, llm_clients, model_health
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_provider.settings, 'GEMINI_ENABLED', False)
+    model_health.reset_model_health()
+    calls = []
+
+    async def fake_call(model, system_prompt, user_message, context, client, history=None):
+        calls.append(model)
+        await asyncio.sleep(0.2)
+        if model == ai_provider.PRIMARY_OR_MODEL:
+            raise TimeoutError("primary down")
+        return f"answer from {model}"
+
+    monkeypatch.setattr(ai_provider, '_acall_model', fake_call)
+
+    async def run():
+        return await asyncio.gather(*(ai_provider.achat_completion(f"question {i}") for i in range(5)))
+
+    start = time.perf_counter()
+    answers = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert answers == [f"answer from {ai_provider.FALLBACK_MODEL}"] * 5
+    assert calls.count(ai_provider.PRIMARY_OR_MODEL) == 5
+    # Two awaited model calls each; sequential would take 5 x 0.4s
+    assert elapsed < 1.0
+
+
+def test_async_chat_hedges_slow_models_within_budget(monkeypatch):
+    """Test a slow primary is raced by the next model, the loser is cancelled, and budgets cap the chain."""
+    import asyncio
+    import time
+    from app.services import ai_provider, llm_clients, llm_hedging, model_health
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_provider.settings, 'GEMINI_ENABLED', False)
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_DELAYS', 'chat=0.1,explain=0.1')
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_BUDGETS', 'explain=0.5')
+    llm_hedging.reset_hedge_stats()
+    model_health.reset_model_health()
+    cancelled = []
+    latency = {ai_provider.PRIMARY_OR_MODEL: 5.0, ai_provider.FALLBACK_MODEL: 0.05}
+
+    async def fake_call(model, system_prompt, user_message, context, client, history=None):
+        try:
+            await asyncio.sleep(latency.get(model, 5.0))
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return f"answer from {model}"
+
+    monkeypatch.setattr(ai_provider, '_acall_model', fake_call)
+
+    start = time.perf_counter()
+    assert asyncio.run(ai_provider.achat_completion("total sales")) == f"answer from {ai_provider.FALLBACK_MODEL}"
+    assert time.perf_counter() - start < 1.0
+    assert cancelled == [ai_provider.PRIMARY_OR_MODEL]
+    stats = llm_hedging.hedge_stats()['chat']
+    assert stats['fired'] == 1 and stats['won'] == 1 and stats['lost'] == 0
+    # The cancelled primary's elapsed time still counts towards its p95
+    assert stats['p95_seconds'][ai_provider.PRIMARY_OR_MODEL] >= 0.1
+
+    latency[ai_provider.FALLBACK_MODEL] = 5.0
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        asyncio.run(ai_provider.aexplain_formula("=SUM(A:A)"))
+    assert time.perf_counter() - start < 1.5
+    assert llm_hedging.hedge_stats()['explain']['cancelled'] == 3
+
+
+def test_hedge_losers_only_count_as_timeouts_past_their_deadline(monkeypatch):
+    """Test losing the hedge race leaves a slow primary's breaker alone, but outliving its own timeout counts."""
+    import asyncio
+    from app.services import ai_provider, llm_clients, llm_hedging, model_health
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_provider.settings, 'GEMINI_ENABLED', False)
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_DELAYS', 'chat=0.02,explain=0.02')
+    monkeypatch.setattr(llm_hedging.settings, 'LLM_HEDGE_BUDGETS', 'explain=0.4')
+    monkeypatch.setitem(ai_provider._COMPLETION_PARAMS, 'timeout', 0.2)
+    llm_hedging.reset_hedge_stats()
+    model_health.reset_model_health()
+    primary = ai_provider.PRIMARY_OR_MODEL
+    latency = {primary: 5.0, ai_provider.FALLBACK_MODEL: 0.0}
+
+    async def fake_call(model, system_prompt, user_message, context, client, history=None):
+        await asyncio.sleep(latency.get(model, 5.0))
+        return f"answer from {model}"
+
+    monkeypatch.setattr(ai_provider, '_acall_model', fake_call)
+
+    for _ in range(model_health.settings.LLM_BREAKER_MIN_CALLS + 1):
+        assert asyncio.run(ai_provider.achat_completion("hi")) == f"answer from {ai_provider.FALLBACK_MODEL}"
+    assert primary not in model_health.model_health_stats()
+    assert model_health.is_available(primary)
+
+    latency[ai_provider.FALLBACK_MODEL] = 5.0
+    with pytest.raises(RuntimeError):
+        asyncio.run(ai_provider.aexplain_formula("=SUM(A:A)"))
+    assert model_health.model_health_stats()[primary]['timeout'] == 1
+
+
+def test_circuit_breaker_skips_failing_model_and_reprobes(monkeypatch):
+    """Test a model failing repeatedly is skipped at once, then re-enabled by a background probe."""
+    import asyncio
+    import time
+    from app.services import ai_provider, llm_clients, model_health
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_provider.settings, 'GEMINI_ENABLED', False)
+    monkeypatch.setattr(model_health.settings, 'LLM_BREAKER_COOLDOWN', 0.2)
+    model_health.reset_model_health()
+    primary = ai_provider.PRIMARY_OR_MODEL
+    calls = []
+
+    async def fake_call(model, system_prompt, user_message, context, client, history=None):
+        calls.append(model)
+        if model == primary:
+            raise TimeoutError("primary timed out")
+        return "ok"
+
+    monkeypatch.setattr(ai_provider, '_acall_model', fake_call)
+
+    for _ in range(5):
+        assert asyncio.run(ai_provider.achat_completion("hi")) == "ok"
+    assert model_health.model_health_stats()[primary]['state'] == 'open'
+    assert model_health.model_health_stats()[primary]['timeout_rate'] == 1.0
+
+    calls.clear()
+    asyncio.run(ai_provider.achat_completion("hi"))
+    assert primary not in calls
+
+    probed = []
+    monkeypatch.setattr(model_health, '_probe_model', lambda model, provider: probed.append(model))
+    time.sleep(0.25)
+    assert not model_health.is_available(primary)  # starts the probe
+    for _ in range(50):
+        if model_health.model_health_stats()[primary]['state'] == 'closed':
+            break
+        time.sleep(0.01)
+    assert probed == [primary]
+    assert model_health.is_available(primary)
+
+    llm = llm_clients.get_chat_model(primary, temperature=0.1, max_tokens=2048)
+    assert any(isinstance(cb, model_health.HealthCallback) for cb in llm.callbacks)
+
+
+def test_chat_query_stream_sends_tokens_then_final_payload(monkeypatch):
+    """Test /chat/query/stream streams tokens (skipping a refusing model) and ends with the full payload."""
+    import json
+    import uuid
+    from app.api.routes import chat as chat_routes
+    from app.core.auth import get_current_user
+    from app.services import ai_provider, llm_clients, model_health
+
+    monkeypatch.setattr(llm_clients.settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_provider.settings, 'GEMINI_ENABLED', False)
+    model_health.reset_model_health()
+    monkeypatch.setattr(chat_routes, 'get_supabase', lambda: None)
+    monkeypatch.setattr(chat_routes, 'check_rate_limit', lambda *a: {'allowed': True})
+    monkeypatch.setattr(chat_routes, 'check_and_increment', lambda *a: None)
+    monkeypatch.setattr(chat_routes, 'get_cached', lambda **k: None)
+    monkeypatch.setattr(chat_routes, 'set_cached', lambda **k: None)
+    monkeypatch.setattr(chat_routes, '_persist_chat', lambda *a: None)
+
+    async def fake_stream(model, system_prompt, user_message, context, client, history=None):
+        tokens = ["I cannot ", "view that."] if model == ai_provider.PRIMARY_OR_MODEL else ["Revenue ", "grew ", "12%."]
+        for token in tokens:
+            yield token
+
+    monkeypatch.setattr(ai_provider, '_astream_model', fake_stream)
+    app.dependency_overrides[get_current_user] = lambda: {'id': 'user-1', 'tier': 'pro'}
+    try:
+        response = client.post('/api/chat/query/stream', json={
+            'message': 'How did revenue change this quarter?',
+            'mode': 'chat',
+            'conversation_id': str(uuid.uuid4()),
+        })
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = []
+    for block in response.text.strip().split('\n\n'):
+        name, data = block.split('\n', 1)
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+
+    assert events[0] == ('start', {'cached': False})
+    assert [d['text'] for e, d in events if e == 'token'] == ["Revenue grew 12%."]
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['content'] == "Revenue grew 12%."
+    assert 'message_id' in events[-1][1]
+
+    response = client.post('/api/chat/query/stream', json={'message': 'Hello'})
+    assert response.status_code in [401, 403]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])